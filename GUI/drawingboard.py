@@ -11,6 +11,9 @@ from elements.qsource import QSource
 from elements.wire import Wire
 from elements.resistor import Resistor
 from elements.capacitor import Capacitor
+from elements.delayline import DelayLine
+from elements.smoothvalve import SmoothValve
+from elements.stenosis import Stenosis
 from elements.inductor import Inductor
 from solvers.circuitgeom import CircuitGeom
 from utils.geometry import *
@@ -36,8 +39,8 @@ class DrawingBoard(GridZoom):
         self.frameChoices.grid(row=2, column=0, pady=1)
         self.radiovalue = tk.StringVar()
         self.radiovalue.set("Edit")  # Default Select
-        self.drag_func_elems = ["Wire", "R", "C", "L", "Gnd", "P", "Q", "Diode"]
-        self.drag_functions = ["Edit", "Wire", "R", "C", "L", "Gnd", "P", "Q", "Diode"]
+        self.drag_func_elems = ["Wire", "R", "C", "L", "Gnd", "P", "Q", "Diode", "Stenosis", "Valve", "Delay"]
+        self.drag_functions = ["Edit", "Wire", "R", "C", "L", "Gnd", "P", "Q", "Diode", "Stenosis", "Valve", "Delay"]
         for fc in self.drag_functions:
             radio = tk.Radiobutton(
                 self.frameChoices, text=fc, variable=self.radiovalue, value=fc, command=self.dragchanger
@@ -111,6 +114,12 @@ class DrawingBoard(GridZoom):
                 elem = QSource(node1, node2, "cos(2*pi*t)", True)
             elif self.drag_function == "Diode":
                 elem = Diode(node1, node2)
+            elif self.drag_function == "Stenosis":
+                elem = Stenosis(node1, node2, 10)
+            elif self.drag_function == "Valve":
+                elem = SmoothValve(node1, node2, 1)
+            elif self.drag_function == "Delay":
+                elem = DelayLine(node1, node2, 1)
 
             elem_init_pos(self, elem, eldir + 2)
             elem.draw(self)
@@ -225,6 +234,8 @@ class DrawingBoard(GridZoom):
                 continue
 
             element = constructor(node1, node2, el_dict["value"], el_dict["active"])
+            if isinstance(element, DelayLine):
+                element.delay, element.resistance = el_dict["delay"], el_dict["resistance"]
             element.set_name(el_dict["name"])
             element.draw(self)
 
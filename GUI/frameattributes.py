@@ -12,6 +12,8 @@ from elements.inductor import Inductor
 from elements.ground import Ground
 from elements.psource import PSource
 from elements.diode import Diode
+from elements.smoothvalve import SmoothValve
+from elements.delayline import DelayLine
 from exceptions.attibutesexceptions import *
 from utils.strings import *
 import matplotlib
@@ -55,6 +57,33 @@ class FrameAttributes(ttk.Frame):
                 ],
                 "delete",
             ],
+            "DelayLine": [
+                [
+                    [
+                        "labnam",
+                        "labsta",
+                        "lablisten",
+                        "labend",
+                        "lablisten",
+                        "labval",
+                        "labdelay",
+                        "labres",
+                        "lablistenQ",
+                    ],
+                    [
+                        "name",
+                        [["startx"], ["starty"]],
+                        "listenPstart",
+                        [["endx"], ["endy"]],
+                        "listenPend",
+                        "value",
+                        "delay",
+                        "resistance",
+                        "listenQ",
+                    ],
+                ],
+                "delete",
+            ],
             "Ground": [[["labnam", "labsta", "labdir"], ["name", [["startx"], ["starty"]], "direction"]], "delete"],
             "Source": [
                 [["labnam", "labsta", "labdir", "labval"], ["name", [["startx"], ["starty"]], "direction", "value"]],
@@ -68,6 +97,7 @@ class FrameAttributes(ttk.Frame):
             "Clear": {"rows": [0], "rowweights": [1], "cols": [0], "colweights": [1]},
             "Wire": {"rows": [], "rowweights": [], "cols": [1, 2], "colweights": [1, 1]},
             "Dipole": {"rows": [], "rowweights": [], "cols": [1, 2], "colweights": [1, 1]},
+            "DelayLine": {"rows": [], "rowweights": [], "cols": [1, 2], "colweights": [1, 1]},
             "Ground": {"rows": [], "rowweights": [], "cols": [1, 2], "colweights": [1, 1]},
             "Source": {"rows": [], "rowweights": [], "cols": [1, 2], "colweights": [1, 1]},
         }
@@ -80,12 +110,16 @@ class FrameAttributes(ttk.Frame):
             "lablistenQ": {"text": "Listen Q"},
             "labend": {"text": "End"},
             "labdir": {"text": "Direction"},
+            "labdelay": {"text": "Delay"},
+            "labres": {"text": "Resistance"},
             "clear": {"text": "Attributes edition panel"},
         }
 
         self.entry_options = {
             "name": {"bindfunc": self.update_name, "insert": ""},
             "value": {"bindfunc": self.update_value, "insert": ""},
+            "delay": {"bindfunc": lambda stringvar: self.update_line(stringvar, "delay"), "insert": ""},
+            "resistance": {"bindfunc": lambda stringvar: self.update_line(stringvar, "resistance"), "insert": ""},
             "startx": {"bindfunc": lambda stringvar: self.update_coords(stringvar, "start", "x"), "insert": ""},
             "starty": {"bindfunc": lambda stringvar: self.update_coords(stringvar, "start", "y"), "insert": ""},
             "endx": {"bindfunc": lambda stringvar: self.update_coords(stringvar, "end", "x"), "insert": ""},
@@ -175,7 +209,15 @@ class FrameAttributes(ttk.Frame):
             self.update_attributes()
             return
         el = self.drbd.cgeom.elems[self.elem]
-        el.set_value(stringvar.get())
+        value = stringvar.get()
+        if type(el) in [Resistor, Capacitor, Inductor]:
+            # Values that are not numbers are expressions of time
+            try:
+                float(value)
+                el.active = False
+            except ValueError:
+                el.active = True
+        el.set_value(value)
         # valstr = check_strfloat(stringvar.get())
         # stringvar.set(valstr)
         # if valstr == "" or valstr == "-":
@@ -186,6 +228,23 @@ class FrameAttributes(ttk.Frame):
         # except:
         #     raise BadNumberError(valstr)
 
+    def update_line(self, stringvar, attribute):
+        """
+        Updates delay or resistance of delay lines
+        """
+        if self.elem == -1:
+            self.update_attributes()
+            return
+        el = self.drbd.cgeom.elems[self.elem]
+        valstr = check_strfloat_pos(stringvar.get())
+        stringvar.set(valstr)
+        if valstr == "" or valstr == ".":
+            return
+        try:
+            setattr(el, attribute, float(valstr))
+        except:
+            raise BadNumberError(valstr)
+
     def read_values(self):
         """
         Allows for opening a csv file
@@ -287,7 +346,11 @@ class FrameAttributes(ttk.Frame):
 
         el = self.drbd.cgeom.elems[self.elem]
 
-        if isinstance(el, Resistor) or isinstance(el, Inductor) or isinstance(el, Capacitor):
+        if isinstance(el, DelayLine):
+            elemtype = "DelayLine"
+            self.entry_options["delay"]["insert"] = el.delay
+            self.entry_options["resistance"]["insert"] = el.resistance
+        elif isinstance(el, (Resistor, Inductor, Capacitor, SmoothValve)):
             elemtype = "Dipole"
         elif type(el) == Wire or type(el) == Diode:
             elemtype = "Wire"  # Careful with inheritance and isinstance
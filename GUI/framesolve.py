@@ -6,8 +6,15 @@ import tkinter as tk
 import networkx as nx
 import matplotlib
 from exceptions.solveframeexceptions import *
+from exceptions.solverexceptions import (
+    ComplementarityError,
+    DelayStepError,
+    EventLocationError,
+    NonLinearSchemeError,
+)
 from solvers.circuitgraph import CircuitGraph
 from solvers.circuitsolver import CircuitSolver
+from utils.plotting import plot_result
 from utils.strings import *
 
 matplotlib.use("TkAgg")
@@ -27,7 +34,28 @@ class FrameSolve(ttk.Frame):
             "Clear": ["labpanel"],
             "Solver": [
                 "labpanel",
-                [["labdt", "labmaxtime", "labtimeint"], ["timestep", "maxtime", "time integration"]],
+                [
+                    [
+                        "labdt",
+                        "labmaxtime",
+                        "labtimeint",
+                        "labrho",
+                        "labstepcontrol",
+                        "labdiodes",
+                        "labevents",
+                        "labbackend",
+                    ],
+                    [
+                        "timestep",
+                        "maxtime",
+                        "time integration",
+                        "rho",
+                        "step control",
+                        "diode mode",
+                        "event location",
+                        "backend",
+                    ],
+                ],
                 # "conn_mat",
                 "Solve",
                 "Export matrices",
@@ -44,6 +72,11 @@ class FrameSolve(ttk.Frame):
             "labdt": {"text": "Timestep"},
             "labmaxtime": {"text": "Max time"},
             "labtimeint": {"text": "Integration scheme"},
+            "labrho": {"text": "Damping rho"},
+            "labstepcontrol": {"text": "Timestep control"},
+            "labdiodes": {"text": "Diodes"},
+            "labevents": {"text": "Event location"},
+            "labbackend": {"text": "Linear solver"},
         }
 
         self.csolver = CircuitSolver()
@@ -51,16 +84,28 @@ class FrameSolve(ttk.Frame):
         self.entry_options = {
             "timestep": {"bindfunc": self.update_timestep, "insert": self.csolver.get_dt()},
             "maxtime": {"bindfunc": self.update_maxtime, "insert": self.csolver.get_maxtime()},
+            "rho": {"bindfunc": self.update_rho, "insert": self.csolver.rho},
         }
 
         self.cbbox_options = {
             "time integration": {"values": self.csolver.time_integrations, "bindfunc": self.update_time_integration},
+            "step control": {"values": self.csolver.step_controls, "bindfunc": self.update_step_control},
+            "diode mode": {"values": self.csolver.diode_modes, "bindfunc": self.update_diode_mode},
+            "backend": {"values": self.csolver.backends, "bindfunc": self.update_backend},
         }
 
         self.plot_options = {
             "conn_mat": {"dpi": 100},
         }
 
+        self.checkbox_options = {
+            "event location": {
+                "text": "on/off",
+                "onoff": int(self.csolver.event_location),
+                "command": self.update_event_location,
+            },
+        }
+
         self.button_options = {
             "Solve": {"text": "Solve", "bindfunc": self.solve},
             "Export matrices": {"text": "Export matrices", "bindfunc": self.export_matrices},
@@ -99,12 +144,50 @@ class FrameSolve(ttk.Frame):
         except:
             raise BadNumberError(mtstr)
 
+    def update_rho(self, stringvar):
+        """
+        Update high frequency damping of generalized alpha
+        """
+        rhostr = check_strfloat_pos(stringvar.get())
+        stringvar.set(rhostr)
+        if rhostr == "" or rhostr == ".":
+            return
+        try:
+            rho = float(rhostr)
+            self.csolver.set_rho(rho)
+        except:
+            raise BadNumberError(rhostr)
+
     def update_time_integration(self, event: tk.Event):
         """
         Update time integration scheme
         """
         self.csolver.set_time_integration(event.widget.get())
 
+    def update_step_control(self, event: tk.Event):
+        """
+        Update timestep control (fixed or adaptive)
+        """
+        self.csolver.set_step_control(event.widget.get())
+
+    def update_diode_mode(self, event: tk.Event):
+        """
+        Update diodes handling (switching or complementarity problem)
+        """
+        self.csolver.set_diode_mode(event.widget.get())
+
+    def update_event_location(self, var: tk.IntVar):
+        """
+        Update diode switching location inside the steps (fixed step BDF)
+        """
+        self.csolver.set_event_location(bool(var.get()))
+
+    def update_backend(self, event: tk.Event):
+        """
+        Update linear algebra backend (dense or sparse)
+        """
+        self.csolver.set_backend(event.widget.get())
+
     def solve(self):
         # Pre-solving operations : removing wires, creating readable graph
         if len(self.drbd.cgeom.nodes) == 0:
@@ -116,13 +199,30 @@ class FrameSolve(ttk.Frame):
         Paths, StartEnds = cgraph.graph_max_len_non_branching_paths()
         nbQ = len(Paths)
         nbP = len([n for n in cgraph.nodes if n.type != "Source"])
-        cns = self.csolver.solve(nbP, nbQ, cgraph.nodes, Paths, StartEnds)
+        try:
+            cns = self.csolver.solve(nbP, nbQ, cgraph.nodes, Paths, StartEnds)
+        except NonLinearSchemeError as error:
+            tk.messagebox.showerror("Error", "Unsupported options: {}.".format(error))
+            return
+        except DelayStepError as error:
+            tk.messagebox.showerror("Error", "Invalid delay line: {}, try a smaller timestep.".format(error))
+            return
+        except EventLocationError as error:
+            tk.messagebox.showerror("Error", "Event location failed: {}, try without event location.".format(error))
+            return
+        except ComplementarityError as error:
+            tk.messagebox.showerror("Error", "Diodes failed: {}, try the switching diode mode.".format(error))
+            return
         if cns == 1:
             tk.messagebox.showerror("Error", "The problem is under constrained.")
             return
         if cns == 2:
             tk.messagebox.showerror("Error", "The problem is over constrained.")
             return
+        if cns == 3:
+            tk.messagebox.showerror("Error", "The solver did not converge, try a smaller timestep.")
+            return
+        plot_result(self.csolver.result)
         return
 
     def export_matrices(self):
@@ -139,6 +239,7 @@ class FrameSolve(ttk.Frame):
             self.button_options,
             self.plot_options,
             self.cbbox_options,
+            self.checkbox_options,
         )
         self.widget_frame.grid(row=1, column=0, sticky="nsew")
         for i, row in enumerate(self.rowcol_weigths[key]["rows"]):
@@ -0,0 +1,53 @@
+import numpy as np
+from elements.resistor import Resistor
+
+
+class DelayLine(Resistor):
+    """
+    Transmission line of characteristic impedance Z (the value of the element),
+    delaying the waves travelling between its ends by delay, with a total
+    resistance R for lossy lines. It replaces a chain of LC cells of total
+    inductance L and capacitance C, with Z = sqrt(L/C) and delay = sqrt(L.C)
+    (see from_lc).
+
+    Solved by the method of characteristics: each end k only sees the wave
+    leaving the other end m delay before, P_k - Z.Q_k = P_m(t - delay) + Z.Q_m(t - delay),
+    the flows Q being counted into the line. Losses are lumped as R/4 at both
+    ends and R/2 in the middle of the line.
+
+    H. Dommel. Digital computer solution of electromagnetic transients in single-
+    and multiphase networks. IEEE Transactions on Power Apparatus and Systems, 88, 1969.
+    """
+
+    fill = "lightblue"
+
+    def __init__(self, node1, node2, Z, active=False, delay: float = 0.1, R: float = 0.0) -> None:
+        super().__init__(node1, node2, Z, active)
+        self.delay = delay
+        self.resistance = R
+
+    @classmethod
+    def from_lc(cls, node1, node2, L: float, C: float, R: float = 0.0) -> "DelayLine":
+        """
+        Delay line equivalent to a chain of LC cells of total inductance L,
+        capacitance C and resistance R.
+        """
+        return cls(node1, node2, float(np.sqrt(L / C)), delay=float(np.sqrt(L * C)), R=R)
+
+    def characteristics(self) -> tuple[float, float, float]:
+        """
+        Impedance seen from an end (Z + R/4), impedance of the waves it sends
+        (Z - R/4) and fraction of the wave arriving from the other end, the
+        rest coming back from the same end.
+        """
+        Z, R = self.get_value(), self.resistance
+        return Z + R / 4, Z - R / 4, (1 + (Z - R / 4) / (Z + R / 4)) / 2
+
+    def to_dict(self, nodes_list: list) -> dict:
+        my_dict = super().to_dict(nodes_list)
+        my_dict["delay"] = self.delay
+        my_dict["resistance"] = self.resistance
+        return my_dict
+
+    def __str__(self):
+        return "T" + str(self.ids[0])
@@ -3,6 +3,8 @@ from elements.wire import Wire
 
 
 class Diode(Wire):
+    fill = "white"
+
     def __init__(self, node1, node2, value: None = None, active: bool = False) -> None:
         super().__init__(node1, node2, value, active)
         self.widths = [1, 2, 2]
@@ -13,7 +15,7 @@ class Diode(Wire):
         x0, y0, x1, y1, x2, y2, x3, y3, x4, y4 = drbd.coord2pix(self.get_diode_coords())
         self.ids.append(
             drbd.canvas.create_polygon(
-                x0, y0, x1, y1, x2, y2, fill="white", outline="black", width=2, tags="circuit"
+                x0, y0, x1, y1, x2, y2, fill=self.fill, outline="black", width=2, tags="circuit"
             )
         )
         self.ids.append(drbd.canvas.create_line(x3, y3, x4, y4, width=2, tags="circuit"))
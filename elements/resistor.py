@@ -3,6 +3,8 @@ from elements.wire import Wire
 
 
 class Resistor(Wire):
+    fill = "white"
+
     def __init__(self, node1, node2, R, active=False) -> None:
         super().__init__(node1, node2, R, active)
         self.widths = [1, 2]
@@ -13,7 +15,7 @@ class Resistor(Wire):
         x0, y0, x1, y1, x2, y2, x3, y3 = drbd.coord2pix(self.get_rect_coords())
         self.ids.append(
             drbd.canvas.create_polygon(
-                x0, y0, x1, y1, x2, y2, x3, y3, fill="white", outline="black", width=2, tags="circuit"
+                x0, y0, x1, y1, x2, y2, x3, y3, fill=self.fill, outline="black", width=2, tags="circuit"
             )
         )
         self.afterdraw(drbd)
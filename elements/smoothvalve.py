@@ -0,0 +1,37 @@
+import numpy as np
+from elements.diode import Diode
+
+
+class SmoothValve(Diode):
+    """
+    Valve with a smooth pressure-flow law instead of the ideal switching
+    of Diode: R.Q = psi(P_start - P_end), R being the value of the element
+    (open resistance) and psi going from leakage.dP for a closed valve to dP
+    for an open one over a pressure range of about smoothing:
+    psi(dP) = leakage.dP + (1 - leakage).smoothing.log(1 + exp(dP / smoothing))
+    The valve does not leak backwards more than leakage allows, the price of
+    the smoothing is a forward flow of about smoothing.log(2)/R at dP = 0.
+    """
+
+    fill = "gray"
+    leakage = 1e-6  # Closed to open conductance ratio
+    smoothing = 1e-2  # Width of the transition in pressure
+
+    def __init__(self, node1, node2, R, active: bool = False) -> None:
+        super().__init__(node1, node2, R, active)
+
+    @classmethod
+    def law(cls, dP: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        psi(dP) and its derivative, between leakage and 1.
+        """
+        s = dP / cls.smoothing
+        softplus = np.logaddexp(0.0, s)
+        sigmoid = np.exp(-np.logaddexp(0.0, -s))
+        return (
+            cls.leakage * dP + (1 - cls.leakage) * cls.smoothing * softplus,
+            cls.leakage + (1 - cls.leakage) * sigmoid,
+        )
+
+    def __str__(self):
+        return "V" + str(self.ids[0])
@@ -0,0 +1,27 @@
+import numpy as np
+from elements.resistor import Resistor
+
+
+class Stenosis(Resistor):
+    """
+    Nonlinear resistor with the quadratic pressure drop of a stenosis:
+    P_start - P_end = K.Q.|Q|, K being the value of the element.
+    """
+
+    fill = "gray"
+    # The assembled row is the law linearized at this flow, which keeps
+    # the Newton Jacobian invertible at zero flow
+    flow_scale = 1e-3
+
+    def __init__(self, node1, node2, K, active=False) -> None:
+        super().__init__(node1, node2, K, active)
+
+    @staticmethod
+    def law(Q: np.ndarray, K: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Pressure drop and its derivative with respect to the flow.
+        """
+        return K * Q * np.abs(Q), 2 * K * np.abs(Q)
+
+    def __str__(self):
+        return "S" + str(self.ids[0])
@@ -0,0 +1,55 @@
+class SolverException(Exception):
+    def __new__(cls, *args):
+        self = super().__new__(cls, *args)
+        # Subclasses format their message from their own arguments, they are
+        # rebuilt from these to cross process boundaries (see __reduce__)
+        self.init_args = args
+        return self
+
+    def __reduce__(self):
+        return (self.__class__, self.init_args)
+
+
+class ParametersShapeError(SolverException):
+    def __init__(self, got, expected):
+        super().__init__("expected {} parameters per sample, got {}".format(repr(expected), repr(got)))
+
+
+class PeriodError(SolverException):
+    def __init__(self):
+        super().__init__("no period given and the sources are not periodic")
+
+
+class UnsupportedSchemeError(SolverException):
+    def __init__(self, scheme):
+        super().__init__("time integration {} is not supported by this solver".format(repr(scheme)))
+
+
+class NonLinearSchemeError(SolverException):
+    def __init__(self, scheme, elements):
+        super().__init__("{} does not support {}".format(scheme, elements))
+
+
+class DelayStepError(SolverException):
+    def __init__(self, delay, dt):
+        super().__init__("delay {} is shorter than the timestep {}".format(repr(delay), repr(dt)))
+
+
+class ComplementarityError(SolverException):
+    def __init__(self, reason):
+        super().__init__("the diodes complementarity problem has no solution ({})".format(reason))
+
+
+class EventLocationError(SolverException):
+    def __init__(self, time):
+        super().__init__("diode switching could not be located in the step at time {}".format(repr(time)))
+
+
+class NewtonConvergenceError(SolverException):
+    def __init__(self, iterations):
+        super().__init__("Newton iterations did not converge in {} iterations".format(repr(iterations)))
+
+
+class PeriodStepError(SolverException):
+    def __init__(self, period, dt):
+        super().__init__("period {} is not a multiple of the timestep {}".format(repr(period), repr(dt)))
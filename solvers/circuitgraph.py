@@ -1,6 +1,7 @@
 from elements.node import Node
 from elements.wire import Wire
 from elements.ground import Ground
+from elements.delayline import DelayLine
 from solvers.graphedge import GraphEdge
 from solvers.graphnode import GraphNode
 from bisect import bisect_left, bisect_right
@@ -58,7 +59,15 @@ class CircuitGraph:
                         nodes[-1].set_type("Source")
 
         for celem in celems:
-            if type(celem) != Wire:
+            if isinstance(celem, DelayLine):
+                # The ends of a delay line are only coupled through its history,
+                # each one is an edge to a source node of its own, like a ground
+                for idnode in edgedict[celem]:
+                    nodes.append(GraphNode("Source"))
+                    edges.append(GraphEdge(idnode, len(nodes) - 1, celem))
+                    nodes[idnode].add_edge(edges[-1])
+                    nodes[-1].add_edge(edges[-1])
+            elif type(celem) != Wire:
                 start = edgedict[celem][0]
                 end = edgedict[celem][1]
                 edges.append(GraphEdge(start, end, celem))
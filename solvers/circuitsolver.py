@@ -1,18 +1,52 @@
+from math import factorial
 from typing import Generator
+import warnings
 import numpy as np
+import scipy.sparse as sps
 from elements.capacitor import Capacitor
+from elements.delayline import DelayLine
 from elements.diode import Diode
 from elements.ground import Ground
 from elements.inductor import Inductor
 from elements.psource import PSource
 from elements.qsource import QSource
 from elements.resistor import Resistor
+from elements.smoothvalve import SmoothValve
+from elements.stenosis import Stenosis
+from exceptions.solverexceptions import (
+    ComplementarityError,
+    DelayStepError,
+    EventLocationError,
+    NewtonConvergenceError,
+    NonLinearSchemeError,
+    PeriodStepError,
+)
+from solvers.factorization import FactorizationCache, LowRankUpdate, TripletMatrix, factorize
 from solvers.graphedge import GraphEdge
 from solvers.graphnode import GraphNode
-import matplotlib.pyplot as plt
+from solvers.methods import (
+    bdf_weights,
+    exponential_propagator,
+    extrapolation_weights,
+    generalized_alpha_coefficients,
+    interpolation_weights,
+    lemke,
+    nordsieck_bdf_vector,
+    nordsieck_error_constant,
+    nordsieck_predict,
+    predictor_weights,
+)
+from solvers.solutionsinks import ArraySink, MemmapSink, SolutionSink, export_rows
+from solvers.solveresult import SolveResult
 import utils.calculator as calc
 import copy
 
+# Highest order of the BDF schemes, and number of past solutions kept
+BDF_MAX_ORDER = 5
+# Safety factors of the step ratio allowed by the error of VBDF at the current
+# order, the next and the previous one (see iter_nordsieck_steps)
+NORDSIECK_SAFETY = {0: 1.2, 1: 1.3, -1: 1.3}
+
 
 class CircuitSolver:
     def __init__(self) -> None:
@@ -20,21 +54,157 @@ class CircuitSolver:
         self.M0 = None  # Matrix for order 0 derivatives
         self.Source = None  # Vector for source terms
         self.LHS = None
+        self.LHS_factor = None  # Factorization of LHS, reset each time LHS is rebuilt
+        self.factor_cache = FactorizationCache()  # LHS factorizations by diode states
+        self.base_factor = None  # (LHS, factorization) updated for diode switching, see update_factor
+        self.max_updated_rows = 4  # Rows of LHS changed before a full factorization, 0 to disable updates
         self.RHS = None
         self.nbP = 0
         self.nbQ = 0
         self.dt = 0.01
         self.maxtime = 10.0
         self.solution = None
-        # Backwards Differentiation Formula
-        self.time_integrations = ["BDF", "BDF2"]
+        self.time = None
+        self.result = None
+        self.history = None  # Solution at the last steps, as needed by the integration scheme
+        self.initial_state = None  # Initial solution or state (see get_state), steady state if None
+        self.derivative = None  # Time derivative of the solution at the current step (generalized alpha)
+        self.history_source = None  # Source vector at the current step (generalized alpha)
+        self.differential_rows = None  # 1 for equations with a derivative, 0 for algebraic ones
+        self.past_steps = None  # Step sizes between the solutions of the history, newest first
+        self.startup_steps = 0  # First steps computed by extrapolation (see startup_step)
+        self.nordsieck = None  # Nordsieck array h^j.x^(j)/j! (VBDF)
+        self.nordsieck_prediction = None  # Predicted Nordsieck array for the new step (VBDF)
+        self.order = 1  # Current order (VBDF)
+        self.max_order = BDF_MAX_ORDER  # Highest order (VBDF)
+        self.dense_output = None  # Function of time interpolating the last step, if better than linear
+        # Storage options: unknowns kept ("Full" or "Listened"), every output_stride
+        # steps or interpolated at output_times if given
+        self.storages = ["Full", "Listened"]
+        self.storage = self.storages[0]
+        self.output_stride = 1
+        self.output_times = None
+        self.solution_rows = []  # Unknown of each row of solution
+        self.memmap_path = None  # If given, solution is a np.memmap on this .npy file
+        self.chunk_size = 1000  # Number of steps pushed at once to the solution sinks
+        # Backwards Differentiation Formula of order 1 to 5, generalized alpha with
+        # high frequency damping rho in [0,1], or variable order and variable step
+        # BDF in Nordsieck form (VBDF, with tolerances rtol and atol), or exact
+        # steps of circuits without diodes for linearly interpolated sources (Exponential)
+        self.time_integrations = ["BDF", "BDF2", "BDF3", "BDF4", "BDF5", "Generalized-alpha", "VBDF", "Exponential"]
         self.time_integration = self.time_integrations[0]
+        self.rho = 0.6
+        self.scheme_cache = {}  # Scheme coefficients by (scheme, step size, past steps)
+        # Step size control, "Adaptive" changes the step by powers of 2 of dt within
+        # [dt_min, dt_max] to keep the local error estimate below rtol and atol, and
+        # the deviation of the sources from linear over a step below source_tol
+        # (relative to their amplitude over the step)
+        self.step_controls = ["Fixed", "Adaptive"]
+        self.step_control = self.step_controls[0]
+        self.rtol = 1e-3
+        self.atol = 1e-6
+        self.source_tol = 0.05
+        self.dt_min = None  # Defaults to dt / 1024
+        self.dt_max = None  # Defaults to maxtime
+        self.step_size = self.dt  # Current step, dt unless adaptive
+        self.LHS_coef = None  # LHS = M0 + LHS_coef * M1
+        # Periodic steady state detection: stop once the state changes by less than
+        # periodic_tol (relative to its amplitude) over a period, inferred from the
+        # sources if not given
+        self.periodic = False
+        self.period = None
+        self.periodic_tol = 1e-6
+        self.event_location = False  # Locate diode switching inside the steps (fixed step BDF)
+        self.events = []  # (time, line, diode_open) of the diode switching located by the last run
+        self.cycle_period = None  # Period used by the last run
+        self.cycles = 0  # Periods simulated by the last run
+        self.cycle_state = None  # State at the start of the current period
+        self.cycle_amplitude = None  # Maximum absolute value of each unknown over the period
+        # Linear algebra backend, "Auto" goes sparse above sparse_threshold unknowns
+        self.backends = ["Auto", "Dense", "Sparse"]
+        self.backend = self.backends[0]
+        self.sparse_threshold = 200
+        self.sparse = False
         self.update_source_dict = {}
-        self.update_M0_dict = {}
-        self.update_M1_dict = {}
+        self.source_values = {}
+        # Source values precomputed over a block of timesteps
+        self.source_lines = np.zeros(0, dtype=int)
+        self.source_table = np.zeros((0, 0))
+        self.source_table_start = 0
+        self.max_source_table_size = 2**22
+        # R, C, L elements whose value is an expression of time (active), by line:
+        # expressions, compiled functions and (matrix, col, coefficient, order of
+        # the time derivative of the value) entries of their line (see build_element)
+        self.element_values = {}
+        self.update_element_dict = {}
+        self.element_entries = {}
+        self.element_lines = np.zeros(0, dtype=int)
+        self.element_table = np.zeros((2, 0, 0))  # Values and derivatives over the source table steps
         self.update_diode_dict = {}
+        self.resistive_diodes = set()  # Diodes temporarily replaced by resistors
+        # Diodes switched by trial and error after each solve, or solved as a
+        # linear complementarity problem (LCP) with their rows kept open in M0
+        self.diode_modes = ["Switching", "LCP"]
+        self.diode_mode = self.diode_modes[0]
+        self.lcp_states = {}  # Diode states found by the last LCP solve, by line
+        self.lcp_cache = {}  # Diode columns of the inverse by factorization, see lcp_solution
+        # Nonlinear elements (Stenosis, SmoothValve) by line, their rows are solved by
+        # modified Newton, reusing the Jacobian factorization (see newton_solution)
+        self.update_nonlinear_dict = {}
+        self.jacobian = None  # (LHS, factorization) of the last Jacobian, LHS + nonlinear slopes
+        self.newton_tol = 1e-8  # Relative error on the Newton solution
+        self.newton_contraction = 0.5  # Corrections shrinking slower refresh the Jacobian
+        self.newton_reuse = 4  # Iterations of one solve with the same Jacobian before refreshing it
+        self.max_newton_iterations = 50
+        # Ends of the delay lines by line: [element, idP, idQ, signQ], their history
+        # (source term) mixes the waves P + wave.Q that left the ends a delay before,
+        # kept every dt over the longest delay in a ring buffer (see update_delays)
+        self.update_delay_dict = {}
+        self.delay_lines = np.zeros(0, dtype=int)
+        self.delay_P = np.zeros(0, dtype=int)
+        self.delay_Q = np.zeros(0, dtype=int)
+        self.delay_wave = np.zeros(0)  # Signed impedance of the wave leaving each end
+        self.delay_times = np.zeros(0)
+        self.delay_mix = np.zeros((0, 0))  # History of each end from the delayed waves
+        self.delay_buffer = None  # Waves at step k in row k % len, None before start_run
+        self.delay_step = 0  # Last step stored in delay_buffer, see push_delays for the next row
+        self.delay_time = 0.0  # Time of the current solution
+        # R, C, L elements and the (matrix, row, col, coefficient) entries their value enters
+        self.parameters = []
         self.signs = {}
         self.listened = {}
+        self.stats = {}
+        self.reset_stats()
+
+    def __getstate__(self) -> dict:
+        """
+        Compiled sources and factorizations can not be pickled,
+        they are rebuilt from source_values and LHS after unpickling.
+        The interpolation, tables and results of the last run are not sent
+        either, the next run starts again from the initial state.
+        """
+        state = self.__dict__.copy()
+        state["update_source_dict"] = {}
+        state["update_element_dict"] = {}
+        state["LHS_factor"] = None
+        state["factor_cache"] = FactorizationCache(self.factor_cache.capacity)
+        state["base_factor"] = None
+        state["jacobian"] = None
+        state["lcp_cache"] = {}
+        state["dense_output"] = None
+        state["solution"] = None
+        state["result"] = None
+        state["time"] = None
+        state["history"] = None
+        state["scheme_cache"] = {}
+        state["source_table"] = np.zeros((len(self.source_lines), 0))
+        state["element_table"] = np.zeros((2, len(self.element_lines), 0))
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.update_source_dict = self.compile_sources(self.source_values)
+        self.update_element_dict = self.compile_sources(self.element_values)
 
     def set_dt(self, dt: float) -> None:
         self.dt = dt
@@ -51,56 +221,149 @@ class CircuitSolver:
     def set_time_integration(self, ti: str) -> None:
         self.time_integration = ti
 
+    def set_max_order(self, max_order: int) -> None:
+        self.max_order = min(max(int(max_order), 1), BDF_MAX_ORDER)
+
+    def set_rho(self, rho: float) -> None:
+        self.rho = min(max(rho, 0.0), 1.0)
+        self.scheme_cache = {}
+
+    def set_step_control(self, step_control: str) -> None:
+        self.step_control = step_control
+
+    def set_tolerances(self, rtol: float, atol: float) -> None:
+        self.rtol = rtol
+        self.atol = atol
+
+    def set_source_tol(self, source_tol: float) -> None:
+        self.source_tol = source_tol
+
+    def set_dt_bounds(self, dt_min: float | None, dt_max: float | None) -> None:
+        self.dt_min = dt_min
+        self.dt_max = dt_max
+
+    def set_initial_state(self, initial_state: np.ndarray | None) -> None:
+        """
+        Start from initial_state instead of the steady state: a solution
+        vector or a full state of the integration scheme (see get_state).
+        """
+        self.initial_state = initial_state
+
+    def set_periodic(self, periodic: bool) -> None:
+        self.periodic = periodic
+
+    def set_period(self, period: float | None) -> None:
+        self.period = period
+
+    def set_periodic_tol(self, tol: float) -> None:
+        self.periodic_tol = tol
+
+    def set_diode_mode(self, diode_mode: str) -> None:
+        self.diode_mode = diode_mode
+
+    def set_event_location(self, event_location: bool) -> None:
+        self.event_location = event_location
+
+    def set_storage(self, storage: str) -> None:
+        self.storage = storage
+
+    def set_output_stride(self, stride: int) -> None:
+        self.output_stride = max(1, int(stride))
+
+    def set_output_times(self, output_times: np.ndarray | None) -> None:
+        self.output_times = output_times
+
+    def set_memmap_path(self, path: str | None) -> None:
+        self.memmap_path = path
+
+    def set_backend(self, backend: str) -> None:
+        self.backend = backend
+
+    def set_cache_capacity(self, capacity: int) -> None:
+        self.factor_cache.capacity = capacity
+
+    def set_max_updated_rows(self, max_updated_rows: int) -> None:
+        """
+        Rows of LHS changed by diodes and active elements that are applied as
+        a low rank update of the last factorization (see update_factor).
+        Beyond, LHS is factorized again: a circuit with more active elements
+        refactorizes at every step (a warning is issued when running).
+        """
+        self.max_updated_rows = max_updated_rows
+
+    def use_sparse(self, size: int) -> bool:
+        """
+        Whether the sparse backend should be used for a system
+        with size unknowns.
+        """
+        if self.backend == "Sparse":
+            return True
+        if self.backend == "Dense":
+            return False
+        return size > self.sparse_threshold
+
+    def reset_stats(self) -> None:
+        """
+        Reset solver statistics counters.
+        """
+        self.stats = {
+            "factorizations": 0,
+            "substitutions": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "steps": 0,
+            "rejected_steps": 0,
+            "events": 0,
+            "low_rank_updates": 0,
+            "newton_iterations": 0,
+            "jacobian_refreshes": 0,
+        }
+
+    def get_stats(self) -> dict:
+        return self.stats
+
+    def get_row_name(self, row: int) -> str:
+        """
+        Listener name of an unknown, or P/Q followed by its index.
+        """
+        if row in self.listened:
+            return self.listened[row]
+        if row < self.nbP:
+            return "P" + str(row)
+        return "Q" + str(row)
+
     def export_full_solution(self, fname: str) -> None:
-        names = []
-        for i in range(self.nbP):
-            try:
-                names.append(self.listened[i])
-            except:
-                names.append("P" + str(i))
-        for i in range(self.nbQ):
-            try:
-                names.append(self.listened[self.nbP + i])
-            except:
-                names.append("Q" + str(self.nbP + i))
-        np.savetxt(
+        """
+        Export all the stored rows of the solution.
+        """
+        export_rows(
             fname,
             self.solution,
-            fmt="%.11g",
-            delimiter=" ",
-            newline="\n",
-            header=" ".join(names),
-            footer="",
-            comments="# ",
-            encoding=None,
+            list(range(len(self.solution_rows))),
+            [self.get_row_name(row) for row in self.solution_rows],
+            self.chunk_size,
         )
 
     def export_listened_solution(self, fname: str) -> None:
-        np.savetxt(
+        export_rows(
             fname,
-            self.solution[[i for i in self.listened.keys()]],
-            fmt="%.11g",
-            delimiter=" ",
-            newline="\n",
-            header=" ".join([self.listened[i] for i in self.listened.keys()]),
-            footer="",
-            comments="# ",
-            encoding=None,
+            self.solution,
+            [self.solution_rows.index(i) for i in self.listened.keys()],
+            [self.listened[i] for i in self.listened.keys()],
+            self.chunk_size,
         )
 
-    def solve(
+    def assemble(
         self, nbP: int, nbQ: int, nodes: list[GraphNode], paths: list[list[GraphEdge]], startends: list[list[int]]
     ) -> int:
         """
-        Method that takes all the steps to solve the system:
+        Prepare the system without solving it:
         - check solution existence necessary condition
         - adapts input data
-        - allocates arrays
         - builds zero and first order differential matrices
         - builds source vector and give update dictionary for transient sources
-        - takes steady state solution as initial state
-        - builds LHS
-        - solves LHS.x = RHS at each timestep
+
+        Returns the same codes as check_no_solution.
         """
         cns = self.check_no_solution(nbP, nbQ, paths, startends)
         if cns:
@@ -110,67 +373,864 @@ class CircuitSolver:
         )
         self.listened, self.signs = self.set_listeners(nodes, paths, startends)
 
-        time = 0.0
-        step = 0
-        nb_step = int(self.maxtime / self.dt)
         self.nbP = nbP
         self.nbQ = nbQ
-        self.M1 = np.zeros((nbP + nbQ, nbP + nbQ), dtype=float)
-        self.M0 = np.zeros((nbP + nbQ, nbP + nbQ), dtype=float)
+        self.resistive_diodes = set()
+        self.sparse = self.use_sparse(nbP + nbQ)
+        if self.sparse:
+            self.M1 = TripletMatrix((nbP + nbQ, nbP + nbQ))
+            self.M0 = TripletMatrix((nbP + nbQ, nbP + nbQ))
+        else:
+            self.M1 = np.zeros((nbP + nbQ, nbP + nbQ), dtype=float)
+            self.M0 = np.zeros((nbP + nbQ, nbP + nbQ), dtype=float)
         self.Source = np.zeros((nbP + nbQ), dtype=float)
-        self.solution = np.zeros((nbP + nbQ, nb_step + 1))
 
         self.update_diode_dict = self.build_M0M1(nbP, paths, startends)
+        if self.sparse:
+            self.M1 = self.M1.tocsr()
+            self.M0 = self.M0.tocsr()
         self.update_source_dict = self.build_source(paths)
-        self.update_source(time)
+        self.source_lines = np.array(list(self.update_source_dict.keys()), dtype=int)
+        self.update_element_dict = self.compile_sources(self.element_values)
+        self.element_lines = np.array(list(self.update_element_dict.keys()), dtype=int)
+        self.build_delays()
+        return 0
+
+    def simulate(
+        self,
+        nbP: int,
+        nbQ: int,
+        nodes: list[GraphNode],
+        paths: list[list[GraphEdge]],
+        startends: list[list[int]],
+        sinks: list[SolutionSink] | None = None,
+    ) -> SolveResult:
+        """
+        Headless simulation of the circuit:
+        - assembles the system (see assemble)
+        - runs the time stepping (see run), pushing the solution to sinks
+
+        Returns:
+            SolveResult: time vector, solution with listener signs applied,
+            listened unknowns and solver statistics. Its status is 0 if OK,
+            1 if under constrained, 2 if over constrained, 3 if not converged.
+        """
+        cns = self.assemble(nbP, nbQ, nodes, paths, startends)
+        if cns:
+            return SolveResult(cns)
+        cns = self.run(sinks)
+        if cns:
+            return SolveResult(cns)
+        return self.get_result()
 
-        if self.update_diode_dict != {}:
-            self.recompute_diodes(-1)
+    def solve(
+        self, nbP: int, nbQ: int, nodes: list[GraphNode], paths: list[list[GraphEdge]], startends: list[list[int]]
+    ) -> int:
+        """
+        Simulate the circuit (see simulate) and keep the result in self.result.
 
-        # Initializing with steady-state solution
+        Returns:
+            int: 0 if OK, 1 if under constrained, 2 if over constrained,
+            3 if not converged
+        """
+        self.result = self.simulate(nbP, nbQ, nodes, paths, startends)
+        return self.result.status
+
+    def get_result(self) -> SolveResult:
+        """
+        Result of the last run. Time and solution are None
+        if the solution was only pushed to other sinks than ArraySink.
+        """
+        return SolveResult(
+            0,
+            self.time,
+            self.solution,
+            dict(self.listened),
+            self.nbP,
+            dict(self.stats),
+            list(self.solution_rows),
+            self.cycle_period,
+            self.cycles,
+        )
+
+    def store_cycle(self, x: np.ndarray) -> None:
+        """
+        Store a periodic steady state computed without time stepping like
+        the solution of a run, with the storage options: x holds all the
+        unknowns (rows) every dt over one period (columns), the stored
+        solution covers the period with both ends.
+        """
+        nb_step = x.shape[1]
+        self.solution_rows = self.get_output_rows()
+        columns = np.arange(0, nb_step + 1, self.output_stride)
+        signs = np.array([self.signs.get(row, 1) for row in self.solution_rows], dtype=float)
+        self.time = columns * self.dt
+        self.solution = x[self.solution_rows][:, columns % nb_step] * signs[:, None]
+        self.cycle_period = nb_step * self.dt
+        self.cycles = 0
+
+    def run(self, sinks: list[SolutionSink] | None = None) -> int:
+        """
+        Time stepping of the assembled system, the solution being pushed
+        by blocks of chunk_size steps to sinks (see iter_run).
+        Without sinks, the whole solution is kept in self.solution,
+        mapped to memmap_path if given.
+
+        Returns 0 if OK, 2 if the system is singular, 3 if the Newton
+        iterations of the nonlinear elements did not converge. Other solver
+        failures (options not supported by the circuit, diode events or
+        LCP for instance) raise a SolverException.
+        """
+        if sinks is None:
+            sinks = [ArraySink() if self.memmap_path is None else MemmapSink(self.memmap_path)]
+        self.solution = None
+        self.time = None
+        self.solution_rows = self.get_output_rows()
+        n_steps = len(self.get_output_times())
+        for sink in sinks:
+            sink.open(len(self.solution_rows), n_steps)
         try:
-            self.solution[:, :] = np.linalg.solve(self.M0, self.Source).reshape(-1, 1)
-        except:
+            for time, block in self.iter_run():
+                for sink in sinks:
+                    sink.write(time, block)
+        except np.linalg.LinAlgError:
             return 2
+        except NewtonConvergenceError:
+            return 3
+        finally:
+            for sink in sinks:
+                sink.close()
+        for sink in sinks:
+            if isinstance(sink, ArraySink):
+                self.solution = sink.solution
+                self.time = sink.time
+                break
+        return 0
+
+    def iter_run(self) -> Generator[tuple[np.ndarray, np.ndarray], None, None]:
+        """
+        Time stepping of the assembled system (see iter_states), keeping
+        the rows and times selected by the storage options (see get_output_rows
+        and get_output_times) with listener signs applied. Output times
+        between two steps are interpolated with dense_output if the scheme
+        provides it, linearly otherwise.
+
+        Only the history needed by the integration scheme is kept, so memory
+        does not depend on maxtime. Raises np.linalg.LinAlgError if the
+        system is singular.
+
+        Yields:
+            (np.ndarray, np.ndarray): times and solution block of shape
+            (len(get_output_rows()), len(times)), the arrays being reused
+        """
+        rows = self.get_output_rows()
+        signs = np.array([self.signs.get(row, 1) for row in rows], dtype=float)
+        output_times = self.get_output_times()
+
+        chunk = max(1, min(self.chunk_size, len(output_times)))
+        block = np.zeros((len(rows), chunk))
+        times = np.zeros(chunk)
+        filled = 0
+        iout = 0
+        prev_time, prev_values = 0.0, None
+        for time, x in self.iter_states():
+            values = x[rows] * signs
+            # Linear interpolation for output times in ]prev_time, time]
+            while iout < len(output_times) and output_times[iout] <= time:
+                if prev_values is None or output_times[iout] == time:
+                    block[:, filled] = values
+                elif self.dense_output is not None:
+                    block[:, filled] = self.dense_output(output_times[iout])[rows] * signs
+                else:
+                    w = (output_times[iout] - prev_time) / (time - prev_time)
+                    block[:, filled] = (1 - w) * prev_values + w * values
+                times[filled] = output_times[iout]
+                filled += 1
+                iout += 1
+                if filled == chunk:
+                    yield times, block
+                    filled = 0
+            prev_time, prev_values = time, values
+        if filled:
+            yield times[:filled], block[:, :filled]
+
+    def iter_states(self) -> Generator[tuple[float, np.ndarray], None, None]:
+        """
+        Time stepping of the assembled system:
+        - sets the initial state (see start_run)
+        - solves LHS.x = RHS at each timestep, reusing the LU
+          factorization of LHS until a diode changes state
+        With "Adaptive" step control, steps are chosen by iter_adaptive_steps
+        (except for Exponential, exact whatever dt),
+        VBDF chooses its steps and orders (see iter_nordsieck_steps).
+        Multistep BDF start with startup_step, and restart with it after
+        diode switching if event_location is set (see event_step).
+        If periodic, stops at the end of the first period over which the
+        state converged (see periodic_converged).
+
+        Yields:
+            (float, np.ndarray): time and solution (self.history[0])
+            at the initial state and after each step
+        """
+        nb_step = int(self.maxtime / self.dt)
+        self.start_run()
+        self.start_periodic()
+        yield 0.0, self.history[0]
+
+        if self.time_integration == "VBDF":
+            yield from self.iter_nordsieck_steps(nb_step * self.dt)
+            return
+        if self.step_control == "Adaptive" and self.time_integration != "Exponential":
+            yield from self.iter_adaptive_steps(nb_step * self.dt)
+            return
+        period_steps = 0 if self.cycle_period is None else self.get_period_steps(self.cycle_period)
+        events = self.event_location and self.time_integration.startswith("BDF") and self.update_diode_dict
+        events = events and self.diode_mode == "Switching"
+        for step in range(1, nb_step + 1):
+            self.update_source_step(step)
+            if step <= self.startup_steps:
+                self.push_history(self.startup_step((step - 1) * self.dt))
+            elif events:
+                nb_events = self.stats["events"]
+                self.push_history(self.event_step((step - 1) * self.dt))
+                if self.stats["events"] > nb_events:
+                    # Past solutions are not smooth across the event, restart the multistep scheme
+                    self.startup_steps = step + self.get_scheme_order() - 1
+            else:
+                self.push_history(self.step_solution())
+            self.stats["steps"] += 1
+            yield step * self.dt, self.history[0]
+            if period_steps and self.periodic_converged(step % period_steps == 0):
+                return
+
+    def start_run(self) -> None:
+        """
+        Reset statistics and caches, set the initial state in the history
+        (initial_state or steady state solution), which is also the past of
+        the delay lines, and build LHS.
+        Diode states are recomputed, unless starting from initial_state
+        where they are kept from the previous run.
+        """
+        n = self.nbP + self.nbQ
+        if self.time_integration == "Exponential":
+            self.check_supported("Exponential time integration", diodes=False, nonlinear=False, time_varying=False)
+        if self.diode_mode == "LCP":
+            self.check_supported("LCP diode mode", nonlinear=False)
+        if 0 < self.max_updated_rows < len(self.element_lines):
+            warnings.warn(
+                "{} active elements exceed max_updated_rows={}, LHS is factorized again at every step".format(
+                    len(self.element_lines), self.max_updated_rows
+                )
+            )
+        self.reset_stats()
+        self.events = []
+        self.factor_cache.clear()
+        self.base_factor = None
+        self.jacobian = None
+        self.lcp_cache = {}
+        self.delay_buffer = None
+        self.Source[self.delay_lines] = 0  # The history of the delay lines is set from the initial state
+        self.LHS, self.LHS_coef = None, None
+        self.reset_source_table()
+        self.update_source_step(0)
+        self.step_size = self.dt
+        self.past_steps = np.full(BDF_MAX_ORDER, self.dt)
+        self.scheme_cache = {}
+        self.dense_output = None
+        # history[0] is the solution at the current step, history[j] j steps before
+        self.history = np.zeros((BDF_MAX_ORDER, n))
+        # Multistep schemes need the first steps to be computed by a one step method
+        self.startup_steps = self.get_scheme_order() - 1 if self.time_integration.startswith("BDF") else 0
+        # Steady state or given initial state, the derivative is taken null
+        self.derivative = np.zeros(n)
+        self.order = 1
+        self.nordsieck = np.zeros((BDF_MAX_ORDER + 2, n))
+        self.nordsieck_prediction = self.nordsieck[:2]
+        self.history_source = self.Source.copy()
+        self.differential_rows = (np.asarray(abs(self.M1).sum(axis=1)).ravel() > 0).astype(float)
+        lcp = self.diode_mode == "LCP" and self.update_diode_dict
+        if lcp:
+            for line in self.update_diode_dict:
+                self.set_diode(line, True)
+        if self.initial_state is not None:
+            state = np.asarray(self.initial_state, dtype=float).ravel()
+            self.history[:] = state[:n]
+            if len(state) > n:
+                self.set_state(state)
+
+        steady = self.steady_state_matrix()
+        if self.initial_state is None and lcp:
+            self.history[:] = self.lcp_solution(factorize(steady), self.Source)
+        elif self.initial_state is None:
+            if self.update_diode_dict != {}:
+                self.recompute_diodes()
+            # Initializing with steady-state solution
+            self.history[:] = factorize(steady).solve(self.Source)
+            if self.update_nonlinear_dict:
+                self.LHS, self.RHS = steady.copy(), self.Source
+                self.history[:] = self.newton_solution(self.history[0])
+        self.start_delays()
         self.build_LHS()
 
-        while step < nb_step:
-            time += self.dt
-            self.update_source(time)
-            self.build_RHS(step)
-            self.solution[:, step + 1] = np.linalg.solve(self.LHS, self.RHS)
-            if self.update_diode(step):
-                self.build_LHS()
-                try:
-                    self.solution[:, step + 1] = np.linalg.solve(self.LHS, self.RHS)
-                except:
-                    self.recompute_diodes(step)
-                    self.build_LHS()
-                    self.solution[:, step + 1] = np.linalg.solve(self.LHS, self.RHS)
-            step += 1
-
-        for key in self.signs.keys():
-            self.solution[key] *= self.signs[key]
-
-        fig, axs = plt.subplots(2)
-        for key in self.listened.keys():
-            if key < nbP:
-                axs[0].plot(np.linspace(0, self.maxtime, nb_step + 1), self.solution[key], label=self.listened[key])
+    def push_history(self, x: np.ndarray) -> None:
+        """
+        Make x, the solution at the new step, the current step of the history.
+        """
+        if self.time_integration == "Generalized-alpha":
+            self.derivative = self.update_derivative(x, self.history[0], self.derivative)
+        if self.time_integration in ["Generalized-alpha", "Exponential"]:
+            self.history_source[:] = self.Source
+        self.history[1:] = self.history[:-1]
+        self.history[0] = x
+        self.past_steps[1:] = self.past_steps[:-1]
+        self.past_steps[0] = self.step_size
+        if self.delay_buffer is not None:
+            self.push_delays(x)
+
+    def get_scheme_order(self, scheme: str | None = None) -> int:
+        """
+        Order of a BDF scheme (time_integration by default), 2 for generalized alpha,
+        the current order for VBDF and 1 for Exponential (one step method).
+        """
+        scheme = self.time_integration if scheme is None else scheme
+        if scheme in ["BDF", "Exponential"]:
+            return 1
+        if scheme == "Generalized-alpha":
+            return 2
+        if scheme == "VBDF":
+            return self.order
+        return int(scheme[3:])
+
+    def startup_step(self, time: float) -> np.ndarray:
+        """
+        Solve one step of step_size from the current solution at time with an
+        extrapolation of implicit Euler results on 1, 2, ..., k substeps, of
+        order k, the order of the scheme. Used for the first steps of
+        multistep schemes instead of assuming a constant past solution.
+
+        Returns:
+            np.ndarray: solution at the new step
+        """
+        k = self.get_scheme_order()
+        substeps = list(range(1, k + 1))
+        step_size, source = self.step_size, self.Source.copy()
+        results = []
+        for n_sub in substeps:
+            x = self.history[0]
+            for i in range(1, n_sub + 1):
+                x = self.euler_step(x, time + (i - 1) * step_size / n_sub, step_size / n_sub)
+            results.append(x)
+        self.step_size = step_size
+        self.Source[:] = source
+        self.build_LHS()
+        return extrapolation_weights(substeps)[-1] @ np.array(results)
+
+    def euler_step(self, x: np.ndarray, time: float, h: float, update_diodes: bool = True) -> np.ndarray:
+        """
+        Solve one implicit Euler step of h from x at time, with sources
+        evaluated at time + h, updating diodes states if update_diodes.
+        Leaves step_size to h and Source to the sources at time + h.
+        """
+        self.step_size = h
+        self.build_LHS("BDF")
+        self.update_source(time + h)
+        self.RHS = self.Source + self.M1 @ (x / h)
+        return self.solve_step("BDF") if update_diodes else self.solve_LHS()
+
+    def locate_event(self, x0: np.ndarray, x1: np.ndarray) -> tuple[float, int | None]:
+        """
+        First diode switching between solutions x0 and x1, with the flow of
+        open diodes and the pressure drop of closed ones linearly interpolated.
+
+        Returns:
+            (float, int | None): fraction of the step at which the first diode
+            switches, and its line (None if no diode switches)
+        """
+        first, first_line = 1.0, None
+        for line, (diode_open, idP0, idP1, idQ, signQ) in self.update_diode_dict.items():
+            # Positive while the state is consistent
+            if diode_open:
+                g0, g1 = signQ * x0[idQ], signQ * x1[idQ]
+            else:
+                g0, g1 = signQ * (x0[idP1] - x0[idP0]), signQ * (x1[idP1] - x1[idP0])
+            if g1 < 0:
+                fraction = min(max(g0 / (g0 - g1), 0.0), 1.0) if g0 > 0 else 0.0
+                if first_line is None or fraction < first:
+                    first, first_line = fraction, line
+        return first, first_line
+
+    def event_step(self, time: float) -> np.ndarray:
+        """
+        Solve one step of step_size from the current solution at time, with
+        the diode switching located inside the step: the step is solved with
+        the current diode states, and if a diode switches, the first switching
+        time is found by linear interpolation of its flow (open diode) or
+        pressure drop (closed diode). The step is then split there into
+        implicit Euler substeps, the diode switching in between, until no more
+        diode switches. Events are counted in stats and kept in self.events.
+
+        Returns:
+            np.ndarray: solution at the new step
+
+        Raises:
+            EventLocationError: if a substep is singular
+        """
+        self.build_RHS()
+        x = self.solve_LHS()
+        fraction, line = self.locate_event(self.history[0], x)
+        if line is None:
+            return x
+        step_size, source = self.step_size, self.Source.copy()
+        x, t = self.history[0], time
+        try:
+            for _ in range(2 * len(self.update_diode_dict) + 1):
+                h = fraction * (time + step_size - t)
+                if h > 1e-9 * step_size:
+                    x = self.euler_step(x, t, h, update_diodes=False)
+                    t += h
+                self.set_diode(line, not self.update_diode_dict[line][0])
+                self.events.append((t, line, self.update_diode_dict[line][0]))
+                self.stats["events"] += 1
+                x_end = self.euler_step(x, t, time + step_size - t, update_diodes=False)
+                fraction, line = self.locate_event(x, x_end)
+                if line is None:
+                    break
             else:
-                axs[1].plot(np.linspace(0, self.maxtime, nb_step + 1), self.solution[key], label=self.listened[key])
-        axs[0].legend()
-        axs[1].legend()
-        plt.show()
+                # Chattering diodes, their states are only updated at the end of the step
+                self.update_diode(x_end)
+        except np.linalg.LinAlgError as error:
+            # The substeps are singular with the diode states at the event
+            raise EventLocationError(t) from error
+        self.step_size = step_size
+        self.Source[:] = source
+        self.build_LHS()
+        return x_end
 
-        return 0
+    def update_derivative(self, x_new: np.ndarray, x: np.ndarray, dx: np.ndarray) -> np.ndarray:
+        """
+        Derivative at the new step of the generalized alpha method,
+        from the solution at the new and current steps and the current derivative.
+        """
+        gamma = self.scheme_coefficients("Generalized-alpha")[4]
+        return (x_new - x) / (gamma * self.step_size) - (1 - gamma) / gamma * dx
+
+    def get_state(self) -> np.ndarray:
+        """
+        State of the integration scheme at the current step, as a vector:
+        the solution, followed by the previous solutions (BDF)
+        or the derivative (generalized alpha).
+        """
+        if self.time_integration == "Generalized-alpha":
+            return np.concatenate((self.history[0], self.derivative))
+        return self.history[: self.get_scheme_order()].ravel().copy()
+
+    def set_state(self, state: np.ndarray) -> None:
+        """
+        Set the current step from a vector given by get_state,
+        no startup steps are needed from there.
+        """
+        n = self.nbP + self.nbQ
+        self.startup_steps = 0
+        if self.time_integration == "Generalized-alpha":
+            self.history[:] = state[:n]
+            self.derivative[:] = state[n:]
+            return
+        k = len(state) // n
+        self.history[:k] = state.reshape(k, n)
+        self.history[k:] = self.history[k - 1]
+
+    def iter_adaptive_steps(self, end: float) -> Generator[tuple[float, np.ndarray], None, None]:
+        """
+        Variable step time stepping up to end. The local error of each step
+        is estimated from its distance to the extrapolation of the history,
+        of the order of the scheme (at most BDF_MAX_ORDER - 1), without
+        solving the step again. Steps with an error above rtol and atol are
+        rejected and halved, the step is doubled when the error is small enough.
+        Steps longer than dt are also rejected if the sources, sampled every dt,
+        are not linear within source_tol over the step, so that source
+        variations seen with a fixed dt are not stepped over (see sources_linear).
+        Output times within a step are interpolated from the step and the history.
+
+        Steps are dt times a power of 2, and BDF keeps a fixed leading coefficient
+        (see scheme_coefficients), so that LHS only depends on the step size and a
+        few LHS factorizations are reused from the cache. Steps are at most the
+        shortest delay of the delay lines (see update_delays).
+
+        Yields:
+            (float, np.ndarray): time and solution after each accepted step
+        """
+        # The history holds the BDF_MAX_ORDER solutions the predictor interpolates
+        order = min(self.get_scheme_order(), BDF_MAX_ORDER - 1)
+        startup_steps = self.startup_steps
+        dt_min = self.dt / 1024 if self.dt_min is None else self.dt_min
+        dt_max = end if self.dt_max is None else self.dt_max
+        dt_max = min(dt_max, np.min(self.delay_times, initial=np.inf))
+        kmin = int(np.ceil(np.log2(dt_min / self.dt)))
+        kmax = max(kmin, int(np.floor(np.log2(dt_max / self.dt))))
+        k = min(max(0, kmin), kmax)
+        time = 0.0
+        cycles = 1
+        while time < end:
+            # Steps end exactly on period ends for periodic steady state detection
+            stop = end if self.cycle_period is None else min(end, cycles * self.cycle_period)
+            step = min(self.dt * 2.0**k, stop - time)
+            if k > 0 and len(self.source_lines) and not self.sources_linear(time, step, 2**k):
+                self.stats["rejected_steps"] += 1
+                k -= 1
+                continue
+            self.step_size = step
+            self.update_source(time + step)
+            self.build_LHS()
+            x = self.startup_step(time) if self.stats["steps"] < startup_steps else self.step_solution()
+            steps = np.concatenate(([step], self.past_steps[:order]))
+            weights = predictor_weights(steps)
+            # Ratio of the error of the step to its distance to the prediction (Milne's device)
+            factor = 1 / (1 + self.LHS_coef * np.sum(steps))
+            scale = self.atol + self.rtol * np.maximum(np.abs(x), np.abs(self.history[0]))
+            error = np.max(factor * np.abs(x - weights @ self.history[: order + 1]) / scale, initial=0.0)
+            if error > 1 and k > kmin:
+                self.stats["rejected_steps"] += 1
+                k -= 1
+                continue
+            # Output times within the step are interpolated to the order of the scheme
+            times = time + step - np.concatenate(([0.0], np.cumsum(steps[:order])))
+            values = np.vstack((x, self.history[:order]))
+            self.dense_output = lambda t, times=times, values=values: interpolation_weights(times, t) @ values
+            time = stop if step == stop - time else time + step
+            self.push_history(x)
+            self.stats["steps"] += 1
+            if error < 0.8 / 2 ** (order + 1) and k < kmax:
+                # The error is O(step^(order + 1)), doubling keeps it below 0.8
+                k += 1
+            yield time, self.history[0]
+            if self.cycle_period is not None:
+                if self.periodic_converged(time == stop):
+                    return
+                if time == stop:
+                    cycles += 1
+
+    def iter_nordsieck_steps(self, end: float) -> Generator[tuple[float, np.ndarray], None, None]:
+        """
+        Variable order, variable step BDF in Nordsieck form up to end, starting
+        at order 1. Each step is predicted by the Taylor expansion of the
+        Nordsieck array and corrected by the implicit BDF solve. The local error,
+        estimated from the correction, is kept below rtol and atol by halving
+        rejected steps as many times as the error requires. Every order + 1
+        steps, the errors of orders q - 1, q and q + 1 are compared to choose
+        the order, with the safety factors NORDSIECK_SAFETY favouring the
+        current order, and the step is doubled if the error of the chosen
+        order allows it.
+
+        Steps are dt times a power of 2 (except to end on period ends or end),
+        so that a few LHS factorizations are reused from the cache. Steps
+        longer than dt are rejected if the sources are not linear within
+        tolerances over the step (see iter_adaptive_steps).
+
+        Yields:
+            (float, np.ndarray): time and solution after each accepted step
+        """
+        dt_min = self.dt / 1024 if self.dt_min is None else self.dt_min
+        dt_max = end if self.dt_max is None else self.dt_max
+        dt_max = min(dt_max, np.min(self.delay_times, initial=np.inf))
+        kmin = int(np.ceil(np.log2(dt_min / self.dt)))
+        kmax = max(kmin, int(np.floor(np.log2(dt_max / self.dt))))
+        k = min(max(0, kmin), kmax)
+        # Steady state or given initial state, the derivative is taken null
+        self.nordsieck[0] = self.history[0]
+        h = self.dt * 2.0**k  # Step of the Nordsieck array
+        correction_prev = None  # Correction of the previous step, if it had the same step and order
+        steps_since_change = 0
+        time = 0.0
+        cycles = 1
+        while time < end:
+            stop = end if self.cycle_period is None else min(end, cycles * self.cycle_period)
+            step = min(self.dt * 2.0**k, stop - time)
+            if k > 0 and len(self.source_lines) and not self.sources_linear(time, step, 2**k):
+                self.stats["rejected_steps"] += 1
+                k -= 1
+                # Wait as long as after a change before trying a longer step again
+                steps_since_change = 0
+                continue
+            if step != h:
+                self.nordsieck *= (step / h) ** np.arange(BDF_MAX_ORDER + 2)[:, None]
+                h = step
+                correction_prev = None
+                steps_since_change = 0
+            q = self.order
+            self.step_size = h
+            self.nordsieck_prediction = nordsieck_predict(self.nordsieck[: q + 1])
+            self.update_source(time + h)
+            self.build_LHS()
+            x = self.step_solution()
+            correction = x - self.nordsieck_prediction[0]
+            scale = self.atol + self.rtol * np.maximum(np.abs(x), np.abs(self.history[0]))
+            error = np.max(np.abs(correction) * nordsieck_error_constant(q) / scale, initial=0.0)
+            if error > 1 and k > kmin:
+                self.stats["rejected_steps"] += 1
+                # Halve the step as many times as the error requires
+                k = max(kmin, k - max(1, int(np.ceil(np.log2(NORDSIECK_SAFETY[0] * error ** (1 / (q + 1)))))))
+                if q > 1 and steps_since_change == 0:
+                    # Repeated failure, lower the order
+                    self.order = q - 1
+                    self.nordsieck[q] = 0
+                continue
+
+            self.nordsieck[: q + 1] = self.nordsieck_prediction + nordsieck_bdf_vector(q)[:, None] * correction
+            t0, z = time, self.nordsieck[: q + 1].copy()
+            time = stop if step == stop - time else time + step
+            self.dense_output = lambda t, t0=t0, z=z, h=h: ((t - t0) / h - 1) ** np.arange(len(z)) @ z
+            self.push_history(x)
+            self.stats["steps"] += 1
+            steps_since_change += 1
+
+            if steps_since_change > q:
+                # Errors of orders q - 1 and q + 1, from the last derivative and the change of correction
+                errors = {q: error}
+                if q > 1:
+                    lower = np.abs(self.nordsieck[q]) * factorial(q) * nordsieck_error_constant(q - 1)
+                    errors[q - 1] = np.max(lower / scale, initial=0.0)
+                if q < self.max_order and correction_prev is not None:
+                    higher = np.abs(correction - correction_prev) * nordsieck_error_constant(q + 1)
+                    errors[q + 1] = np.max(higher / scale, initial=0.0)
+                # Step ratio allowed by each order, and the order allowing the largest one,
+                # changing order only if it allows a larger ratio with a safety margin
+                ratios = {p: max(e, 1e-10) ** (-1 / (p + 1)) / NORDSIECK_SAFETY[p - q] for p, e in errors.items()}
+                order = max(ratios, key=ratios.get)
+                if order != q:
+                    if order > q:
+                        self.nordsieck[order] = correction / factorial(order)
+                    else:
+                        self.nordsieck[q] = 0
+                    self.order = order
+                    steps_since_change = 0
+                    correction = None
+                if ratios[order] >= 2 and k < kmax:
+                    k += 1
+            correction_prev = correction
+            yield time, self.history[0]
+            if self.cycle_period is not None:
+                if self.periodic_converged(time == stop):
+                    return
+                if time == stop:
+                    cycles += 1
+
+    def start_periodic(self) -> None:
+        """
+        Set the period used for periodic steady state detection (None if not
+        periodic or no period could be inferred) and its initial state.
+        """
+        self.cycles = 0
+        self.cycle_period = None
+        if self.periodic:
+            self.cycle_period = self.infer_period() if self.period is None else self.period
+        self.cycle_state = self.history[0].copy()
+        self.cycle_amplitude = np.abs(self.history[0])
+
+    def check_supported(
+        self, name: str, diodes: bool = True, nonlinear: bool = True, time_varying: bool = True, delays: bool = True
+    ) -> None:
+        """
+        Raise NonLinearSchemeError if the compiled circuit has elements that
+        name (a scheme, mode or solver) does not support, those whose flag is False.
+        """
+        kinds = [
+            (diodes, self.update_diode_dict, "diodes"),
+            (nonlinear, self.update_nonlinear_dict, "Stenosis/SmoothValve elements"),
+            (time_varying, self.update_element_dict, "time-varying elements"),
+            (delays, self.update_delay_dict, "delay lines"),
+        ]
+        for supported, elements, description in kinds:
+            if not supported and elements:
+                raise NonLinearSchemeError(name, description)
+
+    def get_period_steps(self, period: float) -> int:
+        """
+        Number of steps of dt in period.
+
+        Raises:
+            PeriodStepError: if period is not a multiple of dt, fixed steps
+            would never end on period ends
+        """
+        nb_step = round(period / self.dt)
+        if nb_step < 1 or abs(nb_step * self.dt - period) > 1e-9 * period:
+            raise PeriodStepError(period, self.dt)
+        return nb_step
+
+    def periodic_converged(self, period_end: bool) -> bool:
+        """
+        Keep track of the amplitude of the unknowns over the current period
+        and, at the end of a period, compare the state with the one a period
+        before.
+
+        Args:
+            period_end (bool): whether the current state ends a period
+
+        Returns:
+            bool: whether the change over the period is below periodic_tol
+        """
+        x = self.history[0]
+        np.maximum(self.cycle_amplitude, np.abs(x), out=self.cycle_amplitude)
+        if not period_end:
+            return False
+        self.cycles += 1
+        change = np.abs(x - self.cycle_state)
+        tol = self.periodic_tol
+        if self.step_control == "Adaptive":
+            # Changes below the local error tolerance can not be resolved
+            tol = max(tol, self.rtol)
+        # Round-off floor for unknowns that stay close to 0
+        floor = 1e-12 * np.max(self.cycle_amplitude, initial=0.0)
+        converged = bool(np.all(change <= tol * self.cycle_amplitude + floor))
+        self.cycle_state[:] = x
+        self.cycle_amplitude = np.abs(x)
+        return converged
+
+    def infer_period(self, tol: float = 1e-8) -> float | None:
+        """
+        Infer the common period of the sources and active elements, as the
+        smallest multiple of dt over which all of them repeat, sampled every
+        dt over the simulation (at least two periods are needed).
+
+        Args:
+            tol (float, optional): relative tolerance on repeated source values. Defaults to 1e-8.
+
+        Returns:
+            float | None: period, None if nothing varies or it is not periodic
+        """
+        nb_step = int(self.maxtime / self.dt)
+        nb_row = len(self.source_lines) + len(self.element_lines)
+        nb_sample = min(nb_step + 1, self.max_source_table_size // max(1, nb_row))
+        time = np.arange(nb_sample) * self.dt
+        values = np.concatenate((self.evaluate_sources(time), self.evaluate_elements(time)[0]))
+        values = values[np.ptp(values, axis=1) > 0] if len(values) else values
+        if len(values) == 0:
+            return None
+        tol = tol * (1 + np.max(np.abs(values)))
+        # Candidates go back to the initial values, the first one repeating one period is checked everywhere
+        candidates = np.flatnonzero(np.all(np.abs(values - values[:, :1]) <= tol, axis=0))
+        for m in candidates[(candidates > 0) & (candidates <= nb_sample // 2)]:
+            if np.all(np.abs(values[:, m : 2 * m] - values[:, :m]) <= tol):
+                if np.all(np.abs(values[:, m:] - values[:, :-m]) <= tol):
+                    return m * self.dt
+        return None
+
+    def sources_linear(self, time: float, step: float, n: int) -> bool:
+        """
+        Whether the sources sampled at n + 1 points over [time, time + step]
+        are linear within atol and source_tol, relative to the amplitude of
+        each source over the step. Smooth sources are left to the error
+        estimate of the step, this only catches variations it steps over.
+        """
+        w = np.linspace(0, 1, n + 1)
+        samples = self.evaluate_sources(time + step * w)
+        linear = samples[:, :1] + (samples[:, -1:] - samples[:, :1]) * w
+        amplitude = np.max(np.abs(samples), axis=1, keepdims=True)
+        return bool(np.all(np.abs(samples - linear) <= self.atol + self.source_tol * amplitude))
+
+    def get_output_rows(self) -> list[int]:
+        """
+        Unknowns kept in the solution according to self.storage.
+        """
+        if self.storage == "Listened":
+            return list(self.listened.keys())
+        return list(range(self.nbP + self.nbQ))
+
+    def get_output_times(self) -> np.ndarray:
+        """
+        Times kept in the solution: user given output_times within the
+        simulation, or every output_stride steps.
+        """
+        nb_step = int(self.maxtime / self.dt)
+        if self.output_times is not None:
+            output_times = np.sort(np.asarray(self.output_times, dtype=float))
+            return output_times[(output_times >= 0) & (output_times <= nb_step * self.dt)]
+        return np.arange(0, nb_step + 1, self.output_stride) * self.dt
+
+    def step_solution(self) -> np.ndarray:
+        """
+        Solve one timestep from the history, updating diodes states
+        and solving again if needed.
+
+        Returns:
+            np.ndarray: solution at the new step
+        """
+        if self.time_integration == "Exponential":
+            P, Q0, Q1 = self.exponential_propagator()
+            self.stats["substitutions"] += 1
+            return P @ self.history[0] + Q0 @ self.history_source + Q1 @ self.Source
+        self.build_RHS()
+        return self.solve_step()
+
+    def exponential_propagator(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Matrices P, Q0, Q1 of the exact step x1 = P.x0 + Q0.s0 + Q1.s1 over step_size
+        (see methods.exponential_propagator), computed once per step size.
+        Raises np.linalg.LinAlgError if the circuit is not of index 1.
+        """
+        key = ("Exponential", self.step_size)
+        if key not in self.scheme_cache:
+            M0, M1 = self.M0, self.M1
+            if self.sparse:
+                M0, M1 = M0.toarray(), M1.toarray()
+            self.scheme_cache[key] = exponential_propagator(M0, M1, self.step_size)
+            self.stats["factorizations"] += 1
+        return self.scheme_cache[key]
+
+    def solve_step(self, scheme: str | None = None) -> np.ndarray:
+        """
+        Solve LHS.x = RHS for the scheme (time_integration by default),
+        updating diodes states and solving again if needed, or solving
+        for the diodes as an LCP (see lcp_solution).
+
+        Returns:
+            np.ndarray: solution at the new step
+        """
+        if self.diode_mode == "LCP" and self.update_diode_dict:
+            if self.LHS_factor is None:
+                self.factorize_LHS()
+            return self.lcp_solution(self.LHS_factor, self.RHS)
+        RHS = self.RHS
+        x = self.solve_LHS()
+        if self.update_diode(x):
+            self.build_LHS(scheme)
+            try:
+                x = self.solve_LHS()
+            except np.linalg.LinAlgError:
+                self.recompute_diodes()
+                self.build_LHS(scheme)
+                self.RHS = RHS
+                x = self.solve_LHS()
+        return x
+
+    def set_parameters(self, values: list[float] | np.ndarray) -> None:
+        """
+        Change the values of the R, C, L parameters (see self.parameters)
+        in the assembled M0 and M1, without rebuilding the system.
+        """
+        Ms = (self.M0, self.M1)
+        for (_, entries), value in zip(self.parameters, values):
+            for m, row, col, coef in entries:
+                Ms[m][row, col] = coef * value
+        self.base_factor = None
 
     def build_M0M1(self, nbP, paths, startends) -> None:
         """
         Build matrices for zero and first order derivatives
         of the unknown vector.
+        M0 and M1 are either dense arrays or TripletMatrix.
+        Also lists the R, C, L parameters in self.parameters (or in
+        self.element_values if their value is an expression of time, see
+        build_element), the nonlinear elements in self.update_nonlinear_dict,
+        whose rows are assembled linearized (see nonlinear_terms), and the
+        ends of the delay lines in self.update_delay_dict.
         """
         M1 = self.M1
         M0 = self.M0
+        self.parameters = []
+        self.element_values = {}
+        self.element_entries = {}
+        self.update_nonlinear_dict = {}
+        self.update_delay_dict = {}
         update_diode_dict = {}
         line = 0
         idQ = nbP
@@ -185,25 +1245,44 @@ class CircuitSolver:
                 if type(edge.elem) == Resistor:
                     M0[line, idP1] = -1
                     M0[line, idP0] = 1
-                    M0[line, idQ] = -edge.elem.get_value()
+                    self.build_element(edge.elem, line, [(0, idQ, -1.0)])
                 elif type(edge.elem) == Capacitor:
-                    M1[line, idP1] = -edge.elem.get_value()
-                    M1[line, idP0] = edge.elem.get_value()
+                    self.build_element(edge.elem, line, [(1, idP1, -1.0), (1, idP0, 1.0)])
                     M0[line, idQ] = -1
                 elif type(edge.elem) == Inductor:
                     M0[line, idP1] = -1
                     M0[line, idP0] = 1
-                    M1[line, idQ] = -edge.elem.get_value()
+                    self.build_element(edge.elem, line, [(1, idQ, -1.0)])
                 elif type(edge.elem) == Diode:
                     M0[line, idP1] = -1
                     M0[line, idP0] = 1
+                    M0[line, idQ] = 0  # Keeps the entry in sparse storage for set_diode
                     if idP0 == edge.start:
                         update_diode_dict[line] = [True, idP0, idP1, idQ, 1]  # True = Open, 1 -> Q
                     else:
                         update_diode_dict[line] = [True, idP0, idP1, idQ, -1]  # True = Open, -1 -> -Q
+                elif type(edge.elem) == Stenosis:
+                    K = edge.elem.get_value()
+                    M0[line, idP1] = -1
+                    M0[line, idP0] = 1
+                    M0[line, idQ] = -2 * K * Stenosis.flow_scale
+                    self.update_nonlinear_dict[line] = [Stenosis, idP0, idP1, idQ, 1, K]
+                elif type(edge.elem) == SmoothValve:
+                    M0[line, idP1] = -1
+                    M0[line, idP0] = 1
+                    M0[line, idQ] = -edge.elem.get_value()
+                    signQ = 1 if idP0 == edge.start else -1
+                    self.update_nonlinear_dict[line] = [SmoothValve, idP0, idP1, idQ, signQ, edge.elem.get_value()]
                 elif type(edge.elem) == Ground or type(edge.elem) == PSource:
                     idP1 = edge.start
                     M0[line, idP1] = 1
+                elif type(edge.elem) == DelayLine:
+                    # One end of the line (see CircuitGraph), its history is set in Source
+                    signQ = 1 if idP0 == edge.start else -1
+                    idP1 = edge.start
+                    M0[line, idP1] = 1
+                    M0[line, idQ] = -signQ * edge.elem.characteristics()[0]
+                    self.update_delay_dict[line] = [edge.elem, idP1, idQ, signQ]
                 elif type(edge.elem) == QSource:
                     if idP0 == edge.start:
                         M0[line, idQ] = -1
@@ -213,29 +1292,83 @@ class CircuitSolver:
                 idP0 = idP1
                 line += 1
             idQ += 1
-        # Branching equations
+        # Branching equations, one line per node shared by several paths
         arr = np.array(startends).flat
         unique, counts = np.unique(arr, return_counts=True)
-        for i in range(len(counts)):
-            if counts[i] > 1 and unique[i] != -1:
-                idnode = unique[i]
-                idQ = nbP
-                for startend in startends:
-                    if startend[0] == idnode:
-                        M0[line, idQ] = -1
-                    elif startend[1] == idnode:
-                        M0[line, idQ] = 1
-                    idQ += 1
-                line += 1
+        branching = unique[(counts > 1) & (unique != -1)]
+        branch_lines = dict(zip(branching.tolist(), range(line, line + len(branching))))
+        for idQ, (start, end) in enumerate(startends, nbP):
+            if start in branch_lines:
+                M0[branch_lines[start], idQ] = -1
+            if end in branch_lines and end != start:
+                M0[branch_lines[end], idQ] = 1
         return update_diode_dict
 
+    def build_element(self, elem, line: int, entries: list[tuple[int, int, float]]) -> None:
+        """
+        Write the value of an R, C, L element in the (matrix, col, coefficient)
+        entries of its line, and list it in self.parameters.
+        Values given as expressions of time (active elements) are kept in
+        element_values and written during the run (see set_element_values).
+        A capacitor C(t) also gets dC/dt in M0 (order 1 entries), its row
+        conserving the volume: Q = d(C.(P0 - P1))/dt.
+        """
+        Ms = (self.M0, self.M1)
+        if not elem.active:
+            for m, col, coef in entries:
+                Ms[m][line, col] = coef * elem.get_value()
+            self.parameters.append((elem, [(m, line, col, coef) for m, col, coef in entries]))
+            return
+        live = [(m, col, coef, 0) for m, col, coef in entries]
+        if type(elem) == Capacitor:
+            live += [(0, col, coef, 1) for _, col, coef in entries]
+        for m, col, _, _ in live:
+            Ms[m][line, col] = 0  # Keeps the entry in sparse storage for set_element_values
+        self.element_values[line] = elem.get_value()
+        self.element_entries[line] = live
+
+    def evaluate_elements(self, time: float | np.ndarray) -> np.ndarray:
+        """
+        Evaluate the values of the active elements and their time derivatives
+        (centered differences) at once on a scalar time or a time vector.
+
+        Returns:
+            np.ndarray: array of shape (2, n_elements) + time.shape, values then
+            derivatives, rows ordered like update_element_dict
+        """
+        time = np.asarray(time, dtype=float)
+        values = np.zeros((2, len(self.update_element_dict)) + time.shape)
+        h = 1e-6
+        for i, value in enumerate(self.update_element_dict.values()):
+            if callable(value):
+                values[0, i] = value(time)
+                values[1, i] = (value(time + h) - value(time - h)) / (2 * h)
+            else:
+                values[0, i] = value
+        return values
+
+    def set_element_values(self, values: np.ndarray, derivatives: np.ndarray) -> None:
+        """
+        Write the values of the active elements and their derivatives in M0
+        and M1, and refresh their rows of LHS in place: LHS is factorized again
+        on the next solve, usually as a low rank update (see update_factor).
+        """
+        Ms = (self.M0, self.M1)
+        for line, value, derivative in zip(self.element_lines, values, derivatives):
+            for m, col, coef, order in self.element_entries[line]:
+                Ms[m][line, col] = coef * (derivative if order else value)
+            if self.LHS is not None:
+                for col in {col for _, col, _, _ in self.element_entries[line]}:
+                    self.LHS[line, col] = self.M0[line, col] + self.LHS_coef * self.M1[line, col]
+        self.LHS_factor = None
+
     def update_M0M1(self, time: float) -> None:
         """
-        Update M0 and M1 according to the live elements
-        in update_M0_dict and update_M1_dict.
+        Update M0 and M1 according to the active elements
+        in update_element_dict.
         """
-        for line in self.update_M0_dict.keys():
-            self.Source[line] = self.update_M0_dict[line](time)
+        if len(self.element_lines):
+            self.set_element_values(*self.evaluate_elements(time))
 
     def set_diode(self, line: int, diode_open: bool, resistor: bool = False) -> None:
         """Sets the state of a diode to diode_open.
@@ -246,7 +1379,9 @@ class CircuitSolver:
         """
         _, idP0, idP1, idQ, _ = self.update_diode_dict[line]
         self.update_diode_dict[line][0] = diode_open
+        self.resistive_diodes.discard(line)
         if resistor:
+            self.resistive_diodes.add(line)
             self.M0[line, idP1] = -1
             self.M0[line, idP0] = 1
             self.M0[line, idQ] = -0.1
@@ -259,12 +1394,12 @@ class CircuitSolver:
             self.M0[line, idP0] = 0
             self.M0[line, idQ] = 1
 
-    def update_diode(self, step: int) -> bool:
+    def update_diode(self, x: np.ndarray) -> bool:
         """Updates the state of a diode according to the flow passing trough
         or the difference in potential between start and end.
 
         Args:
-            step (int): step of the solution to check
+            x (np.ndarray): solution to check
 
         Returns:
             bool: Whether an update was made or not
@@ -273,11 +1408,11 @@ class CircuitSolver:
         for line in self.update_diode_dict.keys():
             diode_open, idP0, idP1, idQ, signQ = self.update_diode_dict[line]
             if diode_open:
-                if signQ * self.solution[idQ, step + 1] < 0:
+                if signQ * x[idQ] < 0:
                     self.set_diode(line, diode_open=False)
                     recompute = True
             else:
-                if signQ * (self.solution[idP0, step + 1] - self.solution[idP1, step + 1]) > 0:
+                if signQ * (x[idP0] - x[idP1]) > 0:
                     self.set_diode(line, diode_open=True)
                     recompute = True
         return recompute
@@ -301,63 +1436,483 @@ class CircuitSolver:
                 self.set_diode(line, diode_open)
             yield
 
-    def recompute_diodes(self, step: int) -> None:
-        """Replaces diodes with resistors and finds out the flow
-        direction to deduce the actual state of the diodes.
+    def lcp_solution(self, factor, RHS: np.ndarray) -> np.ndarray:
+        """
+        Solve A.x = RHS with ideal diodes, A being factorized in factor with
+        all the diodes open (P1 - P0 = 0 on their rows). A slack z_d >= 0 is
+        added to each diode row: signQ.(P1 - P0) = z_d is the reverse pressure
+        drop of diode d, and its flow w_d = signQ.Q_d >= 0 is affine in z:
+        x = A^-1.RHS + Z.z, w = q + M.z
+        with Z the diode columns of A^-1 (computed once per factorization).
+        Complementarity w.z = 0 (a diode is open or blocks) makes a linear
+        complementarity problem of the size of the number of diodes, solved
+        by Lemke's method. Diode states are consistent after one solve, they
+        are kept in lcp_states.
 
-        Args:
-            step (int): Step of the simulation
+        Returns:
+            np.ndarray: solution
+
+        Raises:
+            ComplementarityError: if Lemke's method finds no solution
+        """
+        lines = list(self.update_diode_dict)
+        idQ = np.array([self.update_diode_dict[line][3] for line in lines])
+        signQ = np.array([self.update_diode_dict[line][4] for line in lines], dtype=float)
+        if id(factor) not in self.lcp_cache:
+            E = np.zeros((len(RHS), len(lines)))
+            E[lines, np.arange(len(lines))] = signQ
+            self.lcp_cache[id(factor)] = (factor, factor.solve(E))
+        Z = self.lcp_cache[id(factor)][1]
+        x = factor.solve(RHS)
+        self.stats["substitutions"] += 1
+        try:
+            z = lemke(signQ[:, None] * Z[idQ], signQ * x[idQ])
+        except np.linalg.LinAlgError as error:
+            raise ComplementarityError(error) from error
+        self.lcp_states = {line: bool(zd <= 0) for line, zd in zip(lines, z)}
+        return x + Z @ z
+
+    def recompute_diodes(self) -> None:
+        """Replaces diodes with resistors and finds out the flow
+        direction to deduce the actual state of the diodes,
+        for the step following the history.
         """
         for line in self.update_diode_dict:
             self.set_diode(line, False, True)
         self.build_LHS()
-        self.build_RHS(step)
-        self.solution[:, step + 1] = np.linalg.solve(self.LHS, self.RHS)
-        self.update_diode(step)
+        self.build_RHS()
+        self.update_diode(self.solve_LHS())
+
+    def build_delays(self) -> None:
+        """
+        Arrays of the ends of the delay lines, ordered like update_delay_dict.
+        The history of end k of a line is
+        h_k(t) = a.w_m(t - delay) + (1 - a).w_k(t - delay)
+        with w = P + (Z - R/4).Q the wave leaving an end, m the other end
+        and a given by DelayLine.characteristics.
+        """
+        ends = list(self.update_delay_dict.values())
+        self.delay_lines = np.array(list(self.update_delay_dict.keys()), dtype=int)
+        self.delay_P = np.array([idP for _, idP, _, _ in ends], dtype=int)
+        self.delay_Q = np.array([idQ for _, _, idQ, _ in ends], dtype=int)
+        self.delay_wave = np.array([signQ * elem.characteristics()[1] for elem, _, _, signQ in ends])
+        self.delay_times = np.array([elem.delay for elem, _, _, _ in ends], dtype=float)
+        self.delay_mix = np.zeros((len(ends), len(ends)))
+        for k, (elem, _, _, _) in enumerate(ends):
+            m = next(i for i, end in enumerate(ends) if end[0] is elem and i != k)
+            a = elem.characteristics()[2]
+            self.delay_mix[k, m] = a
+            self.delay_mix[k, k] = 1 - a
+
+    def delay_waves(self, x: np.ndarray) -> np.ndarray:
+        """
+        Waves leaving the ends of the delay lines for the solution x.
+        """
+        return x[self.delay_P] + self.delay_wave * x[self.delay_Q]
+
+    def steady_state_matrix(self):
+        """
+        M0 with the history of the delay lines taken from the current waves,
+        which is the case in steady state (a delay line is then a resistor R).
+        """
+        if len(self.delay_lines) == 0:
+            return self.M0
+        ends, others = np.nonzero(self.delay_mix)
+        mix = self.delay_mix[ends, others]
+        H = sps.coo_array(
+            (
+                np.concatenate((mix, mix * self.delay_wave[others])),
+                (np.tile(self.delay_lines[ends], 2), np.concatenate((self.delay_P[others], self.delay_Q[others]))),
+            ),
+            shape=self.M0.shape,
+        ).tocsr()
+        return self.M0 - H if self.sparse else self.M0 - H.toarray()
+
+    def start_delays(self) -> None:
+        """
+        Fill the ring buffer of the delay lines with the waves of the current
+        solution, their past being taken constant. The buffer holds the waves
+        every dt over the longest delay, whatever the number of steps.
+        Raises DelayStepError if a delay is shorter than dt.
+        """
+        if len(self.delay_lines) == 0:
+            return
+        if np.min(self.delay_times) < self.dt:
+            raise DelayStepError(float(np.min(self.delay_times)), self.dt)
+        size = int(np.ceil(np.max(self.delay_times) / self.dt)) + 3
+        self.delay_buffer = np.tile(self.delay_waves(self.history[0]), (size, 1))
+        self.delay_step = 0
+        self.delay_time = 0.0
+        self.update_delays(0.0)
+        self.history_source[self.delay_lines] = self.Source[self.delay_lines]
+
+    def push_delays(self, x: np.ndarray) -> None:
+        """
+        Store in the ring buffer the waves at the steps k.dt reached by the
+        new solution x (history[0]), step_size after the previous one, linearly
+        interpolated for steps longer than dt.
+        """
+        size = len(self.delay_buffer)
+        t0, t1 = self.delay_time, self.delay_time + self.step_size
+        w1 = self.delay_waves(x)
+        self.delay_time = t1
+        last = int(t1 / self.dt + 1e-9)
+        rest = t1 - last * self.dt  # Time from the last row to x
+        if last == self.delay_step + 1 and rest < 1e-9 * self.dt:
+            # Step ending on the next row (fixed steps)
+            self.delay_buffer[last % size] = w1
+        elif last > self.delay_step:
+            w0 = self.delay_waves(self.history[1])
+            steps = np.arange(self.delay_step + 1, last + 1)
+            f = (steps * self.dt - t0) / (t1 - t0)
+            self.delay_buffer[steps % size] = w0 + f[:, None] * (w1 - w0)
+        self.delay_step = last
+        if rest > 1e-9 * self.dt:
+            # Next row extrapolated from the last row through x, so that interpolating
+            # between them up to t1 gives the waves of the current solution
+            w_step = self.delay_buffer[last % size]
+            self.delay_buffer[(last + 1) % size] = w_step + (w1 - w_step) * self.dt / rest
+
+    def update_delays(self, time: float) -> None:
+        """
+        Set the history of the delay lines at time in the source vector (see
+        build_delays), the delayed waves being linearly interpolated between
+        the rows of the ring buffer.
+        Steps are at most the shortest delay, so that the history is known.
+        """
+        if self.delay_buffer is None:
+            return
+        steps = np.maximum(time - self.delay_times, 0.0) / self.dt
+        k = np.minimum(steps.astype(int), self.delay_step)
+        rows, ends = k % len(self.delay_buffer), np.arange(len(self.delay_lines))
+        w0 = self.delay_buffer[rows, ends]
+        w1 = self.delay_buffer[(rows + 1) % len(self.delay_buffer), ends]
+        self.Source[self.delay_lines] = self.delay_mix @ (w0 + (steps - k) * (w1 - w0))
 
     def build_source(self, paths) -> dict:
         """
         Build live sources dict from list of paths.
+        Source values (expressions) are kept in self.source_values.
         """
-        update_source_dict = {}
+        self.source_values = {}
         line = 0
         for i, path in enumerate(paths):
             for edge in path:
                 if type(edge.elem) == PSource or type(edge.elem) == QSource:
-                    update_source_dict[line] = calc.calculate(edge.elem.get_value())
+                    self.source_values[line] = edge.elem.get_value()
                 line += 1
+        return self.compile_sources(self.source_values)
+
+    def compile_sources(self, source_values: dict) -> dict:
+        """
+        Compile source expressions into functions of time.
+        """
+        update_source_dict = {}
+        for line, value in source_values.items():
+            update_source_dict[line] = calc.calculate(value) if isinstance(value, str) else value
         return update_source_dict
 
+    def evaluate_sources(self, time: float | np.ndarray) -> np.ndarray:
+        """
+        Evaluate all the live sources at once on a scalar time or a time vector.
+
+        Returns:
+            np.ndarray: array of shape (n_sources,) + time.shape, rows
+            ordered like update_source_dict
+        """
+        time = np.asarray(time, dtype=float)
+        values = np.zeros((len(self.update_source_dict),) + time.shape)
+        for i, source in enumerate(self.update_source_dict.values()):
+            values[i] = source(time) if callable(source) else source
+        return values
+
     def update_source(self, time) -> None:
         """
         Update source vector according to the live sources
-        in update_source_dict.
+        in update_source_dict and the delay lines (see update_delays),
+        and the active elements (see update_M0M1).
+        """
+        self.Source[self.source_lines] = self.evaluate_sources(time)
+        self.update_delays(time)
+        self.update_M0M1(time)
+
+    def build_source_table(self, step: int) -> None:
+        """
+        Evaluate the sources and active elements over the time grid starting
+        at step, for as many steps as fit in max_source_table_size values
+        (the whole simulation if possible).
+        """
+        nb_step = int(self.maxtime / self.dt)
+        size = len(self.source_lines) + 2 * len(self.element_lines)
+        chunk = max(1, self.max_source_table_size // max(1, size))
+        steps = np.arange(step, min(step + chunk, nb_step + 1))
+        self.source_table = self.evaluate_sources(steps * self.dt)
+        self.element_table = self.evaluate_elements(steps * self.dt)
+        self.source_table_start = step
+
+    def reset_source_table(self) -> None:
+        """
+        Discard precomputed source values (timestep or max time changed).
+        """
+        self.source_table = np.zeros((len(self.source_lines), 0))
+        self.element_table = np.zeros((2, len(self.element_lines), 0))
+        self.source_table_start = 0
+
+    def update_source_step(self, step: int) -> None:
+        """
+        Update source vector and active elements with the precomputed values
+        at step, computing the next block of the source table if needed,
+        and the history of the delay lines.
+        """
+        self.update_delays(step * self.dt)
+        if len(self.source_lines) == 0 and len(self.element_lines) == 0:
+            return
+        if not (0 <= step - self.source_table_start < self.source_table.shape[1]):
+            self.build_source_table(step)
+        self.Source[self.source_lines] = self.source_table[:, step - self.source_table_start]
+        if len(self.element_lines):
+            self.set_element_values(*self.element_table[:, :, step - self.source_table_start])
+
+    def scheme_coefficients(self, scheme: str | None = None) -> tuple[float, np.ndarray, float, float, float]:
+        """
+        Coefficients of the scheme (time_integration by default) for the
+        current step_size and past_steps, the scheme reading
+        M0.x + c.M1.x = Source + M1.(sum_j w_j.history[j] + c2.derivative)
+                        + e.(history_source - M0.history[0]) on differential rows
+        The last coefficient is gamma for generalized alpha (see update_derivative).
+        VBDF only gives c, its right hand side comes from the Nordsieck prediction.
+        Exponential does not solve LHS, it is given the coefficients of BDF.
+        Coefficients are computed once per step size.
+
+        Returns:
+            (float, np.ndarray, float, float, float): c, w, c2, e, gamma
         """
-        for line in self.update_source_dict.keys():
-            self.Source[line] = self.update_source_dict[line](time)
+        scheme = self.time_integration if scheme is None else scheme
+        k = self.get_scheme_order(scheme)
+        key = (scheme, self.step_size, k, tuple(self.past_steps[:k]))
+        if key in self.scheme_cache:
+            return self.scheme_cache[key]
+        h = self.step_size
+        if scheme == "Exponential":
+            scheme = "BDF"
+        if scheme == "Generalized-alpha":
+            # Equation at t + alphaf.h divided by alphaf, sources linearly interpolated
+            alpham, alphaf, gamma = generalized_alpha_coefficients(self.rho)
+            c = alpham / (alphaf * gamma * h)
+            coefficients = (c, np.array([c]), -(1 - alpham / gamma) / alphaf, (1 - alphaf) / alphaf, gamma)
+        elif scheme == "VBDF":
+            coefficients = (nordsieck_bdf_vector(k)[1] / h, np.zeros(0), 0.0, 0.0, 0.0)
+        else:
+            w = bdf_weights(np.full(k, h))
+            if np.any(self.past_steps[: k - 1] != h):
+                # Fixed leading coefficient: BDF of constant step h, with the solutions at
+                # t - h, ..., t - k.h interpolated from the history (degree k at most
+                # BDF_MAX_ORDER - 1), so that LHS only depends on h
+                times = -np.cumsum(np.concatenate(([h], self.past_steps[: min(k, BDF_MAX_ORDER - 1)])))
+                w = np.concatenate((w[:1], np.array([interpolation_weights(times, -j * h) for j in range(1, k + 1)]).T @ w[1:]))
+            coefficients = (w[0], -w[1:], 0.0, 0.0, 0.0)
+        self.scheme_cache[key] = coefficients
+        return coefficients
 
-    def build_LHS(self) -> None:
+    def build_LHS(self, scheme: str | None = None) -> None:
         """
         Build left hand side of the equation.
+        The previous factorization is discarded.
         """
-        self.LHS = np.zeros_like(self.M0)
-        if self.time_integration == "BDF":
-            self.LHS = self.M0 + self.M1 / self.dt
-        elif self.time_integration == "BDF2":
-            self.LHS = self.M0 + 3 * self.M1 / (2 * self.dt)
+        self.LHS_coef = self.scheme_coefficients(scheme)[0]
+        self.LHS = self.M0 + self.LHS_coef * self.M1
+        self.LHS_factor = None
         return
 
-    def build_RHS(self, step: int) -> None:
+    def LHS_key(self) -> tuple | None:
         """
-        Build right hand side of the equation.
+        Key identifying the current LHS in the factorization cache:
+        coefficient of M1 (scheme and step size, BDF keeping a fixed leading
+        coefficient when the steps vary) and diode open/closed bitmask.
+        None if some diodes are replaced by resistors or with active
+        elements (not cached).
         """
-        self.RHS = np.zeros_like(self.Source)
-        if self.time_integration == "BDF":
-            self.RHS = self.Source + np.matmul(self.M1, self.solution[:, step] / self.dt)
-        elif self.time_integration == "BDF2":
-            self.RHS = self.Source + np.matmul(
-                self.M1, (4 * self.solution[:, step] - self.solution[:, step - 1]) / (2 * self.dt)
-            )
+        if self.resistive_diodes or len(self.element_lines):
+            return None
+        mask = 0
+        for i, line in enumerate(self.update_diode_dict):
+            if self.update_diode_dict[line][0]:
+                mask |= 1 << i
+        return (self.LHS_coef, mask)
+
+    def factorize_LHS(self) -> None:
+        """
+        Compute the LU factorization of the current LHS, or fetch it
+        from the cache if this diode configuration was already factorized,
+        or update the last full factorization if only diode rows changed
+        (see update_factor).
+        Raises np.linalg.LinAlgError if LHS is singular.
+        """
+        key = self.LHS_key()
+        if key is not None:
+            self.LHS_factor = self.factor_cache.get(key)
+            self.stats["cache_hits"] = self.factor_cache.hits
+            self.stats["cache_misses"] = self.factor_cache.misses
+            if self.LHS_factor is not None:
+                return
+        self.LHS_factor = self.update_factor()
+        if self.LHS_factor is None:
+            self.LHS_factor = factorize(self.LHS)
+            self.base_factor = (self.LHS_coef, self.LHS.copy(), self.LHS_factor, {})
+            self.stats["factorizations"] += 1
+        if key is not None:
+            self.factor_cache.put(key, self.LHS_factor)
+
+    def update_factor(self) -> LowRankUpdate | None:
+        """
+        Factorization of LHS as a low rank update of the last full
+        factorization, if they only differ by at most max_updated_rows rows
+        (diode switching, active elements). For the same LHS_coef, only
+        these rows can differ, and only they are compared. The inverse
+        columns of the update are kept for the next updates of the same rows.
+        None if LHS needs a full factorization: other LHS_coef, too many
+        rows or ill-conditioned update.
+        """
+        if self.base_factor is None or self.max_updated_rows <= 0:
+            return None
+        base_coef, base_LHS, base_factor, columns = self.base_factor
+        if base_coef != self.LHS_coef or base_LHS.shape != self.LHS.shape:
+            return None
+        lines = np.array(sorted(set(self.update_diode_dict) | set(self.element_lines.tolist())), dtype=int)
+        if len(lines) == 0:
+            return base_factor
+        difference = self.LHS[lines] - base_LHS[lines]
+        if self.sparse:
+            difference = difference.toarray()
+        changed = np.flatnonzero(np.any(difference != 0, axis=1))
+        rows, delta = lines[changed], difference[changed]
+        if len(rows) > self.max_updated_rows:
+            return None
+        if len(rows) == 0:
+            return base_factor
+        try:
+            factor = LowRankUpdate(base_factor, list(rows), delta, Z=columns.get(tuple(rows)))
+        except np.linalg.LinAlgError:
+            return None
+        columns[tuple(rows)] = factor.Z
+        self.stats["low_rank_updates"] += 1
+        return factor
+
+    def solve_LHS(self) -> np.ndarray:
+        """
+        Solve LHS.x = RHS by forward/back substitution, factorizing
+        LHS first only if it changed since the last call.
+        With nonlinear elements, the nonlinear system is solved by
+        modified Newton from the current solution (see newton_solution).
+        """
+        if self.update_nonlinear_dict:
+            return self.newton_solution(self.history[0])
+        if self.LHS_factor is None:
+            self.factorize_LHS()
+        self.stats["substitutions"] += 1
+        return self.LHS_factor.solve(self.RHS)
+
+    def nonlinear_terms(self, x: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Difference N(x) between the nonlinear rows and their linearized
+        assembly in M0 (see build_M0M1), such that the system reads
+        LHS.x + N(x) = RHS, and the entries of the Jacobian of N:
+        - Stenosis: N = -K.Q.|Q| + 2.K.flow_scale.Q, slope on Q such that the
+          Jacobian entry is -2.K.max(|Q|, flow_scale), invertible at zero flow
+        - SmoothValve: N = signQ.psi(signQ.(P0 - P1)) - (P0 - P1),
+          slopes psi' - 1 on P0 and 1 - psi' on P1
+
+        Returns:
+            (np.ndarray, np.ndarray, np.ndarray, np.ndarray): N(x), and rows, columns, values of the slopes
+        """
+        elems, idP0, idP1, idQ, signQ, values = zip(*self.update_nonlinear_dict.values())
+        lines = np.array(list(self.update_nonlinear_dict), dtype=int)
+        idP0, idP1, idQ = np.array(idP0), np.array(idP1), np.array(idQ)
+        signQ, values = np.array(signQ, dtype=float), np.array(values, dtype=float)
+        N = np.zeros(len(x))
+        rows, cols, slopes = [], [], []
+        stenosis = np.array([elem is Stenosis for elem in elems])
+        if stenosis.any():
+            K, Q = values[stenosis], x[idQ[stenosis]]
+            drop, slope = Stenosis.law(Q, K)
+            N[lines[stenosis]] = -drop + 2 * K * Stenosis.flow_scale * Q
+            rows.append(lines[stenosis])
+            cols.append(idQ[stenosis])
+            slopes.append(2 * K * Stenosis.flow_scale - np.maximum(slope, 2 * K * Stenosis.flow_scale))
+        valve = ~stenosis
+        if valve.any():
+            dP = x[idP0[valve]] - x[idP1[valve]]
+            psi, slope = SmoothValve.law(signQ[valve] * dP)
+            N[lines[valve]] = signQ[valve] * psi - dP
+            rows.extend([lines[valve], lines[valve]])
+            cols.extend([idP0[valve], idP1[valve]])
+            slopes.extend([slope - 1, 1 - slope])
+        return N, np.concatenate(rows), np.concatenate(cols), np.concatenate(slopes)
+
+    def refresh_jacobian(self, x: np.ndarray) -> None:
+        """
+        Factorize the Jacobian LHS + N'(x) of the nonlinear system at x.
+        Raises np.linalg.LinAlgError if it is singular.
+        """
+        _, rows, cols, slopes = self.nonlinear_terms(x)
+        if self.sparse:
+            J = sps.csc_array(self.LHS + sps.csr_array((slopes, (rows, cols)), shape=self.LHS.shape))
+        else:
+            J = self.LHS.copy()
+            np.add.at(J, (rows, cols), slopes)
+        self.jacobian = (self.LHS, factorize(J))
+        self.stats["factorizations"] += 1
+        self.stats["jacobian_refreshes"] += 1
+
+    def newton_solution(self, x: np.ndarray) -> np.ndarray:
+        """
+        Solve LHS.x + N(x) = RHS (see nonlinear_terms) by modified Newton from x:
+        the Jacobian is factorized at one iterate and reused over the following
+        iterations and steps, as long as LHS is the same. It is refreshed at the
+        current iterate after newton_reuse iterations, and at every iterate
+        (full Newton) for the rest of the solve once the corrections shrink by
+        less than newton_contraction per iteration.
+        Raises NewtonConvergenceError after max_newton_iterations.
+
+        Returns:
+            np.ndarray: solution
+        """
+        previous, reused, full = np.inf, 0, False
+        for _ in range(self.max_newton_iterations):
+            if self.jacobian is None or self.jacobian[0] is not self.LHS:
+                self.refresh_jacobian(x)
+                previous, reused = np.inf, 0
+            dx = self.jacobian[1].solve(self.RHS - self.LHS @ x - self.nonlinear_terms(x)[0])
+            x = x + dx
+            self.stats["substitutions"] += 1
+            self.stats["newton_iterations"] += 1
+            correction = np.max(np.abs(dx))
+            rate = correction / previous
+            # Remaining error estimated from the contraction rate of this solve
+            factor = rate / (1 - rate) if 0 < rate < 0.5 else 1.0
+            if factor * correction <= self.newton_tol * max(1.0, np.max(np.abs(x))):
+                return x
+            reused += 1
+            full = full or rate > self.newton_contraction
+            if full or reused >= self.newton_reuse:
+                self.jacobian = None
+            previous = correction
+        raise NewtonConvergenceError(self.max_newton_iterations)
+
+    def build_RHS(self, scheme: str | None = None) -> None:
+        """
+        Build right hand side of the equation from the history.
+        """
+        scheme = self.time_integration if scheme is None else scheme
+        c, w, c2, e, _ = self.scheme_coefficients(scheme)
+        if scheme == "VBDF":
+            zp = self.nordsieck_prediction
+            self.RHS = self.Source + self.M1 @ (c * zp[0] - zp[1] / self.step_size)
+            return
+        self.RHS = self.Source + self.M1 @ (w @ self.history[: len(w)] + c2 * self.derivative)
+        if e:
+            # Algebraic equations are written at the new step, not interpolated
+            self.RHS += e * self.differential_rows * (self.history_source - self.M0 @ self.history[0])
         return
 
     def check_no_solution(self, nbP, nbQ, paths, startends) -> int:
@@ -394,33 +1949,23 @@ class CircuitSolver:
         same pressure as the node on the other side of the edge) we
         remove them and update edges accordingly.
         """
-        rem = []
+        # New index of each node, -1 for the removed ones (and the -1 ends)
+        new_index = {-1: -1}
+        kept = []
         for i, node in enumerate(nodes):
             if node.type == "Source":
-                rem.append(i)
-        rem.reverse()
-        for i in rem:
-            del nodes[i]
-            for path in paths:
-                for edge in path:
-                    if edge.start == i:
-                        edge.start = -1
-                    if edge.end == i:
-                        edge.end = -1
-                    if edge.start > i:
-                        edge.start -= 1
-                    if edge.end > i:
-                        edge.end -= 1
-            for startend in startends:
-                if startend[0] == i:
-                    startend[0] = -1
-                if startend[1] == i:
-                    startend[1] = -1
-                if startend[0] > i:
-                    startend[0] -= 1
-                if startend[1] > i:
-                    startend[1] -= 1
-        return nodes, paths, startends
+                new_index[i] = -1
+            else:
+                new_index[i] = len(kept)
+                kept.append(node)
+        for path in paths:
+            for edge in path:
+                edge.start = new_index[edge.start]
+                edge.end = new_index[edge.end]
+        for startend in startends:
+            startend[0] = new_index[startend[0]]
+            startend[1] = new_index[startend[1]]
+        return kept, paths, startends
 
     def set_listeners(self, nodes, paths, startends) -> None:
         listened = {}
@@ -438,7 +1983,7 @@ class CircuitSolver:
                 else:
                     idP1 = edge.start
                     sign = -1
-                if isinstance(edge.elem, Ground):
+                if isinstance(edge.elem, (Ground, DelayLine)):
                     idP1 = edge.start
                 if edge.elem.listened != 0:
                     signs[len(nodes) + i] = sign * edge.elem.listened
@@ -0,0 +1,301 @@
+import numpy as np
+from exceptions.solverexceptions import ParametersShapeError, UnsupportedSchemeError
+from solvers.circuitsolver import CircuitSolver
+from solvers.graphedge import GraphEdge
+from solvers.graphnode import GraphNode
+from solvers.methods import bdf_weights, extrapolation_weights
+
+
+def batched_inv(A: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Invert a stack of square matrices, tolerating singular ones.
+
+    Args:
+        A (np.ndarray): stacked matrices of shape (n_samples, n, n)
+
+    Returns:
+        (np.ndarray, np.ndarray): inverses (NaN for singular matrices)
+        and boolean mask of successfully inverted matrices
+    """
+    try:
+        return np.linalg.inv(A), np.ones(len(A), dtype=bool)
+    except np.linalg.LinAlgError:
+        inv = np.full_like(A, np.nan)
+        ok = np.zeros(len(A), dtype=bool)
+        for i in range(len(A)):
+            try:
+                inv[i] = np.linalg.inv(A[i])
+                ok[i] = True
+            except np.linalg.LinAlgError:
+                pass
+        return inv, ok
+
+
+def batched_matvec(A: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """
+    Product of stacked matrices (n_samples, n, m) with stacked vectors (n_samples, m).
+    """
+    return np.matmul(A, x[..., None])[..., 0]
+
+
+class EnsembleSolver:
+    def __init__(self, csolver: CircuitSolver | None = None) -> None:
+        """
+        A class for solving many variants of one circuit topology that only
+        differ in their R, C, L values. All the samples are advanced together
+        with batched linear algebra on stacked (n_samples, n, n) matrices.
+
+        Timestep, max time and integration scheme are those of csolver.
+        """
+        self.csolver = CircuitSolver() if csolver is None else csolver
+        self.M0 = None  # Stacked matrices for order 0 derivatives
+        self.M1 = None  # Stacked matrices for order 1 derivatives
+        self.LHS_inv = None
+        self.solution = None  # (n_samples, n_rows, n_steps + 1)
+        self.time = None
+        self.rows = []  # Unknowns stored in solution
+        self.status = None  # 0 : OK, 2 : singular system for this sample
+        self.diode_lines = []
+        self.diode_open = None  # (n_samples, n_diodes)
+        self.diode_resistive = None  # (n_samples, n_diodes)
+        self.order = 1  # Order of the BDF scheme
+        self.step_size = None
+        self.history = None  # (order, n_samples, n)
+        self.stats = {}
+
+    def get_parameters(self) -> list:
+        """
+        R, C, L elements of the compiled circuit, in the order
+        of the columns of the parameter array.
+        """
+        return [elem for elem, _ in self.csolver.parameters]
+
+    def compile(
+        self, nbP: int, nbQ: int, nodes: list[GraphNode], paths: list[list[GraphEdge]], startends: list[list[int]]
+    ) -> int:
+        """
+        Assemble the reference circuit once (dense backend).
+        Returns the same codes as CircuitSolver.check_no_solution.
+        """
+        backend = self.csolver.backend
+        self.csolver.set_backend("Dense")
+        cns = self.csolver.assemble(nbP, nbQ, nodes, paths, startends)
+        self.csolver.set_backend(backend)
+        return cns
+
+    def solve(
+        self,
+        nbP: int,
+        nbQ: int,
+        nodes: list[GraphNode],
+        paths: list[list[GraphEdge]],
+        startends: list[list[int]],
+        params: np.ndarray,
+        listeners_only: bool = False,
+    ) -> int:
+        """
+        Compile the topology and run all the samples of params.
+
+        Args:
+            params (np.ndarray): array of shape (n_samples, n_params), see get_parameters
+            listeners_only (bool, optional): store only listened unknowns. Defaults to False.
+
+        Returns:
+            int: 0 if OK, 1 if under constrained, 2 if over constrained
+        """
+        cns = self.compile(nbP, nbQ, nodes, paths, startends)
+        if cns:
+            return cns
+        return self.run(params, listeners_only)
+
+    def build_M0M1(self, params: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Build stacked M0 and M1 from the compiled matrices,
+        with parameter values of each sample.
+        """
+        n_samples = params.shape[0]
+        M0 = np.repeat(self.csolver.M0[None], n_samples, axis=0)
+        M1 = np.repeat(self.csolver.M1[None], n_samples, axis=0)
+        Ms = (M0, M1)
+        for k, (_, entries) in enumerate(self.csolver.parameters):
+            for m, row, col, coef in entries:
+                Ms[m][:, row, col] = coef * params[:, k]
+        return M0, M1
+
+    def set_diodes(self, j: int, samples: np.ndarray) -> None:
+        """
+        Write the row of diode j in M0 for the given samples,
+        according to diode_open and diode_resistive (see CircuitSolver.set_diode).
+        """
+        _, idP0, idP1, idQ, _ = self.csolver.update_diode_dict[self.diode_lines[j]]
+        line = self.diode_lines[j]
+        resistive = samples & self.diode_resistive[:, j]
+        opened = samples & ~self.diode_resistive[:, j] & self.diode_open[:, j]
+        closed = samples & ~self.diode_resistive[:, j] & ~self.diode_open[:, j]
+        for mask, values in [(resistive, (-1, 1, -0.1)), (opened, (1, -1, 0)), (closed, (0, 0, 1))]:
+            self.M0[mask, line, idP1] = values[0]
+            self.M0[mask, line, idP0] = values[1]
+            self.M0[mask, line, idQ] = values[2]
+
+    def update_diodes(self, x: np.ndarray, samples: np.ndarray) -> np.ndarray:
+        """
+        Vectorized CircuitSolver.update_diode over the samples.
+
+        Returns:
+            np.ndarray: mask of the samples where a diode changed state
+        """
+        switched = np.zeros(len(x), dtype=bool)
+        for j, line in enumerate(self.diode_lines):
+            _, idP0, idP1, idQ, signQ = self.csolver.update_diode_dict[line]
+            diode_open = self.diode_open[:, j]
+            closing = diode_open & (signQ * x[:, idQ] < 0)
+            opening = ~diode_open & (signQ * (x[:, idP0] - x[:, idP1]) > 0)
+            flip = samples & (closing | opening)
+            self.diode_open[flip, j] = ~diode_open[flip]
+            self.diode_resistive[flip, j] = False
+            self.set_diodes(j, flip)
+            switched |= flip
+        return switched
+
+    def build_LHS(self, idx: np.ndarray) -> np.ndarray:
+        """
+        Build and invert LHS for samples idx, for the current scheme and step_size.
+
+        Returns:
+            np.ndarray: mask over idx of non singular LHS
+        """
+        c = bdf_weights([self.step_size] * self.order)[0]
+        self.LHS_inv[idx], ok = batched_inv(self.M0[idx] + c * self.M1[idx])
+        self.stats["factorizations"] += len(idx)
+        return ok
+
+    def build_RHS(self, idx: np.ndarray) -> np.ndarray:
+        """
+        Build right hand side for samples idx from the history.
+        """
+        w = -bdf_weights([self.step_size] * self.order)[1:]
+        # Indexing all the samples would copy the stacked matrices at each step
+        M1 = self.M1 if len(idx) == len(self.M1) else self.M1[idx]
+        return self.csolver.Source + batched_matvec(M1, np.tensordot(w, self.history[: self.order, idx], 1))
+
+    def recompute_diodes(self, idx: np.ndarray, x_new: np.ndarray) -> None:
+        """
+        Vectorized CircuitSolver.recompute_diodes for samples idx: diodes are
+        replaced by resistors to find out the flow direction, then LHS is rebuilt.
+        Samples where LHS is still singular are marked with status 2.
+        """
+        samples = np.zeros(len(x_new), dtype=bool)
+        samples[idx] = True
+        self.diode_open[idx] = False
+        self.diode_resistive[idx] = True
+        for j in range(len(self.diode_lines)):
+            self.set_diodes(j, samples)
+        self.build_LHS(idx)
+        x_new[idx] = batched_matvec(self.LHS_inv[idx], self.build_RHS(idx))
+        self.update_diodes(x_new, samples)
+        ok = self.build_LHS(idx)
+        self.status[idx[~ok]] = 2
+
+    def step_solution(self, idx: np.ndarray) -> np.ndarray:
+        """
+        Vectorized CircuitSolver.step_solution, solving one step from the
+        history, updating diodes states and solving again where needed.
+        """
+        x_new = batched_matvec(self.LHS_inv, self.build_RHS(idx))
+        self.stats["substitutions"] += len(idx)
+        switched = self.update_diodes(x_new, self.status == 0)
+        if switched.any():
+            sw = np.flatnonzero(switched)
+            ok = self.build_LHS(sw)
+            x_new[sw] = batched_matvec(self.LHS_inv[sw], self.build_RHS(sw))
+            if not ok.all():
+                self.recompute_diodes(sw[~ok], x_new)
+                x_new[sw[~ok]] = batched_matvec(self.LHS_inv[sw[~ok]], self.build_RHS(sw[~ok]))
+        return x_new
+
+    def startup_step(self, idx: np.ndarray, time: float) -> np.ndarray:
+        """
+        Vectorized CircuitSolver.startup_step, extrapolating implicit Euler
+        results on 1, 2, ..., k substeps for the first steps of BDFk.
+        """
+        cs = self.csolver
+        order, history = self.order, self.history
+        substeps = list(range(1, order + 1))
+        results = []
+        self.order = 1
+        for n_sub in substeps:
+            self.step_size = cs.dt / n_sub
+            self.build_LHS(idx)
+            self.history = history[:1].copy()
+            for i in range(1, n_sub + 1):
+                cs.update_source(time + i * self.step_size)
+                self.history[0] = self.step_solution(idx)
+            results.append(self.history[0])
+        self.order, self.history, self.step_size = order, history, cs.dt
+        self.build_LHS(idx)
+        return np.tensordot(extrapolation_weights(substeps)[-1], results, 1)
+
+    def run(self, params: np.ndarray, listeners_only: bool = False) -> int:
+        """
+        Run all the samples on the compiled circuit, with fixed-order BDF.
+
+        Args:
+            params (np.ndarray): array of shape (n_samples, n_params), see get_parameters
+            listeners_only (bool, optional): store only listened unknowns. Defaults to False.
+
+        Returns:
+            int: 0, samples with a singular system have status 2 and NaN solution
+        """
+        cs = self.csolver
+        if not cs.time_integration.startswith("BDF"):
+            raise UnsupportedSchemeError(cs.time_integration)
+        cs.check_supported("Ensemble solver", nonlinear=False, time_varying=False, delays=False)
+        params = np.atleast_2d(np.asarray(params, dtype=float))
+        if params.shape[1] != len(cs.parameters):
+            raise ParametersShapeError(params.shape[1], len(cs.parameters))
+        n_samples = params.shape[0]
+        n = cs.nbP + cs.nbQ
+        nb_step = int(cs.maxtime / cs.dt)
+        idx = np.arange(n_samples)
+        self.stats = {"factorizations": 0, "substitutions": 0}
+        self.order = cs.get_scheme_order()
+        self.step_size = cs.dt
+
+        self.M0, self.M1 = self.build_M0M1(params)
+        self.LHS_inv = np.zeros_like(self.M0)
+        self.rows = list(cs.listened.keys()) if listeners_only else list(range(n))
+        signs = np.array([cs.signs.get(row, 1) for row in self.rows], dtype=float)
+        self.time = np.arange(nb_step + 1) * cs.dt
+        self.solution = np.zeros((n_samples, len(self.rows), nb_step + 1))
+        self.status = np.zeros(n_samples, dtype=int)
+        self.diode_lines = list(cs.update_diode_dict.keys())
+        self.diode_open = np.ones((n_samples, len(self.diode_lines)), dtype=bool)
+        self.diode_resistive = np.zeros((n_samples, len(self.diode_lines)), dtype=bool)
+
+        cs.reset_source_table()
+        cs.update_source_step(0)
+        # history[0] holds the solutions at the current step, history[j] j steps before
+        self.history = np.zeros((self.order, n_samples, n))
+        if self.diode_lines:
+            self.recompute_diodes(idx, np.zeros((n_samples, n)))
+
+        # Initializing with steady-state solution
+        M0_inv, ok = batched_inv(self.M0)
+        self.status[~ok] = 2
+        self.history[:] = batched_matvec(M0_inv, np.broadcast_to(cs.Source, (n_samples, n)))
+        self.solution[:, :, 0] = self.history[0][:, self.rows] * signs
+        if not self.diode_lines:
+            self.build_LHS(idx)
+
+        for step in range(nb_step):
+            cs.update_source_step(step + 1)
+            if step < self.order - 1:
+                x_new = self.startup_step(idx, step * cs.dt)
+            else:
+                x_new = self.step_solution(idx)
+            self.history[1:] = self.history[:-1]
+            self.history[0] = x_new
+            self.solution[:, :, step + 1] = x_new[:, self.rows] * signs
+
+        self.solution[self.status != 0] = np.nan
+        return 0
@@ -0,0 +1,172 @@
+import warnings
+from collections import OrderedDict
+import numpy as np
+import scipy.sparse as sps
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse.linalg import splu
+
+
+class DenseLU:
+    def __init__(self, A: np.ndarray) -> None:
+        """
+        LU factorization of a dense square matrix, computed once
+        and reused for any number of right hand sides.
+
+        Raises np.linalg.LinAlgError if the matrix is singular,
+        like np.linalg.solve would.
+        """
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            self.lu, self.piv = lu_factor(A, check_finite=False)
+        if np.any(np.diag(self.lu) == 0):
+            raise np.linalg.LinAlgError("Singular matrix")
+
+    def solve(self, b: np.ndarray) -> np.ndarray:
+        """
+        Forward and back substitution with the stored factors.
+        """
+        return lu_solve((self.lu, self.piv), b, check_finite=False)
+
+
+class SparseLU:
+    def __init__(self, A: sps.sparray) -> None:
+        """
+        Sparse LU factorization (SuperLU) of a square sparse matrix.
+
+        Raises np.linalg.LinAlgError if the matrix is singular.
+        """
+        try:
+            self.lu = splu(sps.csc_array(A))
+        except RuntimeError as e:
+            raise np.linalg.LinAlgError(str(e))
+
+    def solve(self, b: np.ndarray) -> np.ndarray:
+        """
+        Forward and back substitution with the stored factors.
+        """
+        return self.lu.solve(b)
+
+
+class LowRankUpdate:
+    def __init__(
+        self,
+        base: DenseLU | SparseLU,
+        rows: list[int],
+        delta: np.ndarray,
+        max_condition: float = 1e10,
+        Z: np.ndarray | None = None,
+    ) -> None:
+        """
+        Factorization of A0 + E.delta, where A0 is factorized in base and
+        the k rows of A0 given by rows are changed by delta (k x n), with the
+        Sherman-Morrison-Woodbury formula:
+        (A0 + E.delta)^-1 = A0^-1 - Z.(I + delta.Z)^-1.delta.A0^-1, Z = A0^-1.E
+        The update costs k solves with base (none if Z is given, from a
+        previous update of the same rows), then each solve costs one solve
+        with base and O(n.k).
+
+        Raises np.linalg.LinAlgError if the capacitance matrix I + delta.Z is
+        singular or its condition number exceeds max_condition.
+        """
+        if Z is None:
+            E = np.zeros((delta.shape[1], len(rows)))
+            E[rows, np.arange(len(rows))] = 1.0
+            Z = base.solve(E)
+        self.base = base
+        self.delta = delta
+        self.Z = Z
+        capacitance = np.eye(len(rows)) + delta @ self.Z
+        if np.linalg.cond(capacitance) > max_condition:
+            raise np.linalg.LinAlgError("Ill-conditioned low rank update")
+        self.capacitance = DenseLU(capacitance)
+
+    def solve(self, b: np.ndarray) -> np.ndarray:
+        """
+        Solve with the base factors, then correct for the changed rows.
+        """
+        y = self.base.solve(b)
+        return y - self.Z @ self.capacitance.solve(self.delta @ y)
+
+
+def factorize(A: np.ndarray | sps.sparray) -> DenseLU | SparseLU:
+    """
+    Factorize A with the LU matching its storage (dense or sparse).
+    """
+    if sps.issparse(A):
+        return SparseLU(A)
+    return DenseLU(A)
+
+
+class TripletMatrix:
+    def __init__(self, shape: tuple[int, int]) -> None:
+        """
+        Sparse matrix under assembly, stored as (row, col) -> value triplets.
+
+        Assignment overwrites like for a dense array, and entries set to 0
+        are kept as explicit zeros so that they can be modified in place
+        once converted to CSR.
+        """
+        self.shape = shape
+        self.entries = {}
+
+    def __setitem__(self, key: tuple[int, int], value: float) -> None:
+        i, j = key
+        self.entries[(i % self.shape[0], j % self.shape[1])] = value
+
+    def tocsr(self) -> sps.csr_array:
+        """
+        Convert to CSR through COO format.
+        """
+        if self.entries:
+            rows, cols = np.array(list(self.entries.keys())).T
+        else:
+            rows, cols = np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        data = np.fromiter(self.entries.values(), dtype=float, count=len(self.entries))
+        return sps.coo_array((data, (rows, cols)), shape=self.shape).tocsr()
+
+
+class FactorizationCache:
+    def __init__(self, capacity: int = 16) -> None:
+        """
+        Least recently used cache of factorizations.
+
+        Args:
+            capacity (int, optional): maximum number of factorizations kept,
+            0 disables the cache. Defaults to 16.
+        """
+        self.capacity = capacity
+        self.factors = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> DenseLU | SparseLU | None:
+        """
+        Return the factorization stored under key, or None on a miss.
+        """
+        factor = self.factors.get(key)
+        if factor is None:
+            self.misses += 1
+            return None
+        self.factors.move_to_end(key)
+        self.hits += 1
+        return factor
+
+    def put(self, key, factor: DenseLU | SparseLU) -> None:
+        """
+        Store a factorization, evicting the least recently used ones
+        if capacity is exceeded.
+        """
+        if self.capacity <= 0:
+            return
+        self.factors[key] = factor
+        self.factors.move_to_end(key)
+        while len(self.factors) > self.capacity:
+            self.factors.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Remove all factorizations and reset statistics.
+        """
+        self.factors.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,178 @@
+import numpy as np
+from exceptions.solverexceptions import PeriodError
+from solvers.circuitsolver import CircuitSolver
+from solvers.factorization import factorize
+from solvers.graphedge import GraphEdge
+from solvers.graphnode import GraphNode
+
+
+class FrequencySolver:
+    def __init__(self, csolver: CircuitSolver | None = None) -> None:
+        """
+        A class for the frequency response of a circuit, solving
+        (M0 + j.w.M1).X = S for each frequency instead of stepping in time.
+        Each source is excited alone with a unit amplitude, so that X holds
+        the transfer functions from each source to all the unknowns.
+
+        The circuit is linear with diodes kept in their current state
+        (open after assembly).
+        """
+        self.csolver = CircuitSolver() if csolver is None else csolver
+        self.frequencies = None  # In Hz
+        self.response = None  # (n_sources, n_unknowns, n_frequencies), listener signs applied
+        self.status = None  # 0 : OK, 2 : singular system at this frequency
+        self.result = None  # Periodic steady state, see run_periodic
+
+    def compile(
+        self, nbP: int, nbQ: int, nodes: list[GraphNode], paths: list[list[GraphEdge]], startends: list[list[int]]
+    ) -> int:
+        """
+        Assemble the circuit. Returns the same codes as CircuitSolver.check_no_solution.
+        """
+        return self.csolver.assemble(nbP, nbQ, nodes, paths, startends)
+
+    def solve(
+        self,
+        nbP: int,
+        nbQ: int,
+        nodes: list[GraphNode],
+        paths: list[list[GraphEdge]],
+        startends: list[list[int]],
+        frequencies: np.ndarray,
+    ) -> int:
+        """
+        Compile the circuit and compute its response at frequencies (see run).
+
+        Returns:
+            int: 0 if OK, 1 if under constrained, 2 if over constrained
+        """
+        cns = self.compile(nbP, nbQ, nodes, paths, startends)
+        if cns:
+            return cns
+        return self.run(frequencies)
+
+    def run(self, frequencies: np.ndarray) -> int:
+        """
+        Solve the compiled circuit at each frequency, for all the sources at once.
+        Dense systems are solved in one batched call over the frequencies,
+        sparse systems are factorized once per frequency. Frequencies where
+        the system is singular get status 2 and a NaN response.
+
+        Args:
+            frequencies (np.ndarray): frequencies in Hz
+
+        Returns:
+            int: 0
+        """
+        cs = self.csolver
+        self.frequencies = np.atleast_1d(np.asarray(frequencies, dtype=float))
+        X, self.status = self.source_responses(2 * np.pi * self.frequencies)
+        signs = np.array([cs.signs.get(row, 1) for row in range(cs.nbP + cs.nbQ)], dtype=float)
+        self.response = X.transpose(2, 1, 0) * signs[:, None]
+        return 0
+
+    def source_responses(self, omega: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Solve (M0 + j.w.M1).X = S for each angular frequency w of omega, with one
+        column of S per source (unit excitation of its line).
+
+        Returns:
+            (np.ndarray, np.ndarray): X of shape (n_frequencies, n_unknowns, n_sources),
+            NaN where singular, and status of each frequency (0 : OK, 2 : singular)
+        """
+        cs = self.csolver
+        n = cs.nbP + cs.nbQ
+        S = np.zeros((n, len(cs.source_lines)))
+        S[cs.source_lines, np.arange(len(cs.source_lines))] = 1.0
+        X = np.full((len(omega), n, S.shape[1]), np.nan, dtype=complex)
+        status = np.zeros(len(omega), dtype=int)
+
+        if not cs.sparse:
+            A = cs.M0[None] + 1j * omega[:, None, None] * cs.M1[None]
+            try:
+                X[:] = np.linalg.solve(A, S)
+            except np.linalg.LinAlgError:
+                for i in range(len(omega)):
+                    try:
+                        X[i] = np.linalg.solve(A[i], S)
+                    except np.linalg.LinAlgError:
+                        status[i] = 2
+        else:
+            for i, w in enumerate(omega):
+                try:
+                    X[i] = factorize(cs.M0 + 1j * w * cs.M1).solve(S.astype(complex))
+                except np.linalg.LinAlgError:
+                    status[i] = 2
+        X[status != 0] = np.nan
+        return X, status
+
+    def solve_periodic(
+        self, nbP: int, nbQ: int, nodes: list[GraphNode], paths: list[list[GraphEdge]], startends: list[list[int]]
+    ) -> int:
+        """
+        Compile the circuit and compute its periodic steady state (see run_periodic).
+
+        Returns:
+            int: 0 if OK, 1 if under constrained, 2 if over constrained or singular
+        """
+        cns = self.compile(nbP, nbQ, nodes, paths, startends)
+        if cns:
+            return cns
+        return self.run_periodic()
+
+    def run_periodic(self) -> int:
+        """
+        Periodic steady state of the compiled circuit without diodes, computed
+        harmonic by harmonic: the sources are sampled every dt over one period
+        (csolver.period, or inferred from the sources) and transformed by FFT,
+        each harmonic k is solved at the angular frequency k.2.pi/period and
+        the solution is transformed back. There is no transient to simulate.
+
+        The result is stored like a transient run in csolver (time, solution,
+        see CircuitSolver.get_result) and in self.result, over one period
+        with both ends, with the storage options of csolver.
+
+        Returns:
+            int: 0 if OK, 2 if the system is singular for a harmonic
+        """
+        cs = self.csolver
+        cs.check_supported("FFT periodic steady state", diodes=False, nonlinear=False, time_varying=False, delays=False)
+        period = cs.infer_period() if cs.period is None else cs.period
+        if period is None:
+            raise PeriodError()
+        nb_step = cs.get_period_steps(period)
+        time = np.arange(nb_step) * cs.dt
+        harmonics = np.fft.rfft(cs.evaluate_sources(time), axis=1)
+        X, status = self.source_responses(2 * np.pi * np.arange(harmonics.shape[1]) / (nb_step * cs.dt))
+        if status.any():
+            return 2
+        x = np.fft.irfft(np.einsum("knj,jk->nk", X, harmonics), n=nb_step, axis=1)
+
+        cs.reset_stats()
+        cs.stats["factorizations"] = len(X)
+        cs.store_cycle(x)
+        self.result = cs.get_result()
+        return 0
+
+    def get_response(self, name: str, source: int = 0) -> np.ndarray:
+        """
+        Response of the unknown listened as name to a unit amplitude
+        of the source-th source, at each frequency.
+        """
+        keys = {listener_name: key for key, listener_name in self.csolver.listened.items()}
+        return self.response[source, keys[name]]
+
+    def transfer(self, output: str, input: str, source: int = 0) -> np.ndarray:
+        """
+        Transfer function from the listened unknown input to the listened
+        unknown output, for the circuit driven by the source-th source.
+        """
+        return self.get_response(output, source) / self.get_response(input, source)
+
+    def impedance(self, pressure: str, flow: str, source: int = 0) -> np.ndarray:
+        """
+        Impedance spectrum pressure / flow between a listened pressure and a
+        listened flow, e.g. the input impedance with the pressure at the
+        source and the flow leaving it.
+        """
+        return self.transfer(pressure, flow, source)
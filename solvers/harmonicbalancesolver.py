@@ -0,0 +1,180 @@
+import numpy as np
+import scipy.sparse as sps
+from exceptions.solverexceptions import PeriodError
+from solvers.circuitsolver import CircuitSolver
+from solvers.factorization import factorize
+from solvers.graphedge import GraphEdge
+from solvers.graphnode import GraphNode
+
+# Values of a diode row of M0 at columns idP1, idP0, idQ for each state (see CircuitSolver.set_diode)
+CLOSED, OPEN, RESISTIVE = 0, 1, 2
+DIODE_ROWS = np.array([(0.0, 0.0, 1.0), (1.0, -1.0, 0.0), (-1.0, 1.0, -0.1)])
+
+
+def differentiation_matrix(N: int, period: float) -> np.ndarray:
+    """
+    Fourier spectral differentiation matrix on N (odd) equispaced points
+    over one period: derivative of the trigonometric interpolant.
+
+    L. Trefethen. Spectral Methods in MATLAB. SIAM, 2000.
+    """
+    k = np.subtract.outer(np.arange(N), np.arange(N))
+    with np.errstate(divide="ignore"):
+        D = np.pi / period * (-1.0) ** k / np.sin(np.pi * k / N)
+    D[k == 0] = 0.0
+    return D
+
+
+def fourier_resample(x: np.ndarray, m: int) -> np.ndarray:
+    """
+    Values of the trigonometric interpolant of x (columns equispaced over
+    one period, odd number of columns) at m equispaced points.
+    """
+    N = x.shape[1]
+    X = np.zeros((len(x), m // 2 + 1), dtype=complex)
+    harmonics = min(N // 2, m // 2) + 1
+    X[:, :harmonics] = np.fft.rfft(x, axis=1)[:, :harmonics]
+    return np.fft.irfft(X, n=m, axis=1) * m / N
+
+
+class HarmonicBalanceSolver:
+    def __init__(
+        self, csolver: CircuitSolver | None = None, harmonics: int = 64, max_iterations: int = 50
+    ) -> None:
+        """
+        A class for computing the periodic steady state of a circuit with
+        diodes by harmonic balance: the unknowns are trigonometric
+        polynomials, represented by their values at 2.harmonics + 1
+        collocation times over one period, where the derivative is given by
+        the spectral differentiation matrix D. All the collocation times are
+        solved at once:
+        (D x M1 + diag(M0(t_i))).X = S(t_i)
+        with the diode states at each collocation time, updated from the
+        solution like in time stepping until they no longer change.
+
+        Args:
+            csolver (CircuitSolver, optional): solver holding timestep, period and storage options.
+            harmonics (int, optional): number of harmonics. Defaults to 64.
+            max_iterations (int, optional): maximum number of diode states updates. Defaults to 50.
+        """
+        self.csolver = CircuitSolver() if csolver is None else csolver
+        self.harmonics = harmonics
+        self.max_iterations = max_iterations
+        self.period = None
+        self.times = None  # Collocation times
+        self.states = None  # (n_times, n_diodes) diode states, CLOSED, OPEN or RESISTIVE
+        self.converged = False
+        self.iterations = 0
+        self.result = None
+
+    def compile(
+        self, nbP: int, nbQ: int, nodes: list[GraphNode], paths: list[list[GraphEdge]], startends: list[list[int]]
+    ) -> int:
+        """
+        Assemble the circuit. Returns the same codes as CircuitSolver.check_no_solution.
+        """
+        return self.csolver.assemble(nbP, nbQ, nodes, paths, startends)
+
+    def solve(
+        self, nbP: int, nbQ: int, nodes: list[GraphNode], paths: list[list[GraphEdge]], startends: list[list[int]]
+    ) -> int:
+        """
+        Compile the circuit and compute its periodic steady state (see run).
+
+        Returns:
+            int: 0 if OK, 1 if under constrained, 2 if over constrained or singular,
+            3 if not converged
+        """
+        cns = self.compile(nbP, nbQ, nodes, paths, startends)
+        if cns:
+            return cns
+        return self.run()
+
+    def build_system(self) -> tuple[sps.csc_array, np.ndarray]:
+        """
+        Collocation matrix for the current diode states, and right hand side.
+        """
+        cs = self.csolver
+        N, n = len(self.times), cs.nbP + cs.nbQ
+        M0 = sps.lil_array(cs.M0)
+        rows, cols, values = [np.zeros(0, dtype=int)], [np.zeros(0, dtype=int)], [np.zeros(0)]
+        offsets = np.arange(N) * n
+        for j, line in enumerate(cs.update_diode_dict):
+            _, idP0, idP1, idQ, _ = cs.update_diode_dict[line]
+            for k, col in enumerate([idP1, idP0, idQ]):
+                M0[line, col] = 0.0
+                rows.append(offsets + line)
+                cols.append(offsets + col)
+                values.append(DIODE_ROWS[self.states[:, j], k])
+        diodes = sps.coo_array(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))), shape=(N * n, N * n)
+        )
+        D = differentiation_matrix(N, self.period)
+        A = sps.kron(sps.csr_array(D), sps.csr_array(cs.M1)) + sps.kron(sps.eye_array(N), sps.csr_array(M0)) + diodes
+        S = np.zeros((N, n))
+        S[:, cs.source_lines] = cs.evaluate_sources(self.times).T
+        return sps.csc_array(A), S.ravel()
+
+    def update_states(self, x: np.ndarray) -> np.ndarray:
+        """
+        Vectorized CircuitSolver.update_diode over the collocation times,
+        resistive diodes being open if the pressure drop is positive.
+
+        Args:
+            x (np.ndarray): solution, (n_times, n_unknowns)
+
+        Returns:
+            np.ndarray: new diode states
+        """
+        states = self.states.copy()
+        for j, (_, idP0, idP1, idQ, signQ) in enumerate(self.csolver.update_diode_dict.values()):
+            opened = self.states[:, j] == OPEN
+            closing = opened & (signQ * x[:, idQ] < 0)
+            opening = ~opened & (signQ * (x[:, idP0] - x[:, idP1]) > 0)
+            states[closing, j] = CLOSED
+            states[opening, j] = OPEN
+            states[~opened & ~opening, j] = CLOSED
+        return states
+
+    def run(self) -> int:
+        """
+        Compute the periodic steady state of the compiled circuit, with the
+        period csolver.period or inferred from the sources. Diodes start as
+        resistors to find out the flow direction (see CircuitSolver.recompute_diodes).
+        The cycle is interpolated every dt and stored like a transient run
+        in csolver (see CircuitSolver.store_cycle) and in self.result.
+
+        Returns:
+            int: 0 if OK, 2 if the system is singular, 3 if the diode states
+            still change after max_iterations
+        """
+        cs = self.csolver
+        cs.check_supported("Harmonic balance", nonlinear=False, time_varying=False, delays=False)
+        self.period = cs.infer_period() if cs.period is None else cs.period
+        if self.period is None:
+            raise PeriodError()
+        nb_step = cs.get_period_steps(self.period)
+        N, n = 2 * self.harmonics + 1, cs.nbP + cs.nbQ
+        self.times = np.arange(N) * self.period / N
+        self.states = np.full((N, len(cs.update_diode_dict)), RESISTIVE)
+        self.converged = False
+        cs.reset_stats()
+        for self.iterations in range(1, self.max_iterations + 1):
+            A, S = self.build_system()
+            try:
+                x = factorize(A).solve(S).reshape(N, n)
+            except np.linalg.LinAlgError:
+                return 2
+            cs.stats["factorizations"] += 1
+            states = self.update_states(x)
+            if np.array_equal(states, self.states):
+                self.converged = True
+                break
+            self.states = states
+
+        cs.store_cycle(fourier_resample(x.T, nb_step))
+        self.result = cs.get_result()
+        if not self.converged:
+            # The cycle of the last diode states is kept for inspection
+            self.result.status = 3
+        return self.result.status
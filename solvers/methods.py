@@ -1,4 +1,241 @@
 import numpy as np
+from math import factorial
+from scipy.linalg import expm
+
+
+def bdf_weights(steps: list[float]) -> np.ndarray:
+    """Weights of the BDF approximation of the derivative on a variable grid,
+    obtained by differentiating the interpolation polynomial at the new time:
+    x'_{n+1} ~ w_0.x_{n+1} + w_1.x_n + ... + w_k.x_{n+1-k}
+
+    Args:
+        steps (list[float]): the k last step sizes, newest first (t_{n+1} - t_n, t_n - t_{n-1}, ...)
+
+    Returns:
+        np.ndarray: weights w_0, ..., w_k
+    """
+    times = -np.concatenate(([0.0], np.cumsum(steps)))
+    w = np.zeros(len(times))
+    w[0] = np.sum(1 / (times[0] - times[1:]))
+    for j in range(1, len(times)):
+        others = np.delete(times, [0, j])
+        w[j] = np.prod(times[0] - others) / np.prod(times[j] - np.delete(times, j))
+    return w
+
+
+def interpolation_weights(times: np.ndarray, t: float) -> np.ndarray:
+    """Weights of the values at times in their Lagrange interpolation polynomial evaluated at t.
+
+    Args:
+        times (np.ndarray): distinct interpolation times
+        t (float): evaluation time
+
+    Returns:
+        np.ndarray: weights of the values at each time
+    """
+    w = np.zeros(len(times))
+    for j in range(len(times)):
+        others = np.delete(times, j)
+        w[j] = np.prod(t - others) / np.prod(times[j] - others)
+    return w
+
+
+def predictor_weights(steps: list[float]) -> np.ndarray:
+    """Weights of the extrapolation to the new time of the polynomial interpolating
+    the k last solutions on a variable grid:
+    x_{n+1} ~ v_1.x_n + ... + v_k.x_{n+1-k}
+
+    Args:
+        steps (list[float]): the k last step sizes, newest first (t_{n+1} - t_n, t_n - t_{n-1}, ...)
+
+    Returns:
+        np.ndarray: weights v_1, ..., v_k
+    """
+    return interpolation_weights(-np.cumsum(steps), 0.0)
+
+
+def nordsieck_bdf_vector(q: int) -> np.ndarray:
+    """Correction vector l of BDF of order q in Nordsieck form, the coefficients
+    of (1 + x/1).(1 + x/2)...(1 + x/q) by increasing powers of x. The Nordsieck
+    array z_j = h^j.x^(j)/j! is corrected by z_{n+1} = P.z_n + l.(x_{n+1} - (P.z_n)_0)
+    with P the Pascal prediction matrix.
+
+    G. Byrne and A. Hindmarsh. A polyalgorithm for the numerical solution of ordinary
+    differential equations. ACM Transactions on Mathematical Software, 1, 1975.
+
+    Args:
+        q (int): order
+
+    Returns:
+        np.ndarray: l_0 = 1, l_1, ..., l_q
+    """
+    l = np.array([1.0])
+    for i in range(1, q + 1):
+        l = np.concatenate((l, [0.0])) + np.concatenate(([0.0], l)) / i
+    return l
+
+
+def nordsieck_predict(z: np.ndarray) -> np.ndarray:
+    """Taylor prediction of a Nordsieck array (z_j = h^j.x^(j)/j!, one row per j)
+    to the next step: z_i <- sum_{j >= i} C(j, i).z_j
+    """
+    zp = z.copy()
+    q = len(z) - 1
+    for k in range(q):
+        for j in range(q, k, -1):
+            zp[j - 1] += zp[j]
+    return zp
+
+
+def nordsieck_error_constant(q: int) -> float:
+    """Local error of BDF of order q is about the correction times this constant."""
+    return 1 / ((q + 1) * nordsieck_bdf_vector(q)[1])
+
+
+def extrapolation_weights(substeps: list[int]) -> list[np.ndarray]:
+    """Aitken-Neville extrapolation to step 0 of implicit Euler results obtained
+    with substeps[i] substeps, whose error expands in powers of the step.
+    Row i of the table gives order i + 1 from the first i + 1 results.
+
+    Args:
+        substeps (list[int]): number of substeps of each result
+
+    Returns:
+        list[np.ndarray]: weights of the results for each order
+    """
+    weights = [np.eye(len(substeps))[i] for i in range(len(substeps))]
+    table = [weights]
+    for j in range(1, len(substeps)):
+        row = []
+        for i in range(j, len(substeps)):
+            ratio = substeps[i] / substeps[i - j]
+            row.append(table[-1][i - j + 1] + (table[-1][i - j + 1] - table[-1][i - j]) / (ratio - 1))
+        table.append(row)
+    return [rows[0] for rows in table]
+
+
+def exponential_propagator(M0: np.ndarray, M1: np.ndarray, h: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Exact step of the linear descriptor system M1.x' + M0.x = s(t) for sources
+    linearly interpolated over the step: x1 = P.x0 + Q0.s0 + Q1.s1
+
+    The system is split with the SVD of M1 = U.S.V^T into differential unknowns
+    y = V_d^T.x, following y' = A.y + B.s, and algebraic unknowns given by y and s
+    (index 1: the algebraic block of U^T.M0.V must be invertible). The differential
+    part is integrated with the matrix exponential of an augmented matrix.
+
+    C. Van Loan. Computing integrals involving the matrix exponential.
+    IEEE Transactions on Automatic Control, 23, 1978.
+
+    Args:
+        M0 (np.ndarray): square matrix of order 0 derivatives
+        M1 (np.ndarray): square matrix of order 1 derivatives
+        h (float): timestep
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): P, Q0 and Q1
+    """
+    n = len(M0)
+    U, sigma, Vt = np.linalg.svd(M1)
+    r = int(np.sum(sigma > 1e-12 * max(sigma[0], 1e-300))) if n else 0
+    V = Vt.T
+    M0t = U.T @ M0 @ V
+    # Algebraic unknowns: ya = K21.y + K2.s
+    K = np.linalg.solve(M0t[r:, r:], np.hstack((M0t[r:, :r], U[:, r:].T)))
+    K21, K2 = -K[:, :r], K[:, r:]
+    A = -(M0t[:r, :r] + M0t[:r, r:] @ K21) / sigma[:r, None]
+    B = (U[:, :r].T - M0t[:r, r:] @ K2) / sigma[:r, None]
+    C = V[:, :r] + V[:, r:] @ K21
+    D = V[:, r:] @ K2
+    # exp of [[A, B, 0], [0, 0, I/h], [0, 0, 0]].h gives the integrals of exp(A.t).B.(1, t/h)
+    augmented = np.zeros((r + 2 * n, r + 2 * n))
+    augmented[:r, :r] = A * h
+    augmented[:r, r : r + n] = B * h
+    augmented[r : r + n, r + n :] = np.eye(n)
+    E = expm(augmented)
+    Phi, Gamma0, Gamma1 = E[:r, :r], E[:r, r : r + n], E[:r, r + n :]
+    return C @ Phi @ V[:, :r].T, C @ (Gamma0 - Gamma1), C @ Gamma1 + D
+
+
+def lemke(M: np.ndarray, q: np.ndarray, max_iterations: int | None = None) -> np.ndarray:
+    """Solve the linear complementarity problem LCP(M, q): find z such that
+    w = M.z + q >= 0, z >= 0 and w.z = 0, with Lemke's complementary pivoting
+    on the tableau w - M.z - e.z0 = q (covering vector e of ones).
+
+    C. Lemke. Bimatrix equilibrium points and mathematical programming.
+    Management Science, 11, 1965.
+
+    Args:
+        M (np.ndarray): square matrix
+        q (np.ndarray): vector
+        max_iterations (int, optional): maximum number of pivots. Defaults to 50.len(q).
+
+    Returns:
+        np.ndarray: z
+
+    Raises:
+        np.linalg.LinAlgError: on ray termination (no solution found)
+    """
+    n = len(q)
+    if np.all(q >= 0):
+        return np.zeros(n)
+    max_iterations = 50 * n if max_iterations is None else max_iterations
+    # Columns: w (0..n-1), z (n..2n-1), z0 (2n), right hand side
+    T = np.hstack((np.eye(n), -M, -np.ones((n, 1)), q[:, None])).astype(float)
+    basis = list(range(n))
+
+    def pivot(r: int, c: int) -> int:
+        T[r] /= T[r, c]
+        for i in range(n):
+            if i != r:
+                T[i] -= T[i, c] * T[r]
+        leaving, basis[r] = basis[r], c
+        return leaving
+
+    leaving = pivot(int(np.argmin(q)), 2 * n)
+    for _ in range(max_iterations):
+        entering = leaving + n if leaving < n else leaving - n
+        col = T[:, entering]
+        rows = np.flatnonzero(col > 1e-12)
+        if len(rows) == 0:
+            raise np.linalg.LinAlgError("Lemke ray termination")
+        ratios = T[rows, -1] / col[rows]
+        candidates = rows[ratios <= ratios.min() + 1e-12]
+        # Prefer z0 leaving the basis, which terminates
+        r = next((i for i in candidates if basis[i] == 2 * n), candidates[0])
+        leaving = pivot(r, entering)
+        if leaving == 2 * n:
+            break
+    else:
+        raise np.linalg.LinAlgError("Lemke maximum iterations reached")
+    z = np.zeros(n)
+    for i, var in enumerate(basis):
+        if n <= var < 2 * n:
+            z[var - n] = T[i, -1]
+    return z
+
+
+def generalized_alpha_coefficients(rho: float = 0.6) -> tuple[float, float, float]:
+    """Parameters of the generalized alpha method for first order systems
+    M1.x' + M0.x = S, second order accurate with high frequency spectral radius rho.
+
+    K. Jansen, C. Whiting and G. Hulbert. A generalized-alpha method for integrating the filtered
+    Navier-Stokes equations with a stabilized finite element method. Computer Methods in Applied
+    Mechanics and Engineering, 190, 2000.
+
+    The equation is written at intermediate points:
+    M1.x'_{n+alpham} + M0.x_{n+alphaf} = S_{n+alphaf}
+    with x_{n+1} = x_n + dt.((1-gamma).x'_n + gamma.x'_{n+1})
+
+    Args:
+        rho (float, optional): high frequency damping in [0,1]. Defaults to 0.6.
+
+    Returns:
+        (float, float, float): alpham, alphaf and gamma
+    """
+    alpham = (3 - rho) / (2 * (1 + rho))
+    alphaf = 1 / (1 + rho)
+    gamma = 1 / 2 + alpham - alphaf
+    return alpham, alphaf, gamma
 
 
 def generalized_alpha_step(M, D, K, F, a, v, x, t, dt, rho=0.6):
@@ -0,0 +1,224 @@
+import numpy as np
+from scipy.sparse.linalg import LinearOperator, gmres
+from exceptions.solverexceptions import (
+    NewtonConvergenceError,
+    PeriodError,
+    UnsupportedSchemeError,
+)
+from solvers.circuitsolver import CircuitSolver
+from solvers.graphedge import GraphEdge
+from solvers.graphnode import GraphNode
+from solvers.solveresult import SolveResult
+
+
+class ShootingSolver:
+    def __init__(
+        self,
+        csolver: CircuitSolver | None = None,
+        tol: float = 1e-8,
+        max_iterations: int = 100,
+        anderson_depth: int = 5,
+    ) -> None:
+        """
+        A class for computing the periodic steady state of a circuit directly,
+        by solving for the initial state x0 such that stepping one period
+        with the time stepping of csolver returns x0.
+
+        Circuits without diodes, nonlinear or time-varying elements are linear
+        and time invariant: x0 is found by one Newton step, with the monodromy
+        matrix built from the step factorization (or matrix free GMRES for
+        sparse systems). Otherwise, the period map is iterated with Anderson
+        acceleration.
+
+        Args:
+            csolver (CircuitSolver, optional): solver holding timestep, period and scheme.
+            tol (float, optional): tolerance on the change of the state over a period,
+            relative to its largest value. Defaults to 1e-8.
+            max_iterations (int, optional): maximum number of period integrations. Defaults to 100.
+            anderson_depth (int, optional): number of previous iterates used by
+            Anderson acceleration, 0 for plain fixed point iteration. Defaults to 5.
+        """
+        self.csolver = CircuitSolver() if csolver is None else csolver
+        self.tol = tol
+        self.max_iterations = max_iterations
+        self.anderson_depth = anderson_depth
+        self.period = None
+        self.period_steps = 0
+        self.initial_state = None  # State at the start of the period, see CircuitSolver.get_state
+        self.converged = False
+        self.residual = np.inf
+        self.periods = 0  # Number of period integrations
+        self.result = None
+
+    def compile(
+        self, nbP: int, nbQ: int, nodes: list[GraphNode], paths: list[list[GraphEdge]], startends: list[list[int]]
+    ) -> int:
+        """
+        Assemble the circuit. Returns the same codes as CircuitSolver.check_no_solution.
+        """
+        return self.csolver.assemble(nbP, nbQ, nodes, paths, startends)
+
+    def solve(
+        self, nbP: int, nbQ: int, nodes: list[GraphNode], paths: list[list[GraphEdge]], startends: list[list[int]]
+    ) -> int:
+        """
+        Compile the circuit and compute its periodic steady state (see run).
+
+        Returns:
+            int: 0 if OK, 1 if under constrained, 2 if over constrained or singular,
+            3 if not converged
+        """
+        cns = self.compile(nbP, nbQ, nodes, paths, startends)
+        if cns:
+            return cns
+        return self.run()
+
+    def period_map(self, state: np.ndarray) -> np.ndarray:
+        """
+        Step the circuit over one period from state, with sources and diodes.
+        """
+        cs = self.csolver
+        cs.set_state(state)
+        cs.update_source_step(0)
+        cs.history_source[:] = cs.Source
+        for step in range(1, self.period_steps + 1):
+            cs.update_source_step(step)
+            cs.push_history(cs.step_solution())
+        self.periods += 1
+        return cs.get_state()
+
+    def monodromy_product(self, V: np.ndarray) -> np.ndarray:
+        """
+        Product of the monodromy matrix (derivative of the period map of
+        a linear circuit) with V, one column per state, by stepping the
+        homogeneous system with the current LHS factorization
+        (or the propagator for Exponential).
+        Columns are states as given by CircuitSolver.get_state.
+        """
+        cs = self.csolver
+        n = cs.nbP + cs.nbQ
+        _, w, c2, e, _ = cs.scheme_coefficients()
+        if cs.time_integration == "Generalized-alpha":
+            history, derivative = [V[:n]], V[n:]
+        else:
+            history, derivative = list(V.reshape(-1, n, V.shape[1])), np.zeros_like(V[:n])
+        if cs.time_integration == "Exponential":
+            P = cs.exponential_propagator()[0]
+            for _ in range(self.period_steps):
+                history[0] = P @ history[0]
+            return history[0]
+        if cs.LHS_factor is None:
+            cs.factorize_LHS()
+        for _ in range(self.period_steps):
+            RHS = cs.M1 @ (sum(wj * xj for wj, xj in zip(w, history)) + c2 * derivative)
+            if e:
+                RHS -= e * cs.differential_rows[:, None] * (cs.M0 @ history[0])
+            new = cs.LHS_factor.solve(RHS)
+            if cs.time_integration == "Generalized-alpha":
+                derivative = cs.update_derivative(new, history[0], derivative)
+            history = [new] + history[:-1]
+        if cs.time_integration == "Generalized-alpha":
+            return np.concatenate((history[0], derivative))
+        return np.concatenate(history)
+
+    def run_linear(self, state: np.ndarray) -> np.ndarray:
+        """
+        Newton step on state - period_map(state) = 0, exact for a circuit
+        without diodes: (I - A).x0 = period_map(0) with A the monodromy matrix.
+        """
+        b = self.period_map(np.zeros_like(state))
+        size = len(state)
+        if not self.csolver.sparse:
+            A = self.monodromy_product(np.eye(size))
+            return np.linalg.solve(np.eye(size) - A, b)
+        operator = LinearOperator(
+            (size, size), matvec=lambda v: v - self.monodromy_product(v[:, None])[:, 0], dtype=float
+        )
+        state, info = gmres(operator, b, x0=state, rtol=self.tol, atol=0.0, maxiter=self.max_iterations)
+        if info < 0:
+            raise np.linalg.LinAlgError("GMRES breakdown")
+        return state
+
+    def run_fixed_point(self, state: np.ndarray) -> np.ndarray:
+        """
+        Iterate the period map from state, with Anderson acceleration
+        (restarted when the residual grows).
+        """
+        dG, dF = [], []
+        g_prev = f_prev = None
+        while self.periods < self.max_iterations:
+            g = self.period_map(state)
+            f = g - state
+            self.residual = np.max(np.abs(f)) / max(np.max(np.abs(g)), np.finfo(float).tiny)
+            if self.residual <= self.tol:
+                self.converged = True
+                return g
+            if f_prev is not None and np.max(np.abs(f)) > np.max(np.abs(f_prev)):
+                dG, dF = [], []
+            elif f_prev is not None:
+                dG.append(g - g_prev)
+                dF.append(f - f_prev)
+                dG, dF = dG[-self.anderson_depth :], dF[-self.anderson_depth :]
+            g_prev, f_prev = g, f
+            if dF and self.anderson_depth > 0:
+                gamma = np.linalg.lstsq(np.array(dF).T, f, rcond=None)[0]
+                state = g - np.array(dG).T @ gamma
+            else:
+                state = g
+        return state
+
+    def run(self) -> int:
+        """
+        Compute the periodic steady state of the compiled circuit, then
+        step one period from it to get the periodic cycle in self.result
+        (with the storage options of csolver).
+        The period is csolver.period (a multiple of dt) or inferred from the sources.
+
+        Returns:
+            int: 0 if OK, 2 if the system is singular, 3 if the period map
+            or the Newton iterations did not converge within max_iterations
+        """
+        cs = self.csolver
+        if cs.time_integration == "VBDF":
+            raise UnsupportedSchemeError(cs.time_integration)
+        # The state of a period map does not hold the history of the delay lines
+        cs.check_supported("Shooting", delays=False)
+        maxtime = cs.maxtime
+        self.period = cs.infer_period() if cs.period is None else cs.period
+        if self.period is None:
+            raise PeriodError()
+        self.period_steps = cs.get_period_steps(self.period)
+        self.periods = 0
+        self.converged = False
+        self.residual = np.inf
+        try:
+            cs.maxtime = self.period_steps * cs.dt
+            cs.start_run()
+            state = cs.get_state()
+            if cs.update_diode_dict or cs.update_nonlinear_dict or cs.update_element_dict:
+                state = self.run_fixed_point(state)
+            else:
+                state = self.run_linear(state)
+                g = self.period_map(state)
+                self.residual = np.max(np.abs(g - state)) / max(np.max(np.abs(g)), np.finfo(float).tiny)
+                self.converged = self.residual <= self.tol
+            self.initial_state = state
+            cs.set_initial_state(self.initial_state)
+            status = cs.run()
+        except np.linalg.LinAlgError:
+            status = 2
+        except NewtonConvergenceError:
+            status = 3
+        finally:
+            cs.maxtime = maxtime
+            cs.set_initial_state(None)
+        if status:
+            self.result = SolveResult(status)
+            return status
+        self.result = cs.get_result()
+        self.result.period = self.period
+        self.result.cycles = self.periods
+        if not self.converged:
+            # The cycle stepped from the last iterate is kept for inspection
+            self.result.status = 3
+        return self.result.status
@@ -0,0 +1,189 @@
+import os
+import numpy as np
+
+# Size reserved for the .npy header, so that it can be rewritten with the final shape
+NPY_HEADER_SIZE = 128
+
+
+class SolutionSink:
+    """
+    Base class for the outputs of CircuitSolver.run. The solution is pushed
+    in blocks of consecutive columns (one column per output time).
+    """
+
+    def open(self, n_rows: int, n_steps: int | None = None) -> None:
+        """
+        Called before the first block.
+
+        Args:
+            n_rows (int): number of rows of each block
+            n_steps (int, optional): expected total number of columns, if known
+        """
+        pass
+
+    def write(self, time: np.ndarray, block: np.ndarray) -> None:
+        """
+        Receive a block of shape (n_rows, len(time)).
+        The block is reused by the solver, it must be copied to be kept.
+        """
+        pass
+
+    def close(self) -> None:
+        """
+        Called after the last block.
+        """
+        pass
+
+
+class ArraySink(SolutionSink):
+    def __init__(self) -> None:
+        """
+        Keeps the whole solution in memory, in self.solution (rows x steps)
+        and self.time.
+        """
+        self.solution = None
+        self.time = None
+        self.size = 0
+
+    def open(self, n_rows: int, n_steps: int | None = None) -> None:
+        self.solution = np.zeros((n_rows, n_steps or 0))
+        self.time = np.zeros(n_steps or 0)
+        self.size = 0
+
+    def write(self, time: np.ndarray, block: np.ndarray) -> None:
+        end = self.size + len(time)
+        if end > len(self.time):
+            # Unknown or exceeded size, grow geometrically
+            capacity = max(end, 2 * len(self.time))
+            self.solution = np.concatenate((self.solution, np.zeros((len(self.solution), capacity - len(self.time)))), 1)
+            self.time = np.concatenate((self.time, np.zeros(capacity - len(self.time))))
+        self.solution[:, self.size : end] = block
+        self.time[self.size : end] = time
+        self.size = end
+
+    def close(self) -> None:
+        self.solution = self.solution[:, : self.size]
+        self.time = self.time[: self.size]
+
+
+class MemmapSink(ArraySink):
+    def __init__(self, fname: str) -> None:
+        """
+        Keeps the whole solution in a .npy file mapped in memory (np.memmap),
+        in self.solution (rows x steps) and self.time. Blocks are flushed to
+        the file as they are written.
+        The expected number of steps must be given to open, the file is
+        rewritten with the columns actually written if there are fewer
+        (run stopped on its periodic steady state).
+        """
+        super().__init__()
+        self.fname = fname
+
+    def open(self, n_rows: int, n_steps: int | None = None) -> None:
+        self.solution = np.lib.format.open_memmap(self.fname, mode="w+", dtype=float, shape=(n_rows, n_steps))
+        self.time = np.zeros(n_steps)
+        self.size = 0
+
+    def write(self, time: np.ndarray, block: np.ndarray) -> None:
+        end = self.size + len(time)
+        self.solution[:, self.size : end] = block
+        self.time[self.size : end] = time
+        self.size = end
+        self.solution.flush()
+
+    def close(self) -> None:
+        self.solution.flush()
+        if self.size < self.solution.shape[1]:
+            self.truncate()
+        self.time = self.time[: self.size]
+
+    def truncate(self, block: int = 2**20) -> None:
+        """
+        Rewrite the file with the first self.size columns, copying
+        about block values at once.
+        """
+        n_rows = self.solution.shape[0]
+        columns = max(1, block // max(1, n_rows))
+        tmp = self.fname + ".tmp"
+        truncated = np.lib.format.open_memmap(tmp, mode="w+", dtype=float, shape=(n_rows, self.size))
+        for start in range(0, self.size, columns):
+            stop = min(start + columns, self.size)
+            truncated[:, start:stop] = self.solution[:, start:stop]
+        truncated.flush()
+        del truncated
+        self.solution = None  # Unmaps the file before replacing it
+        os.replace(tmp, self.fname)
+        self.solution = np.load(self.fname, mmap_mode="r+")
+
+
+class NpyAppendSink(SolutionSink):
+    def __init__(self, fname: str) -> None:
+        """
+        Appends the solution to a .npy file as it is computed. The file holds
+        a (rows x steps) array in Fortran order, so that each new column is
+        written at the end of the file. Time is not stored.
+        """
+        self.fname = fname
+        self.file = None
+        self.n_rows = 0
+        self.size = 0
+
+    def write_header(self) -> None:
+        """
+        Write the .npy header with the current shape, padded to NPY_HEADER_SIZE.
+        """
+        header = repr({"descr": "<f8", "fortran_order": True, "shape": (self.n_rows, self.size)})
+        magic = np.lib.format.magic(1, 0)
+        header = header.ljust(NPY_HEADER_SIZE - len(magic) - 3) + "\n"
+        self.file.seek(0)
+        self.file.write(magic + np.uint16(len(header)).astype("<u2").tobytes() + header.encode("latin1"))
+
+    def open(self, n_rows: int, n_steps: int | None = None) -> None:
+        self.file = open(self.fname, "wb")
+        self.n_rows = n_rows
+        self.size = 0
+        self.write_header()
+
+    def write(self, time: np.ndarray, block: np.ndarray) -> None:
+        self.file.write(np.asarray(block, dtype="<f8").tobytes(order="F"))
+        self.size += len(time)
+
+    def close(self) -> None:
+        self.write_header()
+        self.file.close()
+        self.file = None
+
+
+class CallbackSink(SolutionSink):
+    def __init__(self, callback) -> None:
+        """
+        Calls callback(time, block) for each block.
+        """
+        self.callback = callback
+
+    def write(self, time: np.ndarray, block: np.ndarray) -> None:
+        self.callback(time, block)
+
+
+def export_rows(fname: str, solution: np.ndarray, rows: list[int], names: list[str], block: int = 1000) -> None:
+    """
+    Write rows of solution to a text file like np.savetxt, reading at most
+    block columns at once, so that memory mapped solutions are streamed
+    instead of being loaded.
+
+    Args:
+        fname (str): name of the text file
+        solution (np.ndarray): array of shape (rows x steps), may be a np.memmap
+        rows (list[int]): rows of solution to write, one line each
+        names (list[str]): names of the rows, written in the header
+        block (int, optional): number of columns read at once. Defaults to 1000.
+    """
+    with open(fname, "w") as f:
+        f.write("# " + " ".join(names) + "\n")
+        for row in rows:
+            for start in range(0, solution.shape[1], block):
+                values = np.asarray(solution[row, start : start + block])
+                if start > 0:
+                    f.write(" ")
+                f.write(" ".join(["%.11g" % value for value in values]))
+            f.write("\n")
@@ -0,0 +1,82 @@
+import numpy as np
+from exceptions.solverexceptions import PeriodError
+
+
+class SolveResult:
+    def __init__(
+        self,
+        status: int,
+        time: np.ndarray | None = None,
+        solution: np.ndarray | None = None,
+        listened: dict | None = None,
+        nbP: int = 0,
+        stats: dict | None = None,
+        rows: list[int] | None = None,
+        period: float | None = None,
+        cycles: int = 0,
+    ) -> None:
+        """
+        Result of a circuit simulation, independent of any plotting.
+
+        Args:
+            status (int): 0 if OK, 1 if under constrained, 2 if over constrained or singular,
+            3 if the iterations did not converge
+            time (np.ndarray, optional): time of each column of solution
+            solution (np.ndarray, optional): unknowns (rows) at each time (columns),
+            listener signs applied
+            listened (dict, optional): names of listened unknowns, by unknown index
+            nbP (int, optional): number of pressure unknowns (first unknowns)
+            stats (dict, optional): solver statistics
+            rows (list[int], optional): unknown index of each row of solution.
+            Defaults to all the unknowns in order.
+            period (float, optional): period of the periodic steady state, if detected
+            cycles (int, optional): number of periods simulated before convergence
+        """
+        self.status = status
+        self.time = time
+        self.solution = solution
+        self.listened = {} if listened is None else listened
+        self.nbP = nbP
+        self.stats = {} if stats is None else stats
+        if rows is None and solution is not None:
+            rows = list(range(len(solution)))
+        self.rows = [] if rows is None else rows
+        self.period = period
+        self.cycles = cycles
+
+    def get_unknown(self, key: int) -> np.ndarray:
+        """
+        Series of unknown key.
+        """
+        return self.solution[self.rows.index(key)]
+
+    def get_listened(self) -> dict:
+        """
+        Listened series by listener name.
+        """
+        return {name: self.get_unknown(key) for key, name in self.listened.items()}
+
+    def get_pressures(self) -> dict:
+        """
+        Listened pressures by listener name.
+        """
+        return {name: self.get_unknown(key) for key, name in self.listened.items() if key < self.nbP}
+
+    def get_flows(self) -> dict:
+        """
+        Listened flows by listener name.
+        """
+        return {name: self.get_unknown(key) for key, name in self.listened.items() if key >= self.nbP}
+
+    def get_cycle(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Time and solution over the last period, i.e. the converged
+        periodic cycle if the periodic steady state was detected.
+
+        Raises:
+            PeriodError: if the run had no period
+        """
+        if self.period is None:
+            raise PeriodError()
+        start = np.searchsorted(self.time, self.time[-1] - self.period * (1 + 1e-9))
+        return self.time[start:], self.solution[:, start:]
@@ -0,0 +1,197 @@
+import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from exceptions.solverexceptions import ParametersShapeError, SolverException
+from solvers.circuitsolver import CircuitSolver
+from solvers.graphedge import GraphEdge
+from solvers.graphnode import GraphNode
+
+# Environment variables limiting the threads of the usual BLAS implementations
+BLAS_THREADS_VARIABLES = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS"]
+
+# State of a worker process, set once by init_worker
+worker = {}
+
+
+def init_worker(csolver: CircuitSolver, params: np.ndarray, shm_name: str, shape: tuple, blas_threads: int) -> None:
+    """
+    Receive the compiled circuit and attach the shared result block,
+    once per worker process.
+    """
+    try:
+        from threadpoolctl import threadpool_limits
+
+        worker["limits"] = threadpool_limits(blas_threads)
+    except ImportError:
+        pass
+    shm = SharedMemory(name=shm_name)
+    worker["shm"] = shm
+    worker["solution"] = np.ndarray(shape, dtype=float, buffer=shm.buf)
+    worker["csolver"] = csolver
+    worker["params"] = params
+
+
+def run_chunk(start: int, stop: int) -> tuple[int, list[int], list[int]]:
+    """
+    Solve samples start to stop - 1 and write their listened
+    traces in the shared result block, padded with NaN after the
+    end of runs stopped early on their periodic steady state.
+
+    Returns:
+        (int, list[int], list[int]): start, status of each sample (0 : OK,
+        2 : singular system, 3 : not converged, 4 : other solver error) and
+        number of output times it filled
+    """
+    csolver = worker["csolver"]
+    solution = worker["solution"]
+    statuses, lengths = [], []
+    for i in range(start, stop):
+        csolver.set_parameters(worker["params"][i])
+        try:
+            status = csolver.run()
+        except np.linalg.LinAlgError:
+            status = 2
+        except SolverException:
+            status = 4
+        length = 0
+        if status == 0:
+            length = csolver.solution.shape[1]
+            solution[i, :, :length] = csolver.solution
+        solution[i, :, length:] = np.nan
+        statuses.append(status)
+        lengths.append(length)
+    return start, statuses, lengths
+
+
+class SweepRunner:
+    def __init__(
+        self,
+        csolver: CircuitSolver | None = None,
+        max_workers: int | None = None,
+        chunk_size: int | None = None,
+        blas_threads: int = 1,
+    ) -> None:
+        """
+        A class for running independent CircuitSolver solves of one topology
+        with different R, C, L values on several CPU cores.
+
+        The circuit is compiled once and sent to each worker process, and
+        listened traces are written by the workers in a shared memory block.
+
+        Args:
+            csolver (CircuitSolver, optional): solver holding timestep, max time and scheme.
+            max_workers (int, optional): number of processes. Defaults to the number of CPUs.
+            chunk_size (int, optional): samples per task. Defaults to about 4 tasks per worker.
+            blas_threads (int, optional): BLAS threads per worker. Defaults to 1.
+        """
+        self.csolver = CircuitSolver() if csolver is None else csolver
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.blas_threads = blas_threads
+        self.solution = None  # (n_samples, n_listened, n_steps + 1)
+        self.time = None
+        self.rows = []
+        self.status = None  # 0 : OK, 2 : singular system, 3 : not converged, 4 : other solver error
+        self.lengths = None  # Output times filled by each sample, fewer if stopped on its periodic steady state
+
+    def get_parameters(self) -> list:
+        """
+        R, C, L elements of the compiled circuit, in the order
+        of the columns of the parameter array.
+        """
+        return [elem for elem, _ in self.csolver.parameters]
+
+    def compile(
+        self, nbP: int, nbQ: int, nodes: list[GraphNode], paths: list[list[GraphEdge]], startends: list[list[int]]
+    ) -> int:
+        """
+        Assemble the circuit once. Returns the same codes as CircuitSolver.check_no_solution.
+        """
+        return self.csolver.assemble(nbP, nbQ, nodes, paths, startends)
+
+    def solve(
+        self,
+        nbP: int,
+        nbQ: int,
+        nodes: list[GraphNode],
+        paths: list[list[GraphEdge]],
+        startends: list[list[int]],
+        params: np.ndarray,
+    ) -> int:
+        """
+        Compile the topology and run all the samples of params.
+
+        Returns:
+            int: 0 if OK, 1 if under constrained, 2 if over constrained
+        """
+        cns = self.compile(nbP, nbQ, nodes, paths, startends)
+        if cns:
+            return cns
+        return self.run(params)
+
+    def get_tasks(self, n_samples: int) -> list[tuple[int, int]]:
+        """
+        Split the samples in contiguous chunks.
+        """
+        chunk_size = self.chunk_size or max(1, -(-n_samples // (4 * self.max_workers)))
+        return [(start, min(start + chunk_size, n_samples)) for start in range(0, n_samples, chunk_size)]
+
+    def run(self, params: np.ndarray) -> int:
+        """
+        Run all the samples on the compiled circuit. Samples that fail get
+        NaN traces and the status of run_chunk. Only listened unknowns are kept,
+        at the output times of the solver (see CircuitSolver.get_output_times).
+        Periodic runs stopping early are padded with NaN after self.lengths
+        output times.
+
+        Args:
+            params (np.ndarray): array of shape (n_samples, n_params), see get_parameters
+
+        Returns:
+            int: 0
+        """
+        csolver = self.csolver
+        params = np.atleast_2d(np.asarray(params, dtype=float))
+        if params.shape[1] != len(csolver.parameters):
+            raise ParametersShapeError(params.shape[1], len(csolver.parameters))
+        n_samples = params.shape[0]
+        storage, memmap_path = csolver.storage, csolver.memmap_path
+        csolver.set_storage("Listened")
+        # Workers copy the solution to the shared block, they must not share a file
+        csolver.set_memmap_path(None)
+        self.rows = csolver.get_output_rows()
+        self.time = csolver.get_output_times()
+        shape = (n_samples, len(self.rows), len(self.time))
+        self.status = np.zeros(n_samples, dtype=int)
+        self.lengths = np.zeros(n_samples, dtype=int)
+
+        shm = SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+        # Workers are spawned (not forked) so that they load BLAS with the thread limits
+        environ = {var: os.environ.get(var) for var in BLAS_THREADS_VARIABLES}
+        os.environ.update({var: str(self.blas_threads) for var in BLAS_THREADS_VARIABLES})
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=mp.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(csolver, params, shm.name, shape, self.blas_threads),
+            ) as executor:
+                futures = [executor.submit(run_chunk, start, stop) for start, stop in self.get_tasks(n_samples)]
+                for future in futures:
+                    start, statuses, lengths = future.result()
+                    self.status[start : start + len(statuses)] = statuses
+                    self.lengths[start : start + len(lengths)] = lengths
+            self.solution = np.ndarray(shape, dtype=float, buffer=shm.buf).copy()
+        finally:
+            for var, value in environ.items():
+                if value is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = value
+            csolver.set_storage(storage)
+            csolver.set_memmap_path(memmap_path)
+            shm.close()
+            shm.unlink()
+        return 0
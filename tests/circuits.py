@@ -0,0 +1,118 @@
+from elements.node import Node
+from elements.resistor import Resistor
+from elements.capacitor import Capacitor
+from elements.delayline import DelayLine
+from elements.ground import Ground
+from elements.psource import PSource
+from elements.diode import Diode
+from elements.inductor import Inductor
+from solvers.circuitgraph import CircuitGraph
+
+
+class CircuitBuilder:
+    def __init__(self) -> None:
+        """
+        Test circuit built element by element on grid coordinates.
+        """
+        self.nodes = []
+        self.elems = []
+
+    def add(self, cls, start, end, *args, **kwargs):
+        """
+        Add an element of class cls between new nodes at start and end.
+        """
+        node1, node2 = Node(*start), Node(*end)
+        self.elems.append(cls(node1, node2, *args, **kwargs))
+        self.nodes.extend([node1, node2])
+        return self.elems[-1]
+
+    def arguments(self) -> tuple:
+        """
+        Arguments of CircuitSolver.solve for the circuit.
+        """
+        cgraph = CircuitGraph(self.nodes, self.elems)
+        paths, startends = cgraph.graph_max_len_non_branching_paths()
+        nbQ = len(paths)
+        nbP = len([n for n in cgraph.nodes if n.type != "Source"])
+        return nbP, nbQ, cgraph.nodes, paths, startends
+
+
+def windkessel(diode=False, R0=10.0, C=10.0, R1=10.0, source="sin(2*pi*t)", valve=None):
+    """
+    Build a three-element Windkessel circuit, optionally with a diode or
+    a valve (element class and value) after the pressure source, and
+    return the arguments of CircuitSolver.solve. R0, C and R1 may be
+    expressions of time.
+    """
+    circuit = CircuitBuilder()
+    circuit.add(PSource, (0, 0), (0, -1), source, True)
+    if diode or valve:
+        cls, *value = valve if valve else (Diode,)
+        circuit.add(cls, (0, 0), (1, 0), *value)
+        circuit.add(Resistor, (1, 0), (2, 0), R0, isinstance(R0, str))
+    else:
+        circuit.add(Resistor, (0, 0), (2, 0), R0, isinstance(R0, str))
+    cap = circuit.add(Capacitor, (2, 0), (2, -1), C, isinstance(C, str))
+    cap.nodes[0].listened = True
+    cap.nodes[0].listener_name = "Pc"
+    circuit.add(Ground, (2, -1), (2, -2))
+    res = circuit.add(Resistor, (2, 0), (3, 0), R1, isinstance(R1, str))
+    res.listened = 1
+    res.listener_name = "Qout"
+    circuit.add(Ground, (3, 0), (3, -1))
+    return circuit.arguments()
+
+
+def lc_circuit(L=1e-4, C=1e-2, source="1"):
+    """
+    Build a pressure source feeding a capacitor through an inductor (stiff
+    oscillator for dt = 0.01) and return the arguments of CircuitSolver.solve.
+    """
+    circuit = CircuitBuilder()
+    circuit.add(PSource, (0, 0), (0, -1), source, True)
+    circuit.add(Inductor, (0, 0), (1, 0), L)
+    circuit.add(Capacitor, (1, 0), (1, -1), C)
+    circuit.add(Ground, (1, -1), (1, -2))
+    return circuit.arguments()
+
+
+def two_valves(source="sin(2*pi*t)"):
+    """
+    Build a pressure source filling two capacitors in series through two
+    diodes, the second one draining through a resistor, and return the
+    arguments of CircuitSolver.solve.
+    """
+    circuit = CircuitBuilder()
+    circuit.add(PSource, (0, 0), (0, -1), source, True)
+    for x in [0, 2]:
+        circuit.add(Diode, (x, 0), (x + 1, 0))
+        circuit.add(Resistor, (x + 1, 0), (x + 2, 0), 1.0)
+        circuit.add(Capacitor, (x + 2, 0), (x + 2, -1), 0.1)
+        circuit.add(Ground, (x + 2, -1), (x + 2, -2))
+    circuit.add(Resistor, (4, 0), (5, 0), 10.0)
+    circuit.add(Ground, (5, 0), (5, -1))
+    return circuit.arguments()
+
+
+def transmission_line(cells=0, Z=1.0, delay=0.1, R=0.0, R1=1.0, source="sin(2*pi*t)"):
+    """
+    Build a pressure source feeding a load R1 through a resistor Z and a
+    transmission line, a delay line or a chain of LC cells (with their share
+    of the line resistance R), and return the arguments of CircuitSolver.solve.
+    """
+    circuit = CircuitBuilder()
+    circuit.add(PSource, (0, 0), (0, -1), source, True)
+    circuit.add(Resistor, (0, 0), (1, 0), Z)
+    if cells == 0:
+        circuit.add(DelayLine, (1, 0), (2, 0), Z, delay=delay, R=R)
+    for i in range(cells):
+        circuit.add(Inductor, (2 * i + 1, 0), (2 * i + 2, 0), Z * delay / cells)
+        circuit.add(Resistor, (2 * i + 2, 0), (2 * i + 3, 0), R / cells)
+        circuit.add(Capacitor, (2 * i + 3, 0), (2 * i + 3, -1), delay / Z / cells)
+        circuit.add(Ground, (2 * i + 3, -1), (2 * i + 3, -2))
+    end = 2 * cells + 1 if cells else 2
+    load = circuit.add(Resistor, (end, 0), (end + 1, 0), R1)
+    load.nodes[0].listened = True
+    load.nodes[0].listener_name = "Pout"
+    circuit.add(Ground, (end + 1, 0), (end + 1, -1))
+    return circuit.arguments()
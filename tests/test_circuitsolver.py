@@ -0,0 +1,542 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from scipy.integrate import solve_ivp
+from exceptions.solverexceptions import DelayStepError, NonLinearSchemeError, PeriodError, PeriodStepError
+from elements.smoothvalve import SmoothValve
+from elements.stenosis import Stenosis
+from solvers.circuitsolver import BDF_MAX_ORDER, CircuitSolver
+from solvers.methods import lemke
+from solvers.solutionsinks import ArraySink, CallbackSink, NpyAppendSink
+from tests.circuits import lc_circuit, transmission_line, two_valves, windkessel
+
+
+def reference_solution(csolver, nb_step):
+    """
+    Step the assembled system with np.linalg.solve at each step (BDF).
+    """
+    line, source = next(iter(csolver.update_source_dict.items()))
+    S = np.zeros(csolver.nbP + csolver.nbQ)
+    S[line] = source(0.0)
+    solution = np.zeros_like(csolver.solution)
+    solution[:, 0] = np.linalg.solve(csolver.M0, S)
+    LHS = csolver.M0 + csolver.M1 / csolver.dt
+    for step in range(nb_step):
+        S[line] = source((step + 1) * csolver.dt)
+        RHS = S + csolver.M1 @ solution[:, step] / csolver.dt
+        solution[:, step + 1] = np.linalg.solve(LHS, RHS)
+    return solution
+
+
+class TestCircuitSolver(unittest.TestCase):
+
+    def setUp(self):
+        self.csolver = CircuitSolver()
+        self.csolver.set_dt(0.01)
+        self.csolver.set_maxtime(2.0)
+
+    def test_simulate_result(self):
+        result = self.csolver.simulate(*windkessel())
+        self.assertEqual(result.status, 0)
+        np.testing.assert_allclose(result.time, np.arange(201) * 0.01)
+        self.assertEqual(set(result.get_listened()), {"Pc", "Qout"})
+        self.assertEqual(list(result.get_pressures()), ["Pc"])
+        self.assertEqual(list(result.get_flows()), ["Qout"])
+        self.assertEqual(result.stats["factorizations"], 1)
+        # Resistor R1 = 10 to ground, with the listener sign applied
+        np.testing.assert_allclose(result.get_flows()["Qout"], result.get_pressures()["Pc"] / 10.0)
+
+    def test_factorization_reuse(self):
+        self.assertEqual(self.csolver.solve(*windkessel()), 0)
+        nb_step = int(self.csolver.maxtime / self.csolver.dt)
+        stats = self.csolver.get_stats()
+        self.assertEqual(stats["factorizations"], 1)
+        self.assertEqual(stats["substitutions"], nb_step)
+
+        signs = np.ones(self.csolver.solution.shape[0])
+        for key, sign in self.csolver.signs.items():
+            signs[key] = sign
+        reference = reference_solution(self.csolver, nb_step) * signs.reshape(-1, 1)
+        np.testing.assert_allclose(self.csolver.solution, reference, atol=1e-10)
+
+    def test_diode_refactorizes(self):
+        self.csolver.set_max_updated_rows(0)
+        self.assertEqual(self.csolver.solve(*windkessel(diode=True)), 0)
+        stats = self.csolver.get_stats()
+        self.assertGreater(stats["factorizations"], 1)
+        self.assertLess(stats["factorizations"], stats["substitutions"])
+
+    def test_low_rank_updates(self):
+        for backend in ["Dense", "Sparse"]:
+            self.csolver.set_backend(backend)
+            self.csolver.set_max_updated_rows(0)
+            self.assertEqual(self.csolver.solve(*windkessel(diode=True)), 0)
+            refactorized = self.csolver.solution.copy()
+            self.csolver.set_max_updated_rows(4)
+            self.assertEqual(self.csolver.solve(*windkessel(diode=True)), 0)
+            stats = self.csolver.get_stats()
+            # Diode switching only updates the factorization of the first step
+            self.assertEqual(stats["factorizations"], 1)
+            self.assertGreater(stats["low_rank_updates"], 0)
+            np.testing.assert_allclose(self.csolver.solution, refactorized, atol=1e-10)
+
+    def test_sparse_backend(self):
+        for diode in [False, True]:
+            self.csolver.set_backend("Dense")
+            self.assertEqual(self.csolver.solve(*windkessel(diode=diode)), 0)
+            self.assertFalse(self.csolver.sparse)
+            dense_solution = self.csolver.solution.copy()
+            self.csolver.set_backend("Sparse")
+            self.assertEqual(self.csolver.solve(*windkessel(diode=diode)), 0)
+            self.assertTrue(self.csolver.sparse)
+            np.testing.assert_allclose(self.csolver.solution, dense_solution, atol=1e-10)
+
+    def test_factorization_cache(self):
+        self.csolver.set_maxtime(5.0)
+        self.csolver.set_max_updated_rows(0)
+        self.csolver.set_cache_capacity(0)
+        self.assertEqual(self.csolver.solve(*windkessel(diode=True)), 0)
+        uncached = self.csolver.solution.copy()
+        uncached_stats = dict(self.csolver.get_stats())
+        self.csolver.set_cache_capacity(4)
+        self.assertEqual(self.csolver.solve(*windkessel(diode=True)), 0)
+        stats = self.csolver.get_stats()
+        np.testing.assert_allclose(self.csolver.solution, uncached)
+        self.assertGreater(stats["cache_hits"], 0)
+        self.assertLess(stats["factorizations"], uncached_stats["factorizations"])
+        self.assertEqual(stats["substitutions"], uncached_stats["substitutions"])
+
+    def test_source_table_chunks(self):
+        self.assertEqual(self.csolver.solve(*windkessel(diode=True)), 0)
+        self.assertEqual(self.csolver.source_table.shape, (1, 201))
+        solution = self.csolver.solution.copy()
+        self.csolver.max_source_table_size = 7
+        self.assertEqual(self.csolver.solve(*windkessel(diode=True)), 0)
+        self.assertEqual(self.csolver.source_table.shape, (1, 5))
+        np.testing.assert_allclose(self.csolver.solution, solution)
+
+    def test_constant_source(self):
+        self.assertEqual(self.csolver.solve(*windkessel(source="2")), 0)
+        np.testing.assert_allclose(self.csolver.solution[0], 2.0)
+
+    def test_streaming_sinks(self):
+        self.assertEqual(self.csolver.solve(*windkessel(diode=True)), 0)
+        full = self.csolver.solution.copy()
+        self.csolver.chunk_size = 7
+        blocks = []
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fname = os.path.join(tmpdir, "solution.npy")
+            sinks = [ArraySink(), NpyAppendSink(fname), CallbackSink(lambda time, block: blocks.append(block.shape))]
+            result = self.csolver.simulate(*windkessel(diode=True), sinks=sinks)
+            np.testing.assert_allclose(np.load(fname), full)
+        np.testing.assert_allclose(result.solution, full)
+        np.testing.assert_allclose(result.time, np.arange(201) * 0.01)
+        self.assertEqual(blocks[0], (full.shape[0], 7))
+        self.assertEqual(sum(shape[1] for shape in blocks), 201)
+        self.assertEqual(self.csolver.history.shape, (BDF_MAX_ORDER, full.shape[0]))
+
+        self.csolver.assemble(*windkessel(diode=True))
+        streamed = np.concatenate([block.copy() for _, block in self.csolver.iter_run()], axis=1)
+        np.testing.assert_allclose(streamed, full)
+
+    def test_memmap_solution(self):
+        self.assertEqual(self.csolver.solve(*windkessel(diode=True)), 0)
+        full = self.csolver.solution.copy()
+        self.csolver.chunk_size = 7
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.csolver.set_memmap_path(os.path.join(tmpdir, "solution.npy"))
+            self.assertEqual(self.csolver.solve(*windkessel(diode=True)), 0)
+            self.assertIsInstance(self.csolver.solution, np.memmap)
+            np.testing.assert_allclose(np.load(os.path.join(tmpdir, "solution.npy")), full)
+            fname = os.path.join(tmpdir, "listened.txt")
+            self.csolver.export_listened_solution(fname)
+            with open(fname) as f:
+                self.assertEqual(f.readline(), "# Pc Qout\n")
+            rows = [self.csolver.solution_rows.index(i) for i in self.csolver.listened]
+            np.testing.assert_allclose(np.loadtxt(fname), full[rows])
+            # A run stopped on its periodic steady state only leaves its steps in the file
+            self.csolver.set_periodic(True)
+            self.csolver.set_maxtime(20.0)
+            self.assertEqual(self.csolver.solve(*windkessel(diode=True, C=0.1)), 0)
+            self.assertLess(self.csolver.solution.shape[1], 2001)
+            solution = np.load(os.path.join(tmpdir, "solution.npy"))
+            np.testing.assert_array_equal(solution, self.csolver.solution)
+            self.assertEqual(len(self.csolver.time), solution.shape[1])
+
+    def test_adaptive_step(self):
+        source = "e**(-200*(t-0.5)**2)"
+        reference = CircuitSolver()
+        reference.set_dt(1e-4)
+        reference.set_maxtime(2.0)
+        reference.set_time_integration("BDF2")
+        reference.set_output_stride(100)
+        self.assertEqual(reference.solve(*windkessel(diode=True, C=0.01, source=source)), 0)
+        self.csolver.set_time_integration("BDF2")
+        self.csolver.set_step_control("Adaptive")
+        # Tolerances on the local error of BDF2, the error accumulates over the pulse
+        self.csolver.set_tolerances(5e-6, 5e-6)
+        self.assertEqual(self.csolver.solve(*windkessel(diode=True, C=0.01, source=source)), 0)
+        stats = self.csolver.get_stats()
+        np.testing.assert_allclose(self.csolver.time, reference.time)
+        np.testing.assert_allclose(self.csolver.solution, reference.solution, atol=1e-4)
+        # Fixed BDF2 needs dt = 0.001 (2000 steps) for a similar accuracy
+        self.assertLess(stats["steps"], 400)
+        self.assertGreater(stats["rejected_steps"], 0)
+        self.assertLess(stats["factorizations"], stats["steps"])
+
+    def test_adaptive_smooth_source(self):
+        reference = CircuitSolver()
+        reference.set_dt(1e-3)
+        reference.set_maxtime(5.0)
+        reference.set_time_integration("BDF2")
+        reference.set_output_stride(10)
+        reference.solve(*windkessel())
+        self.csolver.set_maxtime(5.0)
+        self.csolver.set_time_integration("BDF2")
+        self.csolver.set_step_control("Adaptive")
+        self.assertEqual(self.csolver.solve(*windkessel()), 0)
+        stats = self.csolver.get_stats()
+        # Steps longer than dt where the error allows, fewer than the 500 fixed steps
+        self.assertLess(stats["steps"], 400)
+        amplitude = np.max(np.abs(reference.solution), axis=1, keepdims=True)
+        error = np.abs(self.csolver.solution - reference.solution)
+        self.assertTrue(np.all(error <= 5 * (self.csolver.atol + self.csolver.rtol * amplitude)))
+        # LHS only depends on the step size: one factorization per step size
+        self.assertEqual(stats["factorizations"], stats["cache_misses"])
+        self.assertLess(stats["factorizations"], stats["steps"] / 10)
+
+    def test_periodic_steady_state(self):
+        self.csolver.set_maxtime(50.0)
+        self.assertEqual(self.csolver.solve(*windkessel(diode=True, C=0.1)), 0)
+        full = self.csolver.solution
+        self.csolver.set_periodic(True)
+        self.csolver.set_periodic_tol(1e-4)
+        self.assertEqual(self.csolver.solve(*windkessel(diode=True, C=0.1)), 0)
+        result = self.csolver.get_result()
+        self.assertAlmostEqual(result.period, 1.0)
+        self.assertLess(result.cycles, 10)
+        self.assertAlmostEqual(result.time[-1], result.cycles * result.period)
+        time, cycle = result.get_cycle()
+        self.assertEqual(len(time), 101)
+        np.testing.assert_allclose(cycle, full[:, -101:], atol=1e-3)
+
+        self.csolver.set_period(0.5)
+        self.assertEqual(self.csolver.solve(*windkessel(diode=True, C=0.1, source="sin(4*pi*t)+1")), 0)
+        self.assertEqual(self.csolver.get_result().period, 0.5)
+        # Fixed steps would never end on the period ends
+        self.csolver.set_period(0.505)
+        with self.assertRaises(PeriodStepError):
+            self.csolver.solve(*windkessel(diode=True, C=0.1, source="sin(4*pi*t)+1"))
+        self.csolver.set_periodic(False)
+        self.assertEqual(self.csolver.solve(*windkessel()), 0)
+        with self.assertRaises(PeriodError):
+            self.csolver.get_result().get_cycle()
+        self.csolver.set_periodic(True)
+        self.csolver.set_period(None)
+        self.assertEqual(self.csolver.solve(*windkessel(source="1")), 0)
+        self.assertIsNone(self.csolver.infer_period())
+        # Active elements set the period as well
+        self.assertEqual(self.csolver.solve(*windkessel(source="1", R0="10+5*cos(4*pi*t)")), 0)
+        self.assertAlmostEqual(self.csolver.infer_period(), 0.5)
+
+    def test_generalized_alpha(self):
+        # rho = 0 is equivalent to BDF2 started from a constant history
+        self.csolver.set_time_integration("Generalized-alpha")
+        self.csolver.set_rho(0.0)
+        self.csolver.solve(*windkessel(C=0.01))
+        alpha = self.csolver.solution
+        self.csolver.set_time_integration("BDF2")
+        self.csolver.set_initial_state(np.tile(alpha[:, 0], 2))
+        self.csolver.solve(*windkessel(C=0.01))
+        self.csolver.set_initial_state(None)
+        np.testing.assert_allclose(self.csolver.solution, alpha, atol=1e-12)
+
+        # Second order accuracy
+        reference = CircuitSolver()
+        reference.set_dt(1e-4)
+        reference.set_maxtime(2.0)
+        reference.set_time_integration("BDF2")
+        reference.set_output_stride(200)
+        reference.solve(*windkessel(C=0.01))
+        self.csolver.set_time_integration("Generalized-alpha")
+        self.csolver.set_rho(0.6)
+        errors = []
+        for dt in [0.02, 0.01]:
+            self.csolver.set_dt(dt)
+            self.csolver.set_output_stride(round(0.02 / dt))
+            self.csolver.solve(*windkessel(C=0.01))
+            errors.append(np.max(np.abs(self.csolver.solution - reference.solution)))
+        self.assertGreater(errors[0] / errors[1], 3.5)
+
+        # High frequency damping of an unresolved LC oscillation
+        self.csolver.set_dt(0.01)
+        self.csolver.set_output_stride(1)
+        self.csolver.set_maxtime(0.3)
+        amplitudes = []
+        for rho in [0.2, 0.6, 1.0]:
+            self.csolver.set_rho(rho)
+            self.csolver.assemble(*lc_circuit())
+            self.csolver.set_initial_state(np.zeros(self.csolver.nbP + self.csolver.nbQ))
+            self.assertEqual(self.csolver.run(), 0)
+            amplitudes.append(np.max(np.abs(self.csolver.solution[-1, -10:])))
+        self.assertLess(amplitudes[0], 1e-6)
+        self.assertLess(amplitudes[0], amplitudes[1])
+        self.assertLess(amplitudes[1], amplitudes[2])
+        self.assertGreater(amplitudes[2], 1.0)
+
+    def test_high_order_bdf(self):
+        reference = CircuitSolver()
+        reference.set_dt(2.5e-4)
+        reference.set_maxtime(2.0)
+        reference.set_time_integration("BDF5")
+        reference.set_output_stride(80)
+        reference.solve(*windkessel(C=0.01))
+        for order in [3, 4, 5]:
+            self.csolver.set_time_integration("BDF%d" % order)
+            errors = []
+            for dt in [0.01, 0.005]:
+                self.csolver.set_dt(dt)
+                self.csolver.set_output_stride(round(0.02 / dt))
+                self.csolver.solve(*windkessel(C=0.01))
+                errors.append(np.max(np.abs(self.csolver.solution - reference.solution)))
+            # Order k convergence, including the self-starting steps
+            self.assertGreater(errors[0] / errors[1], 0.7 * 2**order)
+
+    def test_variable_order_bdf(self):
+        source = "1-e**(-5*t)"
+        reference = CircuitSolver()
+        reference.set_dt(1e-4)
+        reference.set_maxtime(2.0)
+        reference.set_time_integration("BDF5")
+        reference.set_output_stride(100)
+        reference.solve(*windkessel(C=0.01, source=source))
+        self.csolver.set_tolerances(1e-5, 1e-8)
+        self.csolver.set_time_integration("VBDF")
+        self.assertEqual(self.csolver.solve(*windkessel(C=0.01, source=source)), 0)
+        vbdf_steps = self.csolver.stats["steps"]
+        self.assertEqual(self.csolver.order, 5)
+        np.testing.assert_allclose(self.csolver.solution, reference.solution, atol=1e-5)
+        # Fewer steps than adaptive BDF2 for the same tolerances
+        self.csolver.set_time_integration("BDF2")
+        self.csolver.set_step_control("Adaptive")
+        self.csolver.solve(*windkessel(C=0.01, source=source))
+        self.assertLess(vbdf_steps, self.csolver.stats["steps"] / 2)
+
+        self.csolver.set_max_order(2)
+        self.csolver.set_time_integration("VBDF")
+        self.csolver.solve(*windkessel(C=0.01, source=source))
+        self.assertEqual(self.csolver.order, 2)
+
+    def test_variable_order_rejections(self):
+        # Smooth periodic source: fewer steps than the 200 fixed ones, few rejected
+        self.csolver.set_time_integration("VBDF")
+        self.assertEqual(self.csolver.solve(*windkessel()), 0)
+        stats = self.csolver.get_stats()
+        self.assertLess(stats["steps"], 200)
+        self.assertLessEqual(stats["rejected_steps"], 0.1 * stats["steps"])
+        # Steps limited by the sources are not tried again at every step
+        self.csolver.set_source_tol(1e-3)
+        self.assertEqual(self.csolver.solve(*windkessel()), 0)
+        stats = self.csolver.get_stats()
+        self.assertLessEqual(stats["rejected_steps"], 0.25 * stats["steps"])
+
+    def test_exponential_propagator(self):
+        reference = CircuitSolver()
+        reference.set_dt(1e-3)
+        reference.set_maxtime(2.0)
+        reference.set_time_integration("BDF5")
+        reference.set_output_stride(100)
+        reference.solve(*windkessel(C=0.01, source="2*t+1"))
+        # Exact for linear sources, whatever dt
+        self.csolver.set_time_integration("Exponential")
+        self.csolver.set_dt(0.1)
+        for backend in ["Dense", "Sparse"]:
+            self.csolver.set_backend(backend)
+            self.assertEqual(self.csolver.solve(*windkessel(C=0.01, source="2*t+1")), 0)
+            np.testing.assert_allclose(self.csolver.solution, reference.solution, atol=1e-8)
+        self.csolver.set_backend("Dense")
+
+        # Undamped LC oscillation
+        self.csolver.set_dt(0.01)
+        self.csolver.set_maxtime(1.0)
+        self.csolver.assemble(*lc_circuit())
+        self.csolver.set_initial_state(np.zeros(self.csolver.nbP + self.csolver.nbQ))
+        self.assertEqual(self.csolver.run(), 0)
+        self.csolver.set_initial_state(None)
+        np.testing.assert_allclose(np.max(np.abs(self.csolver.solution[-1])), 10.0, rtol=1e-2)
+
+        with self.assertRaisesRegex(NonLinearSchemeError, "Exponential time integration does not support diodes"):
+            self.csolver.solve(*windkessel(diode=True))
+
+    def test_event_location(self):
+        circuit = windkessel(diode=True, C=0.1)
+        self.csolver.set_time_integration("BDF2")
+        self.csolver.set_event_location(True)
+        self.csolver.set_maxtime(3.0)
+        self.csolver.set_dt(1e-3)
+        self.csolver.solve(*circuit)
+        reference = self.csolver.events
+        self.assertEqual(self.csolver.stats["events"], len(reference))
+        # Valve timing at a coarse timestep is much finer than dt
+        self.csolver.set_dt(0.05)
+        self.csolver.solve(*circuit)
+        self.assertEqual([event[1:] for event in self.csolver.events], [event[1:] for event in reference])
+        np.testing.assert_allclose([event[0] for event in self.csolver.events], [event[0] for event in reference], atol=5e-3)
+        self.assertTrue(any(event[0] % 0.05 > 0.005 for event in self.csolver.events))
+
+    def test_lcp_diodes(self):
+        rng = np.random.default_rng(0)
+        for n in range(1, 6):
+            A = rng.normal(size=(n, n))
+            M, q = A @ A.T + 0.1 * np.eye(n), rng.normal(size=n)
+            z = lemke(M, q)
+            w = M @ z + q
+            self.assertTrue(np.all(z >= 0) and np.all(w >= -1e-12))
+            self.assertAlmostEqual(w @ z, 0.0)
+
+        for circuit in [windkessel(diode=True, C=0.1), two_valves()]:
+            self.csolver.set_diode_mode("Switching")
+            self.csolver.solve(*circuit)
+            switching = self.csolver.solution.copy()
+            self.csolver.set_diode_mode("LCP")
+            self.assertEqual(self.csolver.solve(*circuit), 0)
+            np.testing.assert_allclose(self.csolver.solution, switching, atol=1e-12)
+            # One solve per step with a single factorization
+            stats = self.csolver.get_stats()
+            self.assertEqual(stats["factorizations"], 1)
+            self.assertEqual(stats["substitutions"], stats["steps"] + 1)
+
+        # The error estimate of adaptive steps also solves the LCP
+        self.csolver.set_step_control("Adaptive")
+        for circuit in [windkessel(diode=True), two_valves()]:
+            self.csolver.set_diode_mode("Switching")
+            self.csolver.solve(*circuit)
+            switching = self.csolver.get_stats()["steps"]
+            self.csolver.set_diode_mode("LCP")
+            self.assertEqual(self.csolver.solve(*circuit), 0)
+            self.assertLessEqual(self.csolver.get_stats()["steps"], 1.2 * switching)
+
+    def test_nonlinear_elements(self):
+        self.csolver.set_maxtime(3.0)
+        self.assertEqual(self.csolver.solve(*windkessel(valve=(Stenosis, 5.0), C=0.1)), 0)
+        x = self.csolver.solution
+        for _, idP0, idP1, idQ, _, K in self.csolver.update_nonlinear_dict.values():
+            np.testing.assert_allclose(x[idP0] - x[idP1], K * x[idQ] * np.abs(x[idQ]), atol=1e-6)
+        # Modified Newton: the Jacobian is reused over many steps
+        stats = self.csolver.get_stats()
+        self.assertGreater(stats["newton_iterations"], stats["steps"])
+        self.assertLess(stats["jacobian_refreshes"], stats["steps"] / 4)
+        self.assertEqual(stats["factorizations"], stats["jacobian_refreshes"])
+
+        # A smooth valve is close to a diode with the same open resistance
+        self.csolver.set_dt(1e-3)
+        self.csolver.solve(*windkessel(diode=True, C=0.1))
+        diode = self.csolver.get_result().get_listened()
+        self.csolver.solve(*windkessel(valve=(SmoothValve, 1.0), R0=9.0, C=0.1))
+        valve = self.csolver.get_result().get_listened()
+        for name in diode:
+            np.testing.assert_allclose(valve[name], diode[name], atol=2e-2)
+
+        # The reused Jacobian stops contracting at large timesteps: full Newton takes over
+        self.csolver.set_dt(1e-2)
+        self.assertEqual(self.csolver.solve(*windkessel(valve=(SmoothValve, 1.0), R0=9.0, C=0.1)), 0)
+        valve = self.csolver.get_result().get_listened()
+        self.assertLess(self.csolver.get_stats()["jacobian_refreshes"], self.csolver.get_stats()["steps"])
+        self.csolver.solve(*windkessel(diode=True, C=0.1))
+        diode = self.csolver.get_result().get_listened()
+        for name in diode:
+            np.testing.assert_allclose(valve[name], diode[name], atol=2e-2)
+        # Newton failure is not reported as an over constrained problem
+        self.csolver.max_newton_iterations = 1
+        self.assertEqual(self.csolver.solve(*windkessel(valve=(SmoothValve, 1.0), R0=9.0, C=0.1)), 3)
+        self.csolver.max_newton_iterations = 50
+
+        self.csolver.set_time_integration("Exponential")
+        with self.assertRaises(NonLinearSchemeError):
+            self.csolver.solve(*windkessel(valve=(Stenosis, 5.0)))
+        self.csolver.set_time_integration("BDF")
+        self.csolver.set_diode_mode("LCP")
+        with self.assertRaisesRegex(NonLinearSchemeError, "LCP diode mode does not support Stenosis/SmoothValve"):
+            self.csolver.solve(*windkessel(valve=(Stenosis, 5.0)))
+
+    def test_time_varying_elements(self):
+        C = lambda t: 0.1 * (1.5 + np.sin(2 * np.pi * t))
+        R0 = lambda t: 10 + 5 * np.cos(2 * np.pi * t)
+        # Volume V = C.Pc filled through R0, drained through R1 = 10
+        time = np.arange(3001) * 1e-3
+        reference = solve_ivp(
+            lambda t, V: (np.sin(2 * np.pi * t) - V / C(t)) / R0(t) - V / C(t) / 10,
+            (0, 3),
+            [0.0],
+            t_eval=time,
+            rtol=1e-10,
+            atol=1e-12,
+        ).y[0] / C(time)
+
+        self.csolver.set_time_integration("BDF2")
+        self.csolver.set_maxtime(3.0)
+        self.csolver.set_dt(1e-3)
+        circuit = windkessel(R0="10+5*cos(2*pi*t)", C="0.1*(1.5+sin(2*pi*t))")
+        for backend in ["Dense", "Sparse"]:
+            self.csolver.set_backend(backend)
+            self.assertEqual(self.csolver.solve(*circuit), 0)
+            np.testing.assert_allclose(self.csolver.get_result().get_listened()["Pc"], reference, atol=1e-4)
+            # Changed rows are updated, not refactorized
+            stats = self.csolver.get_stats()
+            self.assertLessEqual(stats["factorizations"], 3)
+            self.assertGreaterEqual(stats["low_rank_updates"], stats["steps"] - 1)
+
+        self.csolver.set_max_updated_rows(1)
+        with self.assertWarns(UserWarning):
+            self.csolver.solve(*circuit)
+
+    def test_delay_line(self):
+        # Matched lossless line: the load sees half the source, delayed
+        self.csolver.set_maxtime(1.0)
+        for scheme in ["BDF", "BDF3", "Generalized-alpha", "Exponential"]:
+            self.csolver.set_time_integration(scheme)
+            self.assertEqual(self.csolver.solve(*transmission_line()), 0)
+            result = self.csolver.get_result()
+            delayed = np.where(result.time >= 0.1, 0.5 * np.sin(2 * np.pi * (result.time - 0.1)), 0.0)
+            np.testing.assert_allclose(result.get_listened()["Pout"], delayed, atol=1e-12)
+            # The history is kept over the delay only
+            self.assertEqual(self.csolver.delay_buffer.shape, (13, 2))
+
+        # A lossy line replaces a chain of 50 LC cells, its steady state is a resistor
+        self.csolver.set_time_integration("BDF2")
+        self.csolver.set_dt(1e-4)
+        for source in ["sin(2*pi*t)", "1+sin(2*pi*t)**2*(t<0.5)"]:
+            chain = self.csolver.simulate(*transmission_line(cells=50, R=0.4, R1=3.0, source=source))
+            line = self.csolver.simulate(*transmission_line(R=0.4, R1=3.0, source=source))
+            self.assertLess(line.solution.shape[0], chain.solution.shape[0] / 30)
+            np.testing.assert_allclose(line.get_listened()["Pout"], chain.get_listened()["Pout"], atol=1e-2)
+        self.assertAlmostEqual(line.get_listened()["Pout"][0], 3.0 / 4.4)
+
+        self.csolver.set_dt(0.2)
+        with self.assertRaises(DelayStepError):
+            self.csolver.solve(*transmission_line())
+
+    def test_storage_options(self):
+        self.assertEqual(self.csolver.solve(*windkessel(diode=True)), 0)
+        full = self.csolver.solution.copy()
+        listened = list(self.csolver.listened.keys())
+        self.csolver.set_storage("Listened")
+        self.csolver.set_output_stride(10)
+        result = self.csolver.simulate(*windkessel(diode=True))
+        self.assertEqual(result.solution.shape, (len(listened), 21))
+        np.testing.assert_allclose(result.solution, full[listened, ::10])
+        np.testing.assert_allclose(result.time, np.arange(0, 201, 10) * 0.01)
+        self.assertEqual(set(result.get_listened()), {"Pc", "Qout"})
+
+        output_times = np.array([0.0, 0.005, 0.5, 1.234, 2.0, 3.0])
+        self.csolver.set_output_times(output_times)
+        result = self.csolver.simulate(*windkessel(diode=True))
+        np.testing.assert_allclose(result.time, output_times[:-1])
+        time = np.arange(201) * 0.01
+        for i, row in enumerate(listened):
+            np.testing.assert_allclose(result.solution[i], np.interp(output_times[:-1], time, full[row]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import numpy as np
+from solvers.circuitsolver import CircuitSolver
+from solvers.ensemblesolver import EnsembleSolver
+from tests.circuits import windkessel
+
+
+class TestEnsembleSolver(unittest.TestCase):
+
+    def test_matches_individual_solves(self):
+        params = np.array([[10.0, 0.1, 10.0], [5.0, 0.2, 5.0], [1.0, 0.3, 3.0]])
+        for diode in [False, True]:
+            ensemble = EnsembleSolver()
+            ensemble.csolver.set_maxtime(3.0)
+            ensemble.csolver.set_time_integration("BDF2")
+            self.assertEqual(ensemble.compile(*windkessel(diode=diode)), 0)
+            types = [type(elem).__name__ for elem in ensemble.get_parameters()]
+            self.assertEqual(types, ["Resistor", "Capacitor", "Resistor"])
+            ensemble.run(params)
+            listened = list(ensemble.csolver.listened.keys())
+            for i, (R0, C, R1) in enumerate(params):
+                csolver = CircuitSolver()
+                csolver.set_maxtime(3.0)
+                csolver.set_time_integration("BDF2")
+                csolver.solve(*windkessel(diode=diode, R0=R0, C=C, R1=R1))
+                np.testing.assert_allclose(ensemble.solution[i], csolver.solution, atol=1e-12)
+            ensemble.run(params, listeners_only=True)
+            self.assertEqual(ensemble.solution.shape, (3, len(listened), 301))
+
+    def test_singular_sample(self):
+        ensemble = EnsembleSolver()
+        ensemble.csolver.set_maxtime(1.0)
+        ensemble.solve(*windkessel(), np.array([[10.0, 10.0, 10.0], [0.0, 10.0, 0.0]]))
+        self.assertEqual(list(ensemble.status), [0, 2])
+        self.assertTrue(np.isnan(ensemble.solution[1]).all())
+        self.assertFalse(np.isnan(ensemble.solution[0]).any())
+
+
+if __name__ == "__main__":
+    unittest.main()
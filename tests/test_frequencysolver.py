@@ -0,0 +1,54 @@
+import unittest
+import numpy as np
+from exceptions.solverexceptions import NonLinearSchemeError, PeriodStepError
+from solvers.frequencysolver import FrequencySolver
+from tests.circuits import windkessel
+
+
+class TestFrequencySolver(unittest.TestCase):
+
+    def test_windkessel_response(self):
+        R0, C, R1 = 2.0, 0.5, 10.0
+        frequencies = np.linspace(0.0, 10.0, 21)
+        jw = 2j * np.pi * frequencies
+        Zp = R1 / (1 + jw * R1 * C)
+        for backend in ["Dense", "Sparse"]:
+            fsolver = FrequencySolver()
+            fsolver.csolver.set_backend(backend)
+            self.assertEqual(fsolver.solve(*windkessel(R0=R0, C=C, R1=R1), frequencies), 0)
+            np.testing.assert_allclose(fsolver.get_response("Pc"), Zp / (R0 + Zp))
+            np.testing.assert_allclose(fsolver.get_response("Qout"), 1 / (R0 + Zp) * Zp / R1)
+            np.testing.assert_allclose(fsolver.impedance("Pc", "Qout"), R1)
+            np.testing.assert_array_equal(fsolver.status, 0)
+
+    def test_periodic_steady_state(self):
+        R0, C, R1 = 2.0, 0.5, 10.0
+        fsolver = FrequencySolver()
+        fsolver.csolver.set_dt(0.01)
+        self.assertEqual(fsolver.solve_periodic(*windkessel(R0=R0, C=C, R1=R1, source="sin(2*pi*t)+1")), 0)
+        result = fsolver.result
+        self.assertAlmostEqual(result.period, 1.0)
+        np.testing.assert_allclose(result.time, np.arange(101) * 0.01)
+        Zp = R1 / (1 + 2j * np.pi * R1 * C)
+        H = Zp / (R0 + Zp)
+        expected = np.abs(H) * np.sin(2 * np.pi * result.time + np.angle(H)) + R1 / (R0 + R1)
+        np.testing.assert_allclose(result.get_listened()["Pc"], expected, atol=1e-12)
+        time, cycle = result.get_cycle()
+        self.assertEqual(len(time), 101)
+
+        fsolver.csolver.set_storage("Listened")
+        fsolver.csolver.set_output_stride(10)
+        fsolver.run_periodic()
+        self.assertEqual(fsolver.result.solution.shape, (2, 11))
+        np.testing.assert_allclose(fsolver.csolver.get_result().get_listened()["Pc"], expected[::10], atol=1e-12)
+
+        fsolver.csolver.set_period(0.505)
+        with self.assertRaises(PeriodStepError):
+            fsolver.run_periodic()
+
+        with self.assertRaises(NonLinearSchemeError):
+            fsolver.solve_periodic(*windkessel(diode=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
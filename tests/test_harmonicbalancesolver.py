@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+from exceptions.solverexceptions import PeriodStepError
+from solvers.circuitsolver import CircuitSolver
+from solvers.harmonicbalancesolver import HarmonicBalanceSolver
+from tests.circuits import windkessel
+
+
+class TestHarmonicBalanceSolver(unittest.TestCase):
+
+    def test_matches_periodic_steady_state(self):
+        for diode, atol in [(False, 1e-6), (True, 1e-2)]:
+            circuit = windkessel(diode=diode, C=1.0, source="sin(2*pi*t)")
+            csolver = CircuitSolver()
+            csolver.set_dt(2e-3)
+            csolver.set_maxtime(500.0)
+            csolver.set_time_integration("BDF2")
+            csolver.set_periodic(True)
+            csolver.set_periodic_tol(1e-10)
+            csolver.solve(*circuit)
+            time, cycle = csolver.get_result().get_cycle()
+
+            hbsolver = HarmonicBalanceSolver()
+            hbsolver.csolver.set_dt(2e-3)
+            self.assertEqual(hbsolver.solve(*circuit), 0)
+            self.assertTrue(hbsolver.converged)
+            self.assertAlmostEqual(hbsolver.result.period, 1.0)
+            np.testing.assert_allclose(hbsolver.result.time, time - time[0])
+            np.testing.assert_allclose(hbsolver.result.solution, cycle, atol=atol)
+        self.assertGreater(hbsolver.iterations, 1)
+
+        hbsolver.csolver.set_dt(0.01)
+        hbsolver.csolver.set_period(0.505)
+        with self.assertRaises(PeriodStepError):
+            hbsolver.run()
+
+    def test_not_converged(self):
+        hbsolver = HarmonicBalanceSolver(max_iterations=1)
+        hbsolver.csolver.set_dt(2e-3)
+        self.assertEqual(hbsolver.solve(*windkessel(diode=True, C=1.0)), 3)
+        self.assertFalse(hbsolver.converged)
+        self.assertEqual(hbsolver.result.status, 3)
+        self.assertIsNotNone(hbsolver.result.solution)
+
+
+if __name__ == "__main__":
+    unittest.main()
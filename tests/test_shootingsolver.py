@@ -0,0 +1,41 @@
+import unittest
+import numpy as np
+from solvers.circuitsolver import CircuitSolver
+from solvers.shootingsolver import ShootingSolver
+from tests.circuits import windkessel
+
+
+class TestShootingSolver(unittest.TestCase):
+
+    def test_matches_periodic_steady_state(self):
+        for diode, time_integration in [(False, "BDF"), (True, "BDF"), (True, "Generalized-alpha")]:
+            csolver = CircuitSolver()
+            csolver.set_dt(0.01)
+            csolver.set_time_integration(time_integration)
+            csolver.set_maxtime(200.0)
+            csolver.set_periodic(True)
+            csolver.set_periodic_tol(1e-10)
+            self.assertEqual(csolver.solve(*windkessel(diode=diode, C=1.0)), 0)
+            _, cycle = csolver.get_result().get_cycle()
+
+            shooting = ShootingSolver()
+            shooting.csolver.set_dt(0.01)
+            shooting.csolver.set_time_integration(time_integration)
+            self.assertEqual(shooting.solve(*windkessel(diode=diode, C=1.0)), 0)
+            self.assertTrue(shooting.converged)
+            self.assertEqual(shooting.result.period, 1.0)
+            self.assertLess(shooting.periods, csolver.get_result().cycles / 10)
+            np.testing.assert_allclose(shooting.result.solution, cycle, atol=1e-7)
+
+    def test_not_converged(self):
+        shooting = ShootingSolver(max_iterations=2)
+        shooting.csolver.set_dt(0.01)
+        self.assertEqual(shooting.solve(*windkessel(diode=True, C=1.0)), 3)
+        self.assertFalse(shooting.converged)
+        self.assertGreater(shooting.residual, shooting.tol)
+        self.assertEqual(shooting.periods, 2)
+        self.assertEqual(shooting.result.status, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
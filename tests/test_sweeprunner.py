@@ -0,0 +1,80 @@
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+from solvers.circuitsolver import CircuitSolver
+from solvers.ensemblesolver import EnsembleSolver
+from solvers.sweeprunner import SweepRunner
+from tests.circuits import transmission_line, windkessel
+
+
+class TestSweepRunner(unittest.TestCase):
+
+    def test_matches_ensemble(self):
+        params = np.array([[10.0, 10.0, 10.0], [5.0, 2.0, 20.0], [0.0, 10.0, 0.0], [1.0, 30.0, 3.0], [2.0, 3.0, 4.0]])
+        sweep = SweepRunner(max_workers=2, chunk_size=2)
+        sweep.csolver.set_maxtime(2.0)
+        self.assertEqual(sweep.solve(*windkessel(diode=True), params), 0)
+        ensemble = EnsembleSolver()
+        ensemble.csolver.set_maxtime(2.0)
+        ensemble.solve(*windkessel(diode=True), params, listeners_only=True)
+        self.assertEqual(list(sweep.status), [0, 0, 2, 0, 0])
+        np.testing.assert_allclose(sweep.solution, ensemble.solution, atol=1e-12)
+
+    def test_periodic_samples(self):
+        params = np.array([[10.0, 0.1, 10.0], [5.0, 0.2, 5.0], [1.0, 0.3, 3.0]])
+        sweep = SweepRunner(max_workers=2, chunk_size=1)
+        sweep.csolver.set_maxtime(20.0)
+        sweep.csolver.set_periodic(True)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # Workers do not write to the solver file
+            path = os.path.join(tmpdir, "solution.npy")
+            sweep.csolver.set_memmap_path(path)
+            self.assertEqual(sweep.solve(*windkessel(diode=True), params), 0)
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(sweep.csolver.memmap_path, path)
+        self.assertEqual(list(sweep.status), [0, 0, 0])
+        # Runs stop on their own periodic steady state, traces are padded after it
+        for i, (R0, C, R1) in enumerate(params):
+            csolver = CircuitSolver()
+            csolver.set_maxtime(20.0)
+            csolver.set_periodic(True)
+            csolver.set_storage("Listened")
+            csolver.solve(*windkessel(diode=True, R0=R0, C=C, R1=R1))
+            length = csolver.solution.shape[1]
+            self.assertEqual(sweep.lengths[i], length)
+            self.assertLess(length, len(sweep.time))
+            np.testing.assert_allclose(sweep.solution[i, :, :length], csolver.solution, atol=1e-12)
+            self.assertTrue(np.isnan(sweep.solution[i, :, length:]).all())
+
+    def test_solver_already_run(self):
+        params = np.array([[10.0, 0.1, 10.0], [5.0, 0.2, 5.0]])
+        for backend, diode_mode, step_control in [("Dense", "Switching", "Adaptive"), ("Sparse", "LCP", "Fixed")]:
+            csolver = CircuitSolver()
+            csolver.set_backend(backend)
+            csolver.set_diode_mode(diode_mode)
+            csolver.set_step_control(step_control)
+            self.assertEqual(csolver.solve(*windkessel(diode=True)), 0)
+            self.assertLess(len(pickle.dumps(csolver)), 10000)
+            sweep = SweepRunner(csolver, max_workers=2, chunk_size=1)
+            self.assertEqual(sweep.solve(*windkessel(diode=True), params), 0)
+            self.assertEqual(list(sweep.status), [0, 0])
+        csolver = CircuitSolver()
+        csolver.set_time_integration("VBDF")
+        self.assertEqual(csolver.solve(*windkessel()), 0)
+        sweep = SweepRunner(csolver, max_workers=2, chunk_size=1)
+        self.assertEqual(sweep.solve(*windkessel(), params), 0)
+        self.assertEqual(list(sweep.status), [0, 0])
+
+    def test_solver_errors(self):
+        # Delays shorter than the timestep fail in the workers, not the sweep
+        sweep = SweepRunner(max_workers=2, chunk_size=1)
+        sweep.csolver.set_dt(0.2)
+        self.assertEqual(sweep.solve(*transmission_line(), np.array([[1.0, 1.0], [2.0, 1.0]])), 0)
+        self.assertEqual(list(sweep.status), [4, 4])
+        self.assertTrue(np.isnan(sweep.solution).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
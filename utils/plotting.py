@@ -0,0 +1,30 @@
+import matplotlib.pyplot as plt
+from solvers.solveresult import SolveResult
+
+
+def plot_result(result: SolveResult, show: bool = True):
+    """
+    Plot listened pressures and flows of a simulation result.
+
+    Args:
+        result (SolveResult): result of CircuitSolver.simulate
+        show (bool, optional): whether to call plt.show. Defaults to True.
+
+    Returns:
+        (Figure, np.ndarray): matplotlib figure and axes
+    """
+    fig, axs = plt.subplots(2)
+    for name, values in result.get_pressures().items():
+        axs[0].plot(result.time, values, label=name)
+    for name, values in result.get_flows().items():
+        axs[1].plot(result.time, values, label=name)
+    axs[0].set_ylabel("Pressure")
+    axs[1].set_ylabel("Flow")
+    axs[1].set_xlabel("Time")
+    if result.get_pressures():
+        axs[0].legend()
+    if result.get_flows():
+        axs[1].legend()
+    if show:
+        plt.show()
+    return fig, axs